@@ -0,0 +1,407 @@
+"""
+Benchmarks of the sensor output pipeline, without SOFA.
+
+The depth map rendering and the capture file writers of SensorController are fed
+synthetic top surface point clouds with as many nodes as the top surface of the
+Low-Even, Med-Even and Membrane-High meshes, at several image sizes. The time and
+the peak memory of every case are compared to benchmarks/baselines.json:
+
+    python benchmarks/sensor_output.py                     # Compare to the baselines
+    python benchmarks/sensor_output.py --update-baselines  # Store new baselines
+    python benchmarks/sensor_output.py --filter interpolated
+
+The script exits with 1 when a case is slower or uses more memory than its baseline
+allows. Times are medians over the repeats, and a slowdown must also exceed an
+absolute floor, so the timing noise of sub-millisecond cases is not reported.
+The baseline times are scaled by the speed of the machine, measured on a fixed
+NumPy workload before every case (median of the last ones) and stored with the
+baselines, so a loaded or throttled machine does not fail the gate. Baselines are
+still machine dependent, update them when changing machines.
+"""
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from os import path
+
+import numpy as np
+from scipy.spatial import Delaunay
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "src"))
+
+from elements.sensor.depth_map import (  # noqa: E402
+    PixelCorrespondence,
+    interpolated_image,
+    nearest_neighbor_image,
+    nearest_vertex,
+    tiled_image,
+)
+from elements.sensor.live import FramePublisher  # noqa: E402
+from elements.sensor.markers import MarkerSet  # noqa: E402
+from elements.sensor.modal import ModalBasis  # noqa: E402
+from elements.sensor.output import (  # noqa: E402
+    save_depth_image,
+    save_points,
+    save_points_text,
+)
+from elements.sensor.surrogate import (  # noqa: E402
+    ComplianceSurrogate,
+    sphere_heights,
+)
+from elements.sensor.tactile_image import TactileImageRenderer  # noqa: E402
+
+BASELINES_PATH = path.join(path.dirname(path.abspath(__file__)), "baselines.json")
+
+# Number of top surface nodes of the membrane meshes
+MESHES = {
+    "Low-Even": 802,
+    "Med-Even": 3204,
+    "Membrane-High": 12903,
+}
+
+IMAGE_SIZES = [(83, 101), (83 * 3, 101 * 3), (83 * 6, 101 * 6)]
+
+# Supersampled size of the tiled rasterization cases
+LARGE_IMAGE_SIZE = (1440, 1920)
+
+MARKER_GRID_SHAPE = (7, 9)
+
+# Meshes of the compliance surrogate cases, the dense matrix of Membrane-High
+# taking more than 1 GB
+SURROGATE_MESHES = ["Low-Even", "Med-Even"]
+
+# Number of modes of the modal basis cases
+NUM_MODES = 32
+
+# Number of nearest_neighbor queries per case
+NUM_QUERIES = 100
+
+# Size of the arrays of the calibration workload
+CALIBRATION_SIZE = 2**18
+
+# Number of the last calibrations whose median gives the speed of the machine
+CALIBRATION_WINDOW = 9
+
+
+def synthetic_surface(num_vertices, seed=0):
+    """
+    A jittered grid of the membrane top surface (in m) indented by a sphere.
+
+    Returns:
+        The (N, 3) positions and the (M, 3) Delaunay triangles of the (X, Z) grid.
+    """
+    rng = np.random.default_rng(seed)
+    columns = int(np.sqrt(num_vertices * 27.6 / 23.2))
+    rows = int(np.ceil(num_vertices / columns))
+
+    x, z = np.meshgrid(
+        np.linspace(-0.0138, 0.0138, columns), np.linspace(-0.0117, 0.0115, rows)
+    )
+    xz = np.column_stack((x.ravel(), z.ravel()))[:num_vertices]
+    xz += rng.normal(scale=1e-5, size=xz.shape)
+
+    y = 0.023 - 0.001 * np.exp(-(xz**2).sum(axis=1) / 2e-5)
+
+    positions = np.column_stack((xz[:, 0], y, xz[:, 1]))
+    return positions, Delaunay(xz).simplices
+
+
+def synthetic_compliance(positions, width=0.002):
+    """
+    A symmetric positive definite compliance matrix (in m/N) decaying with the
+    distance between the vertices, like the one of the membrane.
+    """
+    xz = positions[:, ::2]
+    squared = ((xz[:, None] - xz[None]) ** 2).sum(axis=2)
+    compliance = 1e-3 * np.exp(-squared / width**2)
+    compliance[np.diag_indices_from(compliance)] += 1e-6
+    return compliance
+
+
+def synthetic_modes(size, num_modes, seed=3):
+    """
+    Random orthonormal modes of shape (num_modes, size).
+    """
+    random = np.random.default_rng(seed).random((size, num_modes))
+    return np.linalg.qr(random)[0].T
+
+
+def measure(function, repeats):
+    """
+    Returns:
+        The median wall time of function() in s and its peak traced memory in MB.
+    """
+    function()  # Warm up
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return float(np.median(times)), peak / 2**20
+
+
+def calibration_workload(values):
+    """
+    A fixed workload of sorts, gathers and reductions, the speed of the machine.
+    """
+    order = np.argsort(values)
+    gathered = values[order]
+    return np.cumsum(gathered) @ values
+
+
+def calibrate(repeats):
+    """
+    Returns:
+        The median wall time of the calibration workload in s.
+    """
+    values = np.random.default_rng(4).random(CALIBRATION_SIZE)
+    wall_time, _ = measure(partial(calibration_workload, values), repeats)
+    return wall_time
+
+
+def nearest_neighbor_queries(positions, queries):
+    return [nearest_vertex(positions, i, j) for i, j in queries]
+
+
+def publish_frame(publisher, table, positions):
+    """
+    Publish a frame to shared memory like SensorController.publish_frame.
+    """
+    slot = publisher.begin(0, 0.0)
+    np.copyto(publisher.positions[slot], positions)
+    table.image(publisher.positions[slot], out=publisher.depth_maps[slot])
+    publisher.end()
+
+
+def cases(output_directory):
+    """
+    Yields the name of every case and the function it measures.
+    """
+    for mesh_name, num_vertices in MESHES.items():
+        positions, triangles = synthetic_surface(num_vertices)
+        indexes = np.arange(num_vertices)
+
+        for size in IMAGE_SIZES:
+            suffix = f"{mesh_name}/{size[0]}x{size[1]}"
+
+            yield f"map_to_image/{suffix}", partial(
+                nearest_neighbor_image, positions, size
+            )
+            yield f"map_to_image_interpolated/{suffix}", partial(
+                interpolated_image, positions, triangles, size
+            )
+
+            table = PixelCorrespondence.compute(
+                positions, triangles, size, "interpolated"
+            )
+            yield f"pixel_correspondence/{suffix}", partial(
+                table.image, positions, out=np.empty(size)
+            )
+
+            publisher = FramePublisher(
+                f"benchmark-{os.getpid()}-{mesh_name}-{size[0]}x{size[1]}",
+                8,
+                size,
+                num_vertices,
+            )
+            atexit.register(publisher.close)
+            yield f"live_publish/{suffix}", partial(
+                publish_frame, publisher, table, positions
+            )
+
+            heights = table.image(positions, normalize=False)
+            renderer = TactileImageRenderer(size, table.pixel_size())
+            yield f"tactile_image/{suffix}", partial(
+                renderer.render, heights, out=np.empty((*size, 3), dtype=np.uint8)
+            )
+
+        suffix = f"{mesh_name}/{LARGE_IMAGE_SIZE[0]}x{LARGE_IMAGE_SIZE[1]}"
+        yield f"tiled_image/{suffix}", partial(
+            tiled_image, positions, triangles, LARGE_IMAGE_SIZE, dtype="uint16"
+        )
+
+        queries = np.random.default_rng(1).uniform(-0.012, 0.012, (NUM_QUERIES, 2))
+        yield f"nearest_neighbor/{mesh_name}/{NUM_QUERIES}", partial(
+            nearest_neighbor_queries, positions, queries
+        )
+
+        markers = MarkerSet.compute(positions, triangles, MARKER_GRID_SHAPE)
+        yield f"marker_displacements/{mesh_name}", partial(
+            markers.displacements, positions, out=np.empty((len(markers), 3))
+        )
+
+        basis = ModalBasis(
+            positions,
+            triangles,
+            np.zeros(positions.size),
+            synthetic_modes(positions.size, NUM_MODES),
+            np.ones(NUM_MODES),
+        )
+        coefficients = basis.project(positions)
+        yield f"modal_project/{mesh_name}", partial(
+            basis.project, positions, out=np.empty(NUM_MODES, dtype=np.float32)
+        )
+        yield f"modal_reconstruct/{mesh_name}", partial(
+            basis.reconstruct, coefficients, out=np.empty(positions.shape)
+        )
+
+        if mesh_name in SURROGATE_MESHES:
+            rest_positions = positions.copy()
+            rest_positions[:, 1] = 0.023
+            surrogate = ComplianceSurrogate(
+                rest_positions,
+                triangles,
+                synthetic_compliance(rest_positions),
+                35000,
+                0.25,
+            )
+            heights = sphere_heights(rest_positions[:, ::2], [0.0, 0.027, 0.0], 0.005)
+            yield f"surrogate_contact/{mesh_name}", partial(surrogate.solve, heights)
+
+        yield f"save_depth_map_points/{mesh_name}", partial(
+            save_points,
+            path.join(output_directory, "points.npz"),
+            positions,
+            indexes,
+            mesh_name,
+        )
+        yield f"save_depth_map_points_text/{mesh_name}", partial(
+            save_points_text, path.join(output_directory, "points.txt"), positions
+        )
+
+    for size in IMAGE_SIZES:
+        depth_map = np.random.default_rng(2).random(size)
+        yield f"save_depth_map_image/{size[0]}x{size[1]}", partial(
+            save_depth_image, path.join(output_directory, "image.png"), depth_map
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the sensor output.")
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--filter", default="", help="Only run the matching cases")
+    parser.add_argument("--repeats", type=int, default=15)
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=1.0,
+        help="Allowed relative slowdown against the baseline",
+    )
+    parser.add_argument(
+        "--time-floor",
+        type=float,
+        default=0.5,
+        help="Slowdowns under this many ms are noise, whatever their ratio",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed relative peak memory increase against the baseline",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    baselines = {}
+    if path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+    baseline_cases = baselines.get("cases", {})
+
+    reference = baselines.get("calibration")
+    calibrations = []
+
+    results = {}
+    regressions = []
+
+    print(
+        f"{'Case':<58} {'Time (ms)':>10} {'ops/s':>9} {'Peak (MB)':>10} {'vs base':>8}"
+    )
+    with tempfile.TemporaryDirectory() as output_directory:
+        for name, function in cases(output_directory):
+            if args.filter not in name:
+                continue
+
+            calibrations.append(calibrate(args.repeats))
+            calibration = np.median(calibrations[-CALIBRATION_WINDOW:])
+            if reference is None:
+                reference = calibration
+            # Only a slower machine scales the baselines, the calibration being
+            # as noisy as the cases
+            speed = max(calibration / reference, 1.0)
+
+            wall_time, peak_memory = measure(function, args.repeats)
+            # Stored at the speed of the baselines, so they stay comparable
+            results[name] = {"time": wall_time / speed, "peak_memory": peak_memory}
+
+            ratio = ""
+            baseline = baseline_cases.get(name)
+            if baseline is not None:
+                expected_time = baseline["time"] * speed
+                ratio = f"{wall_time / expected_time:.2f}x"
+                slowdown = wall_time - expected_time
+                if (
+                    wall_time > expected_time * (1 + args.time_tolerance)
+                    and slowdown * 1e3 > args.time_floor
+                ):
+                    regressions.append(f"{name}: {ratio} slower")
+                # Ignore the noise of small allocations
+                allowed_memory = (
+                    baseline["peak_memory"] * (1 + args.memory_tolerance) + 0.1
+                )
+                if peak_memory > allowed_memory:
+                    regressions.append(
+                        f"{name}: {peak_memory:.1f} MB peak instead of "
+                        f"{baseline['peak_memory']:.1f} MB"
+                    )
+
+            print(
+                f"{name:<58} {wall_time * 1e3:>10.3f} {1 / wall_time:>9.1f} "
+                f"{peak_memory:>10.2f} {ratio:>8}"
+            )
+
+    if args.update_baselines:
+        baseline_cases.update(results)
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(
+                {
+                    "machine": platform.platform(),
+                    "calibration": float(reference),
+                    "cases": baseline_cases,
+                },
+                f,
+                indent=4,
+                sort_keys=True,
+            )
+        print(f"Baselines saved to {BASELINES_PATH}")
+        return
+
+    if baselines.get("machine") not in (None, platform.platform()):
+        print(f"Warning: the baselines were measured on {baselines['machine']}")
+
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
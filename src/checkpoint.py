@@ -0,0 +1,115 @@
+"""
+Checkpoints of the mechanical state of a scene, to warm-start runs.
+
+A checkpoint holds the state vectors of every MechanicalObject of the scene (the
+membrane dofs, the rigidified structure, the indenters, and the mapped collision
+and visual states) and the simulation time, in a single binary .npz file keyed by
+the link path of the components. Only the state is saved, the components of
+the scene must be the same:
+
+    from checkpoint import load_checkpoint, save_checkpoint
+    save_checkpoint(root, "settled.npz")  # After letting the scene settle
+    load_checkpoint(root, "settled.npz")  # After Sofa.Simulation.init
+
+Loading only takes copying the arrays into the components, so a run resumes from
+a settled membrane without simulating the settling steps again.
+"""
+
+import os
+
+import numpy as np
+
+# State vectors of a MechanicalObject restored from a checkpoint. The other ones
+# (free motion, forces, constraint solver) are recomputed from them at every step.
+STATE_VECTORS = ["position", "velocity"]
+
+TIME_KEY = "time"
+
+
+def mechanical_objects(node):
+    """
+    Yields every MechanicalObject under a node, depth first.
+    """
+    for obj in node.objects:
+        if obj.getClassName() == "MechanicalObject":
+            yield obj
+    for child in node.children:
+        yield from mechanical_objects(child)
+
+
+def state_key(obj, vector):
+    return f"{obj.getLinkPath()}:{vector}"
+
+
+def save_checkpoint(root, file_path):
+    """
+    Save the state vectors of every MechanicalObject of the scene and its time.
+    """
+    arrays = {TIME_KEY: np.array(root.time.value)}
+    for obj in mechanical_objects(root):
+        for vector in STATE_VECTORS:
+            data = obj.getData(vector)
+            if data is not None:
+                arrays[state_key(obj, vector)] = np.array(data.value)
+
+    # Write then rename, so concurrent runs never load a partial file
+    temporary_path = f"{file_path}.{os.getpid()}.tmp.npz"
+    np.savez(temporary_path, **arrays)
+    os.replace(temporary_path, file_path)
+
+
+def under_any(path, prefixes):
+    """
+    Whether a link path is one of the prefixes or under one of them.
+    """
+    return any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes)
+
+
+def load_checkpoint(root, file_path, prefixes=None, restore_time=True):
+    """
+    Restore the state vectors saved by save_checkpoint into the scene.
+
+    Args:
+        root: The root node of the initialized scene.
+        file_path: The checkpoint file.
+        prefixes: Optionally, only restore the components under one of these link
+            paths, matched by whole path components (e.g. "@/Modelling/Sensor"
+            matches "@/Modelling/Sensor/Membrane" but not "@/Modelling/SensorTop").
+        restore_time: Whether to also restore the simulation time.
+
+    Returns:
+        The number of restored MechanicalObjects.
+
+    Raises:
+        ValueError: If a saved state does not have the size of its component, e.g.
+            when the checkpoint comes from a scene with another mesh.
+    """
+    num_restored = 0
+    with np.load(file_path) as checkpoint:
+        for obj in mechanical_objects(root):
+            path = obj.getLinkPath()
+            if prefixes is not None and not under_any(path, prefixes):
+                continue
+
+            restored = False
+            for vector in STATE_VECTORS:
+                key = state_key(obj, vector)
+                data = obj.getData(vector)
+                if key not in checkpoint.files or data is None:
+                    continue
+
+                state = checkpoint[key]
+                with data.writeableArray() as array:
+                    if array.shape != state.shape:
+                        raise ValueError(
+                            f"The {vector} of {path} has the shape {array.shape}, "
+                            f"not {state.shape} like in {file_path}"
+                        )
+                    array[...] = state
+                restored = True
+            num_restored += restored
+
+        if restore_time:
+            root.time.value = float(checkpoint[TIME_KEY])
+
+    return num_restored
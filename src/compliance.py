@@ -0,0 +1,251 @@
+"""
+Offline computation of the compliance matrix of the membrane top surface.
+
+The membrane is built like in the Sensor prefab, with its bottom fixed, and solved
+statically: a small downward probe force is applied on every top vertex in turn
+and the downward displacements of all the top vertices give one column of the
+compliance matrix. The Sensor rigidifies the bottom nodes into a frame that no
+solver moves (only the DeformableParts are simulated), which holds them at rest
+like the FixedProjectiveConstraint used here, without needing stlib3. The matrix
+is linearized at rest and only relates the normal (Y) forces and displacements,
+which is what the depth map sees. It is saved next to the collision mesh and used
+at runtime by elements/sensor/surrogate.py, which solves the contact of an
+indenter in milliseconds without SOFA:
+
+    from elements.sensor.surrogate import ComplianceSurrogate, indenter_heights
+    surrogate = ComplianceSurrogate.load(file_path)
+    xz = surrogate.rest_positions[:, ::2]
+    heights = indenter_heights(xz, None, [0.0, 0.027, 0.0], [0.0, 0.0, 0.0], 0.005)
+    depth_map = surrogate.depth_map(heights, (249, 303))
+
+The compliance scales with 1 / youngModulus, so one matrix per mesh and Poisson
+ratio serves every Young's modulus (see ComplianceSurrogate.scaled). Usage (from
+the src directory):
+
+    python compliance.py
+    python compliance.py --volume-mesh ../data/mesh/sensor/Low-Even-Mesh.msh
+    python compliance.py --poisson-ratio 0.3 --force
+"""
+
+import argparse
+import os
+import time
+from os import path
+
+import numpy as np
+import Sofa
+import Sofa.Simulation
+
+from elements.mesh.cache import mesh_hash, selection_path
+from elements.sensor.box_selection import oriented_box_indexes, selected_triangles
+from elements.sensor.elasticmaterialobject import ElasticMaterialObject
+from elements.sensor.sensor import BOTTOM_BOX, SENSOR_FRAME, TOP_BOX
+from elements.sensor.surrogate import ComplianceSurrogate
+from params import (
+    COMPLIANCE_PROBE_FORCE,
+    MEMBRANE_POISSON_RATIO,
+    MEMBRANE_SURFACE_MESH_PATH,
+    MEMBRANE_VOLUME_MESH_PATH,
+    MEMBRANE_YOUNG_MODULUS,
+)
+from profiler import phase
+
+# Transform of the membrane meshes to the frame of the sensor
+MEMBRANE_ROTATION = SENSOR_FRAME["rotation"]
+MEMBRANE_TRANSLATION = SENSOR_FRAME["translation"]
+MEMBRANE_SCALE = SENSOR_FRAME["scale"]
+
+PLUGINS = [
+    "Sofa.Component.Constraint.Projective",
+    "Sofa.Component.IO.Mesh",
+    "Sofa.Component.LinearSolver.Direct",
+    "Sofa.Component.Mapping.Linear",
+    "Sofa.Component.Mass",
+    "Sofa.Component.MechanicalLoad",
+    "Sofa.Component.ODESolver.Backward",
+    "Sofa.Component.SolidMechanics.FEM.Elastic",
+    "Sofa.Component.StateContainer",
+    "Sofa.Component.Topology.Container.Constant",
+    "Sofa.Component.Topology.Container.Dynamic",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compute the compliance matrix of the membrane top surface."
+    )
+    parser.add_argument("--volume-mesh", default=MEMBRANE_VOLUME_MESH_PATH)
+    parser.add_argument("--surface-mesh", default=MEMBRANE_SURFACE_MESH_PATH)
+    parser.add_argument("--young-modulus", type=float, default=MEMBRANE_YOUNG_MODULUS)
+    parser.add_argument("--poisson-ratio", type=float, default=MEMBRANE_POISSON_RATIO)
+    parser.add_argument(
+        "--probe-force",
+        type=float,
+        default=COMPLIANCE_PROBE_FORCE,
+        help="Downward force applied on every top vertex in turn, in N",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Recompute an already saved matrix"
+    )
+    return parser.parse_args()
+
+
+def compliance_path(volume_mesh_path, surface_mesh_path, poissonRatio):
+    """
+    The path of the compliance matrix of a membrane, next to its surface mesh.
+    The Young's modulus is not part of the key, the matrix is rescaled instead.
+    """
+    return selection_path(
+        surface_mesh_path,
+        "Compliance",
+        {
+            "volume": mesh_hash(volume_mesh_path),
+            "poissonRatio": poissonRatio,
+            "rotation": MEMBRANE_ROTATION,
+            "translation": MEMBRANE_TRANSLATION,
+            "scale": MEMBRANE_SCALE,
+            "bottom": BOTTOM_BOX,
+            "top": TOP_BOX,
+        },
+        ".npz",
+    )
+
+
+def build(volume_mesh_path, surface_mesh_path, youngModulus, poissonRatio):
+    """
+    Build and initialize the static scene of the membrane, with its bottom fixed and
+    a force field on its top vertices.
+
+    Returns:
+        The root node, the collision model of the membrane, the indexes of the top
+        vertices in it and their force field.
+    """
+    root = Sofa.Core.Node("root")
+    root.gravity = [0.0, 0.0, 0.0]
+    for plugin in PLUGINS:
+        root.addObject("RequiredPlugin", name=plugin)
+
+    node = root.addChild("Simulation")
+    node.addObject("StaticSolver", name="static", newton_iterations=1)
+    node.addObject(
+        "SparseLDLSolver", name="solver", template="CompressedRowSparseMatrixd"
+    )
+    membrane = node.addChild(
+        ElasticMaterialObject(
+            name="Membrane",
+            volumeMeshFileName=volume_mesh_path,
+            rotation=MEMBRANE_ROTATION,
+            translation=MEMBRANE_TRANSLATION,
+            scale=MEMBRANE_SCALE,
+            collisionMesh=surface_mesh_path,
+            withConstrain=False,
+            poissonRatio=poissonRatio,
+            youngModulus=youngModulus,
+            solverName="static",
+        )
+    )
+    membrane.init()
+
+    bottom_indexes = oriented_box_indexes(
+        membrane.dofs.rest_position.value, **BOTTOM_BOX
+    )
+    membrane.addObject(
+        "FixedProjectiveConstraint", name="fixed", indices=bottom_indexes.tolist()
+    )
+
+    collision_model = membrane.CollisionModel
+    top_indexes = oriented_box_indexes(
+        collision_model.dofs.rest_position.value, **TOP_BOX
+    )
+    probe = collision_model.addObject(
+        "ConstantForceField",
+        name="probe",
+        indices=top_indexes.tolist(),
+        forces=np.zeros((len(top_indexes), 3)).tolist(),
+    )
+
+    Sofa.Simulation.init(root)
+    return root, collision_model, top_indexes, probe
+
+
+def compute_compliance(
+    volume_mesh_path, surface_mesh_path, youngModulus, poissonRatio, probe_force
+):
+    """
+    Compute the compliance matrix of the top surface, one static solve per top
+    vertex.
+
+    Returns:
+        A ComplianceSurrogate.
+    """
+    with phase("compliance scene"):
+        root, collision_model, top_indexes, probe = build(
+            volume_mesh_path, surface_mesh_path, youngModulus, poissonRatio
+        )
+
+    rest_positions = np.take(
+        collision_model.dofs.rest_position.value, top_indexes, axis=0
+    )
+    triangles = selected_triangles(
+        collision_model.container.triangles.value,
+        len(collision_model.dofs.rest_position.value),
+        top_indexes,
+    )
+
+    num_vertices = len(top_indexes)
+    compliance = np.empty((num_vertices, num_vertices))
+    start = time.perf_counter()
+    with phase("compliance probes"):
+        for j in range(num_vertices):
+            Sofa.Simulation.reset(root)
+            with probe.forces.writeableArray() as forces:
+                forces[...] = 0.0
+                forces[j, 1] = -probe_force
+            Sofa.Simulation.animate(root, root.dt.value)
+
+            positions = np.take(
+                collision_model.dofs.position.value, top_indexes, axis=0
+            )
+            compliance[:, j] = (rest_positions[:, 1] - positions[:, 1]) / probe_force
+
+            if (j + 1) % 100 == 0 or j + 1 == num_vertices:
+                print(
+                    f"{j + 1}/{num_vertices} probes in "
+                    f"{time.perf_counter() - start:.1f} s"
+                )
+
+    # The linearized operator is symmetric, remove the asymmetry of the solver
+    compliance = (compliance + compliance.T) / 2
+
+    return ComplianceSurrogate(
+        rest_positions, triangles, compliance, youngModulus, poissonRatio
+    )
+
+
+def main():
+    args = parse_args()
+
+    # Mesh paths are relative to the src directory
+    os.chdir(path.dirname(path.abspath(__file__)))
+
+    file_path = compliance_path(args.volume_mesh, args.surface_mesh, args.poisson_ratio)
+    if path.exists(file_path) and not args.force:
+        print(f"Compliance matrix already in {file_path}")
+        return
+
+    surrogate = compute_compliance(
+        args.volume_mesh,
+        args.surface_mesh,
+        args.young_modulus,
+        args.poisson_ratio,
+        args.probe_force,
+    )
+    surrogate.save(file_path)
+    print(
+        f"Compliance matrix of {len(surrogate.rest_positions)} top vertices "
+        f"saved to {file_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Paths of the files derived from a mesh (selections, submeshes, proxies, ...).
+
+Derived files only depend on the mesh and on the parameters they are computed
+with, so they are stored next to the mesh, under a key made of the hash of the mesh
+content and of the parameters.
+"""
+
+import hashlib
+import json
+from os import path
+
+_mesh_hashes = {}
+
+
+def mesh_hash(mesh_path):
+    """
+    The SHA-256 of the content of a mesh file, computed once per process.
+    """
+    if mesh_path not in _mesh_hashes:
+        digest = hashlib.sha256()
+        with open(mesh_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _mesh_hashes[mesh_path] = digest.hexdigest()
+    return _mesh_hashes[mesh_path]
+
+
+def selection_path(mesh_path, name, parameters, extension=".npy"):
+    """
+    The path of the cache file of a selection.
+
+    Args:
+        mesh_path: The mesh the selection is made on.
+        name: The name of the selection (e.g. "TopBoxROI").
+        parameters: A JSON serializable dictionary of everything the selection
+            depends on besides the mesh content (transform of the mesh, box, ...).
+        extension: The extension of the cache file.
+    """
+    key = hashlib.sha256()
+    key.update(mesh_hash(mesh_path).encode())
+    key.update(json.dumps(parameters, sort_keys=True).encode())
+
+    mesh_name = path.splitext(mesh_path)[0]
+    return f"{mesh_name}.{name}-{key.hexdigest()[:16]}{extension}"
@@ -0,0 +1,106 @@
+"""
+Decimation of triangle meshes into coarse collision proxies.
+"""
+
+import os
+
+import numpy as np
+
+from .cache import selection_path
+from .stl import facets_from_triangles, indexed_triangles, read_stl, write_stl
+
+
+def cluster_vertices(vertices, triangles, cell_size):
+    """
+    Decimates a mesh by merging the vertices falling in the same cell of a grid.
+
+    Args:
+        vertices: A NumPy array of shape (N, 3).
+        triangles: A NumPy array of shape (M, 3) of indexes into the vertices.
+        cell_size: The size of the cells of the grid.
+
+    Returns:
+        The vertices of the clusters (mean of their vertices) and the triangles
+        between them, without degenerate or duplicate triangles.
+    """
+    cells = np.floor((vertices - vertices.min(axis=0)) / cell_size).astype(np.int64)
+    _, clusters, counts = np.unique(
+        cells, axis=0, return_inverse=True, return_counts=True
+    )
+    clusters = clusters.ravel()
+
+    cluster_vertices = np.zeros((len(counts), 3))
+    np.add.at(cluster_vertices, clusters, vertices)
+    cluster_vertices /= counts[:, None]
+
+    cluster_triangles = clusters[triangles]
+    degenerate = (
+        (cluster_triangles[:, 0] == cluster_triangles[:, 1])
+        | (cluster_triangles[:, 1] == cluster_triangles[:, 2])
+        | (cluster_triangles[:, 0] == cluster_triangles[:, 2])
+    )
+    cluster_triangles = cluster_triangles[~degenerate]
+
+    # Keep the first of the triangles with the same vertices, in its orientation
+    _, first = np.unique(np.sort(cluster_triangles, axis=1), axis=0, return_index=True)
+    cluster_triangles = cluster_triangles[np.sort(first)]
+
+    return cluster_vertices, cluster_triangles
+
+
+def decimate(vertices, triangles, target_triangles, iterations=30):
+    """
+    Decimates a mesh by vertex clustering down to at most target_triangles.
+
+    The cell size of the grid is found by bisection, so the proxy keeps as many
+    triangles as possible under the target.
+    """
+    if len(triangles) <= target_triangles:
+        return vertices, triangles
+
+    low = 0.0
+    high = np.ptp(vertices, axis=0).max()
+    best = cluster_vertices(vertices, triangles, high)
+
+    for _ in range(iterations):
+        cell_size = (low + high) / 2
+        decimated = cluster_vertices(vertices, triangles, cell_size)
+        if len(decimated[1]) > target_triangles:
+            low = cell_size
+        else:
+            high = cell_size
+            best = decimated
+
+    return best
+
+
+def collision_proxy(mesh_path, target_triangles):
+    """
+    Get the path of a decimated copy of a binary STL mesh.
+
+    The proxy is written next to the mesh the first time, under a name keyed by the
+    mesh content and the target number of triangles. Meshes already under the target
+    are used as they are.
+    """
+    file_path = selection_path(
+        mesh_path,
+        "CollisionProxy",
+        {"triangles": target_triangles},
+        extension=".stl",
+    )
+    if os.path.exists(file_path):
+        return file_path
+
+    facets = read_stl(mesh_path)
+    if len(facets) <= target_triangles:
+        return mesh_path
+
+    vertices, triangles = indexed_triangles(facets)
+    vertices, triangles = decimate(vertices, triangles, target_triangles)
+
+    write_stl(
+        file_path,
+        facets_from_triangles(vertices, triangles),
+        header=b"Collision proxy",
+    )
+    return file_path
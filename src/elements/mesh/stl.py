@@ -0,0 +1,71 @@
+"""
+Reading and writing of binary STL files with NumPy.
+"""
+
+import os
+
+import numpy as np
+
+STL_FACET = np.dtype(
+    [("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")]
+)
+
+
+def read_stl(file_path):
+    """
+    Reads the facets of a binary STL file.
+
+    Returns:
+        A structured NumPy array of STL_FACET.
+    """
+    with open(file_path, "rb") as f:
+        f.read(80)  # Header
+        num_facets = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+        facets = np.frombuffer(f.read(), dtype=STL_FACET, count=-1)
+
+    if len(facets) != num_facets:
+        raise ValueError(f"{file_path} is not a binary STL file")
+
+    return facets
+
+
+def write_stl(file_path, facets, header=b""):
+    # Write then rename, so concurrent runs never load a partial file
+    temporary_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(header[:80].ljust(80, b" "))
+        f.write(np.uint32(len(facets)).tobytes())
+        f.write(facets.astype(STL_FACET).tobytes())
+    os.replace(temporary_path, file_path)
+
+
+def facets_from_triangles(vertices, triangles):
+    """
+    Builds STL facets, with their normals, from indexed triangles.
+
+    Args:
+        vertices: A NumPy array of shape (N, 3).
+        triangles: A NumPy array of shape (M, 3) of indexes into the vertices.
+    """
+    corners = vertices[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals /= np.where(lengths > 0, lengths, 1)
+
+    facets = np.zeros(len(triangles), dtype=STL_FACET)
+    facets["normal"] = normals
+    facets["vertices"] = corners
+    return facets
+
+
+def indexed_triangles(facets):
+    """
+    Merges the identical vertices of STL facets.
+
+    Returns:
+        The (N, 3) unique vertices and the (M, 3) triangles indexing them.
+    """
+    vertices, inverse = np.unique(
+        facets["vertices"].reshape(-1, 3), axis=0, return_inverse=True
+    )
+    return vertices.astype(np.float64), inverse.reshape(-1, 3)
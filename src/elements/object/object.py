@@ -2,6 +2,9 @@
 
 import Sofa
 
+from elements.mesh.decimation import collision_proxy
+from profiler import phase
+
 
 class Object(Sofa.Prefab):
 
@@ -66,12 +69,28 @@ class Object(Sofa.Prefab):
             "help": "Inertia matrix of the object",
             "default": [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]],
         },
+        {
+            "name": "collisionTriangles",
+            "type": "int",
+            "help": "Number of triangles of the collision proxy (0 for the full mesh)",
+            "default": 0,
+        },
+        {
+            "name": "visual",
+            "type": "bool",
+            "help": "Add the visual model (needs an OpenGL context)",
+            "default": True,
+        },
     ]
 
     def __init__(self, *args, **kwargs):
         Sofa.Prefab.__init__(self, *args, **kwargs)
 
     def init(self):
+        with phase(f"Object.init ({self.name.value})"):
+            self.build()
+
+    def build(self):
         self.requiredPlugins = [
             "Sofa.Component.Collision.Geometry",
             "Sofa.Component.Mapping.NonLinear",
@@ -80,24 +99,25 @@ class Object(Sofa.Prefab):
             "Sofa.Component.Mass",
         ]
 
-        self.addObject(
-            "MechanicalObject",
-            name="mstate",
-            template="Rigid3",
-            translation=self.translation.value,
-            rotation=self.rotation.value,
-            scale3d=self.scale3d.value,
-        )
+        with phase("mstate and mass"):
+            self.addObject(
+                "MechanicalObject",
+                name="mstate",
+                template="Rigid3",
+                translation=self.translation.value,
+                rotation=self.rotation.value,
+                scale3d=self.scale3d.value,
+            )
 
-        self.addObject(
-            "UniformMass",
-            name="mass",
-            vertexMass=[
-                self.totalMass.value,
-                self.volume.value,
-                self.inertiaMatrix.value,
-            ],
-        )
+            self.addObject(
+                "UniformMass",
+                name="mass",
+                vertexMass=[
+                    self.totalMass.value,
+                    self.volume.value,
+                    self.inertiaMatrix.value,
+                ],
+            )
 
         if not self.isStatic.value:
             self.addObject("EulerImplicitSolver")
@@ -106,29 +126,45 @@ class Object(Sofa.Prefab):
             )
 
         if self.meshPath.value:
-            self.addVisualModel()
-            self.addCollisionModel()
-
-        self.addObject(
-            "RequiredPlugin",
-            pluginName=self.requiredPlugins,
-        )
+            # Loaded once, shared by the visual model and the full collision model
+            with phase("MeshSTLLoader"):
+                self.addMeshSTLLoader(self, self.meshPath.value)
+            if self.visual.value:
+                with phase("visual model"):
+                    self.addVisualModel()
+            with phase("collision model"):
+                self.addCollisionModel()
+
+        with phase("RequiredPlugin"):
+            self.addObject(
+                "RequiredPlugin",
+                pluginName=self.requiredPlugins,
+            )
 
-    def addMeshSTLLoader(self, obj):
-        self.requiredPlugins.append("Sofa.Component.IO.Mesh")
-        meshLoader = obj.addObject(
+    def addMeshSTLLoader(self, obj, filename):
+        if "Sofa.Component.IO.Mesh" not in self.requiredPlugins:
+            self.requiredPlugins.append("Sofa.Component.IO.Mesh")
+        obj.addObject(
             "MeshSTLLoader",
             name="loader",
-            filename=self.meshPath.value,
+            filename=filename,
             triangulate=True,
             scale3d=self.scale3d.value,
         )
 
     def addCollisionModel(self):
         collision = self.addChild("Collision")
-        self.addMeshSTLLoader(collision)
 
-        collision.addObject("MeshTopology", src=collision.loader.getLinkPath())
+        loader = self.loader
+        if self.collisionTriangles.value > 0:
+            proxyPath = collision_proxy(
+                self.meshPath.value, self.collisionTriangles.value
+            )
+            if proxyPath != self.meshPath.value:
+                self.addMeshSTLLoader(collision, proxyPath)
+                loader = collision.loader
+
+        collision.addObject("MeshTopology", src=loader.getLinkPath())
         collision.addObject("MechanicalObject")
 
         if self.isStatic.value:
@@ -162,8 +198,7 @@ class Object(Sofa.Prefab):
         self.requiredPlugins.append("Sofa.GL.Component.Rendering3D")
 
         visual = self.addChild("Visual")
-        self.addMeshSTLLoader(visual)
         visual.addObject(
-            "OglModel", src=visual.loader.getLinkPath(), color=self.color.value
+            "OglModel", src=self.loader.getLinkPath(), color=self.color.value
         )
         visual.addObject("RigidMapping")
@@ -1,13 +1,34 @@
-import math
-
+import numpy as np
 import Sofa
+from scipy.spatial.transform import Rotation
+
+from .trajectory import load_trajectory, oscillate
+
+
+def rest_pose(mstate):
+    """
+    The (x, y, z, qx, qy, qz, qw) pose a Rigid3 MechanicalObject of one frame gets
+    at its init: the frame at the origin is rotated then translated by rotation and
+    translation, then by rotation2 and translation2 (Euler angles in degrees,
+    static X, Y then Z axes). It is known before the scene is initialized.
+    """
+    rotation = Rotation.from_euler("xyz", mstate.rotation.value, degrees=True)
+    rotation2 = Rotation.from_euler("xyz", mstate.rotation2.value, degrees=True)
+    position = rotation2.apply(mstate.translation.value) + mstate.translation2.value
+    return np.concatenate((position, (rotation2 * rotation).as_quat()))
 
 
 class ObjectController(Sofa.Core.Controller):
     """
-    Control the movement of a controller.
-    Moves the object up and down on the y-axis over a period of time.
+    Control the movement of an object along a 6-DoF trajectory.
 
+    The trajectory is a Trajectory (see trajectory.py) or the path of a CSV or .npy
+    file of waypoints. By default the object moves up and down on the y-axis over a
+    period of time. The poses of every step are computed when the controller is
+    created, from the rest pose of the object (see rest_pose), then every step only
+    copies one into the positions of the object. The pose follows the simulation
+    time, so a scene restored from a checkpoint (see checkpoint.py) resumes its
+    trajectory.
     """
 
     def __init__(self, *args, **kwargs):
@@ -16,18 +37,30 @@ class ObjectController(Sofa.Core.Controller):
         self.node = kwargs["node"]
         self.object = kwargs["object"]
         self.period = 0.5 if "period" not in kwargs else kwargs["period"]
-        self.time = 0.0
         self.delta_y = 0.004 if "delta_y" not in kwargs else kwargs["delta_y"]
 
+        trajectory = (
+            oscillate(self.period, self.delta_y)
+            if "trajectory" not in kwargs
+            else kwargs["trajectory"]
+        )
+        if isinstance(trajectory, str):
+            trajectory = load_trajectory(trajectory)
+        self.trajectory = trajectory
+
+        self.poses = trajectory.poses(rest_pose(self.object), self.node.dt.value)
+
     def init(self):
         pass
 
     def onAnimateBeginEvent(self, eventType):
-        self.time += self.node.dt.value
-        base_position = list(self.object.reset_position.value[0])
-        # Start from the top
-        base_position[1] = base_position[1] + self.delta_y / 2 * (
-            math.cos(2 * math.pi * self.time / self.period) - 1
-        )
+        # Pose at the end of the step
+        step = round(self.node.time.value / self.node.dt.value) + 1
+        if self.trajectory.loop:
+            index = step % len(self.poses)
+        else:
+            index = min(step, len(self.poses) - 1)
+
         # Change position of object
-        self.object.position.value = [base_position]
+        with self.object.position.writeableArray() as position:
+            position[0] = self.poses[index]
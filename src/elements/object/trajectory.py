@@ -0,0 +1,189 @@
+"""
+6-DoF trajectories of the indenters, sampled once for the whole simulation.
+
+A trajectory is a list of waypoints (t, dx, dy, dz, rx, ry, rz): the offset of the
+object from its rest pose at time t, the rotation being XYZ Euler angles in
+degrees. Waypoints are linearly interpolated. They come from a CSV or .npy file,
+or from the analytic generators below. This module does not depend on SOFA.
+"""
+
+import math
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+# Number of waypoints of the smooth analytic trajectories
+NUM_WAYPOINTS = 256
+
+AXES = {"x": 0, "y": 1, "z": 2}
+
+
+class Trajectory:
+    """
+    Offsets of an object from its rest pose, as waypoints.
+    """
+
+    def __init__(self, times, offsets, loop=False):
+        """
+        Args:
+            times: A NumPy array of shape (T,), the increasing times of the waypoints.
+            offsets: A NumPy array of shape (T, 6), the (dx, dy, dz, rx, ry, rz)
+                offsets of the waypoints.
+            loop: Whether the trajectory starts over after its last waypoint.
+        """
+        self.times = np.asarray(times, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 6)
+        self.loop = loop
+
+        if len(self.times) != len(self.offsets):
+            raise ValueError("A trajectory needs as many times as offsets")
+        if len(self.times) == 0 or np.any(np.diff(self.times) <= 0):
+            raise ValueError("The times of a trajectory must be increasing")
+
+    @property
+    def duration(self):
+        return self.times[-1]
+
+    def sample(self, dt):
+        """
+        Interpolates the offsets at every multiple of dt.
+
+        Looping trajectories are sampled over one period, the others until their
+        last waypoint, which is then held.
+
+        Returns:
+            A NumPy array of shape (num_samples, 6).
+        """
+        if self.loop:
+            num_samples = max(round(self.duration / dt), 1)
+        else:
+            num_samples = math.floor(self.duration / dt + 1e-9) + 1
+        times = np.arange(num_samples) * dt
+
+        offsets = np.empty((num_samples, 6))
+        for column in range(6):
+            offsets[:, column] = np.interp(times, self.times, self.offsets[:, column])
+        return offsets
+
+    def poses(self, rest_pose, dt):
+        """
+        Computes the Rigid3 poses of an object at every multiple of dt.
+
+        Translations are added to the rest position and rotations are applied on
+        top of the rest orientation, in the frame of the scene.
+
+        Args:
+            rest_pose: The (x, y, z, qx, qy, qz, qw) rest pose of the object.
+            dt: The time step of the simulation.
+
+        Returns:
+            A contiguous NumPy array of shape (num_samples, 7).
+        """
+        rest_pose = np.asarray(rest_pose, dtype=np.float64)
+        offsets = self.sample(dt)
+
+        poses = np.empty((len(offsets), 7))
+        poses[:, :3] = rest_pose[:3] + offsets[:, :3]
+        rotations = Rotation.from_euler("xyz", offsets[:, 3:], degrees=True)
+        poses[:, 3:] = (rotations * Rotation.from_quat(rest_pose[3:])).as_quat()
+        return poses
+
+
+def load_trajectory(file_path, loop=False):
+    """
+    Loads the waypoints of a trajectory from a .npy file of shape (T, 7) or from a
+    CSV file with the columns t, dx, dy, dz, rx, ry, rz and an optional header.
+    """
+    if file_path.endswith(".npy"):
+        waypoints = np.load(file_path)
+    else:
+        with open(file_path) as f:
+            first_field = f.readline().split(",")[0]
+        try:
+            float(first_field)
+            has_header = False
+        except ValueError:
+            has_header = True
+        waypoints = np.loadtxt(
+            file_path, delimiter=",", skiprows=1 if has_header else 0, ndmin=2
+        )
+
+    if waypoints.ndim != 2 or waypoints.shape[1] != 7:
+        raise ValueError(
+            f"Expected (T, 7) waypoints (t, dx, dy, dz, rx, ry, rz), got "
+            f"{waypoints.shape} from {file_path}"
+        )
+    return Trajectory(waypoints[:, 0], waypoints[:, 1:], loop)
+
+
+def oscillate(period=0.5, delta_y=0.004):
+    """
+    Moves down by delta_y and back up along a cosine, over and over.
+    """
+    times = np.linspace(0.0, period, NUM_WAYPOINTS)
+    offsets = np.zeros((NUM_WAYPOINTS, 6))
+    offsets[:, 1] = delta_y / 2 * (np.cos(2 * np.pi * times / period) - 1)
+    return Trajectory(times, offsets, loop=True)
+
+
+def press(depth=0.002, duration=1.0, hold=0.0):
+    """
+    Moves down by depth, holds, then moves back up.
+    """
+    half = duration / 2
+    if hold > 0:
+        times = [0.0, half, half + hold, duration + hold]
+    else:
+        times = [0.0, half, duration]
+    offsets = np.zeros((len(times), 6))
+    offsets[1:-1, 1] = -depth
+    return Trajectory(times, offsets)
+
+
+def slide(depth=0.002, distance=0.005, duration=1.5, axis="x"):
+    """
+    Moves down by depth, slides by distance along an horizontal axis, then moves up.
+    """
+    times = np.linspace(0.0, duration, 4)
+    offsets = np.zeros((4, 6))
+    offsets[1:3, 1] = -depth
+    offsets[2:, AXES[axis]] = distance
+    return Trajectory(times, offsets)
+
+
+def rotate(depth=0.002, angle=30.0, duration=1.5, axis="y"):
+    """
+    Moves down by depth, rotates by angle (in degrees) around an axis, then moves up.
+    """
+    times = np.linspace(0.0, duration, 4)
+    offsets = np.zeros((4, 6))
+    offsets[1:3, 1] = -depth
+    offsets[2:, 3 + AXES[axis]] = angle
+    return Trajectory(times, offsets)
+
+
+GENERATORS = {
+    "oscillate": oscillate,
+    "press": press,
+    "slide": slide,
+    "rotate": rotate,
+}
+
+
+def trajectory_from_spec(spec):
+    """
+    Builds a trajectory from a dictionary, either an analytic one,
+    {"type": "slide", "depth": 0.002, "distance": 0.005}, or a file,
+    {"type": "file", "path": "trajectory.csv", "loop": false}.
+    """
+    parameters = dict(spec)
+    trajectory_type = parameters.pop("type")
+
+    if trajectory_type == "file":
+        return load_trajectory(parameters["path"], parameters.get("loop", False))
+    if trajectory_type not in GENERATORS:
+        raise ValueError(
+            f'Unknown trajectory type "{trajectory_type}", expected "file" or one '
+            f"of {', '.join(GENERATORS)}"
+        )
+    return GENERATORS[trajectory_type](**parameters)
@@ -0,0 +1,56 @@
+"""
+Selection of the nodes of a mesh inside an oriented box, with NumPy.
+
+This computes the same index sets as the BoxROI added by stlib3's
+addOrientedBoxRoi, without adding components to the scene graph.
+"""
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+
+def oriented_box_indexes(
+    positions, translation, eulerRotation=[0.0, 0.0, 0.0], scale=[1.0, 1.0, 1.0]
+):
+    """
+    Finds the points inside an oriented box.
+
+    Args:
+        positions: A NumPy array of shape (N, 3) of points.
+        translation: The center of the box.
+        eulerRotation: The rotation of the box, in degrees (static X, Y then Z axes).
+        scale: The size of the box along its axes.
+
+    Returns:
+        An int64 NumPy array of the indexes of the points inside the box (bounds
+        included), in increasing order.
+    """
+    rotation = Rotation.from_euler("xyz", eulerRotation, degrees=True).as_matrix()
+
+    # Coordinates of the points in the frame of the box
+    local = (np.asarray(positions, dtype=np.float64) - translation) @ rotation
+    half_extents = np.abs(scale) / 2
+
+    inside = (np.abs(local) <= half_extents * (1 + 1e-9)).all(axis=1)
+    return np.flatnonzero(inside)
+
+
+def selected_triangles(triangles, num_vertices, indexes):
+    """
+    Finds the triangles whose three vertices are selected.
+
+    Args:
+        triangles: A NumPy array of shape (M, 3) of indexes into the mesh vertices.
+        num_vertices: The number of vertices of the mesh.
+        indexes: The indexes of the selected vertices.
+
+    Returns:
+        The selected triangles, indexing the selected vertices in the order of
+        indexes.
+    """
+    # Map mesh indexes to positions in indexes (-1 if not selected)
+    lookup = np.full(num_vertices, -1)
+    lookup[indexes] = np.arange(len(indexes))
+
+    selected = lookup[np.asarray(triangles, dtype=np.int64)]
+    return selected[(selected >= 0).all(axis=1)]
@@ -0,0 +1,594 @@
+"""
+Rasterization of the membrane top surface into depth map images.
+
+These functions only depend on NumPy and SciPy, so they can be used (and
+benchmarked) outside of a SOFA scene.
+
+The image is rasterized in bands of rows whose working memory fits a budget, so
+the memory does not grow with the resolution, and the bands can be rendered by
+several threads.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Working memory of the rasterization by default, shared by its threads
+DEFAULT_MEMORY_BUDGET = 16 * 2**20  # bytes
+
+# Working memory of one (pixel, triangle) candidate of _rasterize_batch
+CANDIDATE_BYTES = 128
+
+# Maximum number of triangles rasterized at once
+BATCH_SIZE = 1024
+
+# Output types of tiled_image, with the value of the highest depth
+IMAGE_DTYPES = {"float32": 1.0, "float64": 1.0, "uint16": 65535.0, "uint8": 255.0}
+
+
+def normalize_triplets(triplets):
+    """
+    Normalizes each column of the triplets between 0 and 1.
+
+    Args:
+        triplets: A NumPy array of shape (N, 3) where each row is (X, Y, Z).
+
+    Returns:
+        A new float64 NumPy array of shape (N, 3) with normalized coordinates.
+    """
+    triplets = np.array(triplets, dtype=np.float64)
+    min_values = triplets.min(axis=0)
+    max_values = triplets.max(axis=0)
+    return (triplets - min_values) / (max_values - min_values)
+
+
+def pixel_centers(image_size):
+    """
+    Computes the normalized (X, Z) coordinates of the center of every pixel.
+
+    Args:
+        image_size: The size of the image as (rows, columns).
+
+    Returns:
+        A NumPy array of shape (rows * columns, 2), in row-major pixel order.
+    """
+    return _band_pixel_centers(image_size, 0, image_size[0])
+
+
+def _band_pixel_centers(image_size, start, stop):
+    """
+    The normalized (X, Z) pixel centers of the rows start to stop of an image.
+    """
+    rows, columns = image_size
+    centers = np.empty((stop - start, columns, 2))
+    centers[:, :, 0] = (np.arange(columns) + 0.5) / columns
+    centers[:, :, 1] = ((np.arange(start, stop) + 0.5) / rows)[:, None]
+    return centers.reshape(-1, 2)
+
+
+def row_bands(image_size, memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """
+    Splits the rows of an image into bands rasterized within a memory budget.
+
+    Every worker gets an equal share of the budget, and there are at least as many
+    bands as workers.
+
+    Returns:
+        A list of (start, stop) row ranges.
+    """
+    rows, columns = image_size
+    workers = max(workers, 1)
+    band_rows = memory_budget // workers // (columns * CANDIDATE_BYTES)
+    band_rows = int(max(1, min(band_rows, -(-rows // workers))))
+    return [
+        (start, min(start + band_rows, rows)) for start in range(0, rows, band_rows)
+    ]
+
+
+def _map_bands(function, bands, workers):
+    """
+    Calls function on every band, in threads when there are several workers.
+    """
+    if workers <= 1 or len(bands) == 1:
+        for band in bands:
+            function(band)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(function, bands):
+            pass
+
+
+def nearest_vertex(triplets, i, j):
+    """
+    Finds the nearest neighbor (X, Z) coordinates in the triplets for a given point.
+
+    Args:
+        triplets: A NumPy array of shape (N, 3) where each row is (X, Y, Z).
+        i: The x-coordinate of the desired point.
+        j: The z-coordinate of the desired point.
+
+    Returns:
+        The (X, Y, Z) row of the nearest neighbor.
+    """
+    # Calculate Euclidean distances between the point and all triplets
+    distances = np.sqrt(np.sum((triplets[:, [0, 2]] - [i, j]) ** 2, axis=1))
+    # Find the index of the minimum distance (nearest neighbor)
+    return triplets[np.argmin(distances)]
+
+
+def nearest_neighbor_image(triplets, image_size):
+    """
+    Maps triplets of values (X, Y, Z) to an image using a nearest neighbor strategy.
+
+    A KD-tree is built once over the normalized (X, Z) coordinates and the pixel
+    centers are queried by bands of rows.
+
+    Args:
+        triplets: A NumPy array of shape (N, 3) where each row is (X, Y, Z).
+        image_size: The size of the image (e.g., (83, 101)).
+
+    Returns:
+        A 2D NumPy array representing the grayscale image.
+    """
+    return tiled_image(triplets, None, image_size, "nearest", dtype="float64")
+
+
+def interpolated_image(
+    triplets, triangles, image_size, memory_budget=DEFAULT_MEMORY_BUDGET, workers=1
+):
+    """
+    Maps triplets of values (X, Y, Z) to an image by rasterizing the triangles
+    they form, interpolating the Y values with barycentric coordinates.
+
+    Triangles are projected on the (X, Z) plane and rasterized by batches into a
+    z-buffer that keeps, for every pixel, the lowest Y value (the closest to the
+    sensor camera). Pixels not covered by any triangle fall back to the value of
+    the nearest vertex.
+
+    Args:
+        triplets: A NumPy array of shape (N, 3) where each row is (X, Y, Z).
+        triangles: A NumPy array of shape (M, 3) of indexes into the triplets.
+        image_size: The size of the image (e.g., (83, 101)).
+        memory_budget: The working memory of the rasterization, in bytes.
+        workers: The number of threads rasterizing bands of rows.
+
+    Returns:
+        A 2D NumPy array representing the grayscale image.
+    """
+    return tiled_image(
+        triplets,
+        triangles,
+        image_size,
+        "interpolated",
+        memory_budget,
+        workers,
+        dtype="float64",
+    )
+
+
+def tiled_image(
+    triplets,
+    triangles,
+    image_size,
+    render_mode="interpolated",
+    memory_budget=DEFAULT_MEMORY_BUDGET,
+    workers=1,
+    dtype="float32",
+):
+    """
+    Renders the depth map of triplets of values (X, Y, Z) by bands of rows.
+
+    Every band is rasterized within its share of the memory budget and written
+    straight into the output type, so very large images only hold their output.
+
+    Args:
+        triplets: A NumPy array of shape (N, 3) where each row is (X, Y, Z).
+        triangles: A NumPy array of shape (M, 3) of indexes into the triplets, only
+            used by the "interpolated" render mode.
+        image_size: The size of the image as (rows, columns).
+        render_mode: "nearest" or "interpolated".
+        memory_budget: The working memory of the rasterization, in bytes.
+        workers: The number of threads rasterizing bands of rows.
+        dtype: One of IMAGE_DTYPES. Integer images span their whole range.
+
+    Returns:
+        A 2D NumPy array of dtype.
+    """
+    scale = IMAGE_DTYPES[dtype]
+    rasterizer = _BandRasterizer(triplets, triangles, image_size, render_mode)
+    out = np.empty(image_size, dtype=dtype)
+    max_candidates = memory_budget // max(workers, 1) // CANDIDATE_BYTES
+
+    def render(band):
+        start, stop = band
+        # float64 images are rasterized in place
+        depth = out[start:stop].reshape(-1) if out.dtype == np.float64 else None
+        depth, _, _ = rasterizer.rasterize(
+            band, max_candidates, with_weights=False, depth=depth
+        )
+        if out.dtype == np.float64:
+            return
+        if scale != 1.0:
+            depth *= scale
+            np.rint(depth, out=depth)
+        out[start:stop] = depth.reshape(stop - start, -1)
+
+    _map_bands(render, row_bands(image_size, memory_budget, workers), workers)
+    return out
+
+
+class _BandRasterizer:
+    """
+    Rasterizes bands of rows of the depth map of triplets of values (X, Y, Z).
+    """
+
+    def __init__(self, triplets, triangles, image_size, render_mode):
+        rows, columns = image_size
+        self.image_size = image_size
+        self.normalized = normalize_triplets(triplets)
+        self.depth = self.normalized[:, 1]
+        self.tree = cKDTree(self.normalized[:, [0, 2]])
+
+        if render_mode == "interpolated":
+            self.triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        else:
+            self.triangles = np.empty((0, 3), dtype=np.int64)
+
+        # Continuous pixel coordinates, pixel (i, j) being centered at (j, i)
+        self.u = self.normalized[:, 0] * columns - 0.5
+        self.v = self.normalized[:, 2] * rows - 0.5
+
+        # Pixel bounding box of every triangle, clipped to the image
+        u = self.u[self.triangles]
+        v = self.v[self.triangles]
+        self.min_j = np.clip(np.ceil(u.min(axis=1)), 0, columns).astype(np.int64)
+        self.max_j = np.clip(np.floor(u.max(axis=1)), -1, columns - 1).astype(np.int64)
+        self.min_i = np.clip(np.ceil(v.min(axis=1)), 0, rows).astype(np.int64)
+        self.max_i = np.clip(np.floor(v.max(axis=1)), -1, rows - 1).astype(np.int64)
+
+    def rasterize(self, band, max_candidates, with_weights=True, depth=None):
+        """
+        Rasterizes the rows start to stop of the image, into depth when given.
+
+        The triangles overlapping the band are sorted by size and rasterized by
+        batches of at most max_candidates (pixel, triangle) pairs. Pixels outside of
+        the mesh take the value of their nearest vertex.
+
+        Returns:
+            A tuple (depth, vertex_ids, weights) of NumPy arrays of shape (P,),
+            (P, 3) and (P, 3), P being the number of pixels of the band. The vertex
+            ids and weights are None without with_weights.
+        """
+        start, stop = band
+        columns = self.image_size[1]
+        band_size = (stop - start, columns)
+        num_pixels = band_size[0] * columns
+
+        if depth is None:
+            depth = np.empty(num_pixels)
+        depth.fill(np.inf)
+        vertex_ids = weights = None
+        if with_weights:
+            vertex_ids = np.zeros((num_pixels, 3), dtype=np.int64)
+            weights = np.zeros((num_pixels, 3))
+
+        # Triangles overlapping the band, the smallest first so that every batch
+        # wastes few candidate pixels
+        height = np.minimum(self.max_i, stop - 1) - np.maximum(self.min_i, start) + 1
+        width = self.max_j - self.min_j + 1
+        overlapping = np.flatnonzero((height > 0) & (width > 0))
+        size = np.maximum(height[overlapping], width[overlapping])
+        order = np.argsort(size, kind="stable")
+        triangles = self.triangles[overlapping[order]]
+        size = size[order]
+
+        batch_start = 0
+        while batch_start < len(triangles):
+            # Every triangle of a batch gets the largest bounding box of the batch
+            candidates = np.arange(1, len(triangles) - batch_start + 1)
+            candidates *= size[batch_start:] ** 2
+            batch_stop = batch_start + min(
+                BATCH_SIZE,
+                max(1, int(np.searchsorted(candidates, max_candidates, side="right"))),
+            )
+            batch = triangles[batch_start:batch_stop]
+            batch_start = batch_stop
+
+            flat_indexes, values, batch_indexes, batch_weights = _rasterize_batch(
+                self.u[batch], self.v[batch] - start, self.depth[batch], band_size
+            )
+            if not with_weights:
+                np.minimum.at(depth, flat_indexes, values)
+                continue
+
+            # Keep the lowest value of every pixel, like the z-buffer does
+            order = np.lexsort((values, flat_indexes))
+            flat_indexes = flat_indexes[order]
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = flat_indexes[1:] != flat_indexes[:-1]
+
+            winners = order[first]
+            pixels = flat_indexes[first]
+            lower = values[winners] < depth[pixels]
+            winners, pixels = winners[lower], pixels[lower]
+
+            depth[pixels] = values[winners]
+            vertex_ids[pixels] = batch[batch_indexes[winners]]
+            weights[pixels] = batch_weights[winners]
+
+        # Every remaining pixel takes the value of its nearest vertex
+        holes = np.isinf(depth)
+        if holes.all():
+            # No triangle in the band, e.g. with the "nearest" render mode
+            holes = slice(None)
+        elif not holes.any():
+            return depth, vertex_ids, weights
+
+        centers = _band_pixel_centers(self.image_size, start, stop)
+        _, nearest_indexes = self.tree.query(centers[holes])
+        depth[holes] = self.depth[nearest_indexes]
+        if with_weights:
+            vertex_ids[holes] = nearest_indexes[:, None]
+            weights[holes, 0] = 1.0
+
+        return depth, vertex_ids, weights
+
+
+def _rasterize_batch(u, v, depth, image_size):
+    """
+    Rasterizes a batch of triangles, returning every covered pixel.
+
+    Args:
+        u: A NumPy array of shape (M, 3), the column coordinates of the vertices.
+        v: A NumPy array of shape (M, 3), the row coordinates of the vertices.
+        depth: A NumPy array of shape (M, 3), the depth values of the vertices.
+        image_size: The size of the image as (rows, columns).
+
+    Returns:
+        A tuple (flat_indexes, values, triangle_indexes, weights) with, for every
+        (pixel, triangle) pair, the flattened pixel index, the interpolated depth,
+        the index of the triangle in the batch and its barycentric weights (K, 3).
+    """
+    rows, columns = image_size
+
+    # Pixel bounding box of every triangle, clipped to the image
+    min_j = np.clip(np.ceil(u.min(axis=1)), 0, columns).astype(np.int64)
+    max_j = np.clip(np.floor(u.max(axis=1)), -1, columns - 1).astype(np.int64)
+    min_i = np.clip(np.ceil(v.min(axis=1)), 0, rows).astype(np.int64)
+    max_i = np.clip(np.floor(v.max(axis=1)), -1, rows - 1).astype(np.int64)
+
+    width = max_j - min_j + 1
+    height = max_i - min_i + 1
+    valid = (width > 0) & (height > 0)
+    if not valid.any():
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.empty(0), empty, np.empty((0, 3))
+
+    triangle_indexes = np.flatnonzero(valid)
+    u, v, depth = u[valid], v[valid], depth[valid]
+    min_j, min_i = min_j[valid], min_i[valid]
+    width, height = width[valid], height[valid]
+
+    # Candidate pixels: every triangle gets the largest bounding box of the batch
+    offset_i, offset_j = np.meshgrid(
+        np.arange(height.max()), np.arange(width.max()), indexing="ij"
+    )
+    offset_i = offset_i.ravel()
+    offset_j = offset_j.ravel()
+    pixel_i = min_i[:, None] + offset_i
+    pixel_j = min_j[:, None] + offset_j
+    in_box = (offset_i < height[:, None]) & (offset_j < width[:, None])
+
+    # Barycentric coordinates of the candidate pixels
+    e0_u = (u[:, 1] - u[:, 0])[:, None]
+    e0_v = (v[:, 1] - v[:, 0])[:, None]
+    e1_u = (u[:, 2] - u[:, 0])[:, None]
+    e1_v = (v[:, 2] - v[:, 0])[:, None]
+    p_u = pixel_j - u[:, [0]]
+    p_v = pixel_i - v[:, [0]]
+
+    area = e0_u * e1_v - e1_u * e0_v
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w1 = (p_u * e1_v - e1_u * p_v) / area
+        w2 = (e0_u * p_v - p_u * e0_v) / area
+    w0 = 1.0 - w1 - w2
+
+    eps = -1e-9
+    inside = in_box & (area != 0) & (w0 >= eps) & (w1 >= eps) & (w2 >= eps)
+
+    values = w0 * depth[:, [0]] + w1 * depth[:, [1]] + w2 * depth[:, [2]]
+    flat_indexes = pixel_i * columns + pixel_j
+
+    # Row of every inside candidate, to recover its triangle
+    candidate_rows = np.broadcast_to(np.arange(len(u))[:, None], inside.shape)[inside]
+    weights = np.column_stack((w0[inside], w1[inside], w2[inside]))
+
+    return (
+        flat_indexes[inside],
+        values[inside],
+        triangle_indexes[candidate_rows],
+        weights,
+    )
+
+
+def correspondence_table(
+    triplets,
+    triangles,
+    image_size,
+    render_mode,
+    memory_budget=DEFAULT_MEMORY_BUDGET,
+    workers=1,
+):
+    """
+    Computes, for every pixel, the vertices and weights whose Y values make its depth.
+
+    With the "nearest" render mode every pixel takes the value of its nearest vertex.
+    With the "interpolated" render mode every pixel takes the barycentric weights of
+    the triangle that wins the z-buffer, falling back to the nearest vertex outside
+    of the mesh.
+
+    Args:
+        triplets: A NumPy array of shape (N, 3) where each row is (X, Y, Z).
+        triangles: A NumPy array of shape (M, 3) of indexes into the triplets.
+        image_size: The size of the image (e.g., (83, 101)).
+        render_mode: "nearest" or "interpolated".
+        memory_budget: The working memory of the rasterization, in bytes, besides
+            the table itself.
+        workers: The number of threads rasterizing bands of rows.
+
+    Returns:
+        A tuple (vertex_ids, weights) of NumPy arrays of shape (rows * columns, 3).
+    """
+    rows, columns = image_size
+    rasterizer = _BandRasterizer(triplets, triangles, image_size, render_mode)
+    max_candidates = memory_budget // max(workers, 1) // CANDIDATE_BYTES
+
+    vertex_ids = np.empty((rows * columns, 3), dtype=np.int64)
+    weights = np.empty((rows * columns, 3))
+
+    def rasterize(band):
+        start, stop = band
+        _, band_vertex_ids, band_weights = rasterizer.rasterize(band, max_candidates)
+        vertex_ids[start * columns : stop * columns] = band_vertex_ids
+        weights[start * columns : stop * columns] = band_weights
+
+    _map_bands(rasterize, row_bands(image_size, memory_budget, workers), workers)
+    return vertex_ids, weights
+
+
+class PixelCorrespondence:
+    """
+    Pixel to vertex correspondence table of the membrane top surface.
+
+    The table is computed once from the (X, Z) coordinates of the vertices, which
+    barely move, so every capture only gathers and normalizes the Y values.
+    """
+
+    def __init__(
+        self, reference_positions, vertex_ids, weights, image_size, render_mode
+    ):
+        self.reference_positions = np.array(reference_positions, dtype=np.float64)
+        self.vertex_ids = vertex_ids
+        self.weights = weights
+        self.image_size = tuple(int(size) for size in image_size)
+        self.render_mode = render_mode
+        self._gathered = None
+        self._offsets = None
+        self._distances = None
+
+    @classmethod
+    def compute(
+        cls,
+        triplets,
+        triangles,
+        image_size,
+        render_mode,
+        memory_budget=DEFAULT_MEMORY_BUDGET,
+        workers=1,
+    ):
+        """
+        Computes the table from the current positions of the top surface, by bands
+        of rows within a memory budget (see correspondence_table).
+        """
+        vertex_ids, weights = correspondence_table(
+            triplets, triangles, image_size, render_mode, memory_budget, workers
+        )
+        return cls(triplets, vertex_ids, weights, image_size, render_mode)
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            return cls(
+                data["reference_positions"],
+                data["vertex_ids"],
+                data["weights"],
+                data["image_size"],
+                str(data["render_mode"]),
+            )
+
+    def save(self, file_path):
+        # Write then rename, so concurrent runs never load a partial file
+        temporary_path = f"{file_path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temporary_path,
+            reference_positions=self.reference_positions,
+            vertex_ids=self.vertex_ids,
+            weights=self.weights,
+            image_size=np.array(self.image_size),
+            render_mode=self.render_mode,
+        )
+        os.replace(temporary_path, file_path)
+
+    def matches(self, triplets, image_size, render_mode):
+        """
+        Whether the table was computed for these vertices, image size and render mode.
+        """
+        return (
+            np.shape(triplets) == self.reference_positions.shape
+            and tuple(image_size) == self.image_size
+            and render_mode == self.render_mode
+        )
+
+    def drift(self, triplets):
+        """
+        The largest (X, Z) displacement of a vertex since the table was computed.
+        """
+        if self._offsets is None:
+            # One row per axis: subtracting the strided (X, Z) columns at once
+            # would allocate a buffer on every call
+            self._offsets = np.empty((2, len(self.reference_positions)))
+            self._distances = np.empty(len(self.reference_positions))
+
+        triplets = np.asarray(triplets)
+        for row, axis in enumerate((0, 2)):
+            np.subtract(
+                triplets[:, axis],
+                self.reference_positions[:, axis],
+                out=self._offsets[row],
+            )
+        np.square(self._offsets, out=self._offsets)
+        np.add(self._offsets[0], self._offsets[1], out=self._distances)
+        return np.sqrt(self._distances.max())
+
+    def pixel_size(self):
+        """
+        The (row, column) size of a pixel, in the units of the positions.
+        """
+        extent = np.ptp(self.reference_positions, axis=0)
+        rows, columns = self.image_size
+        return extent[2] / rows, extent[0] / columns
+
+    def image(self, triplets, out=None, normalize=True):
+        """
+        Maps triplets of values (X, Y, Z) to an image through the table.
+
+        Args:
+            triplets: A NumPy array of shape (N, 3), in the order of the table vertices.
+            out: An optional float64 or float32 array of the image size to write the
+                image into. The gather reuses a buffer of the table, so nothing is
+                allocated.
+            normalize: Whether to normalize the Y values between 0 and 1. Otherwise
+                the image holds the Y values, in the units of the positions.
+
+        Returns:
+            A 2D NumPy array representing the grayscale image.
+        """
+        y = np.asarray(triplets, dtype=np.float64)[:, 1]
+
+        if out is None:
+            out = np.empty(self.image_size)
+        if self._gathered is None:
+            self._gathered = np.empty(self.weights.shape)
+
+        np.take(y, self.vertex_ids, out=self._gathered)
+        np.multiply(self._gathered, self.weights, out=self._gathered)
+        values = out.reshape(-1)
+        self._gathered.sum(axis=1, out=values)
+        if not normalize:
+            return out
+        min_y = y.min()
+        values -= min_y
+        values /= y.max() - min_y
+        return out
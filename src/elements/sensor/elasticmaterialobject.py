@@ -102,40 +102,7 @@ class ElasticMaterialObject(Sofa.Prefab):
             )
             return None
 
-        if self.volumeMeshFileName.value.endswith(".msh"):
-            self.loader = self.addObject(
-                "MeshGmshLoader",
-                name="loader",
-                filename=self.volumeMeshFileName.value,
-                rotation=list(self.rotation.value),
-                translation=list(self.translation.value),
-                scale3d=list(self.scale.value),
-            )
-        elif self.volumeMeshFileName.value.endswith(".gidmsh"):
-            self.loader = self.addObject(
-                "GIDMeshLoader",
-                name="loader",
-                filename=self.volumeMeshFileName.value,
-                rotation=list(self.rotation.value),
-                translation=list(self.translation.value),
-                scale3d=list(self.scale.value),
-            )
-        else:
-            self.loader = self.addObject(
-                "MeshVTKLoader",
-                name="loader",
-                filename=self.volumeMeshFileName.value,
-                rotation=list(self.rotation.value),
-                translation=list(self.translation.value),
-                scale3d=list(self.scale.value),
-            )
-
-        self.container = self.addObject(
-            "TetrahedronSetTopologyContainer",
-            position=self.loader.position.getLinkPath(),
-            tetras=self.loader.tetras.getLinkPath(),
-            name="container",
-        )
+        self.container = self.addVolumeTopology()
         self.dofs = self.addObject("MechanicalObject", template="Vec3", name="dofs")
 
         # To be properly simulated and to interact with gravity or inertia forces, an elasticobject
@@ -171,7 +138,7 @@ class ElasticMaterialObject(Sofa.Prefab):
                 list(self.scale.value),
             )
 
-        if self.surfaceMeshFileName:
+        if self.surfaceMeshFileName.value:
             self.addVisualModel(
                 self.surfaceMeshFileName.value,
                 list(self.surfaceColor.value),
@@ -180,6 +147,43 @@ class ElasticMaterialObject(Sofa.Prefab):
                 list(self.scale.value),
             )
 
+    def addVolumeTopology(self):
+        """Load the volume mesh and add its tetrahedron container."""
+        if self.volumeMeshFileName.value.endswith(".msh"):
+            self.loader = self.addObject(
+                "MeshGmshLoader",
+                name="loader",
+                filename=self.volumeMeshFileName.value,
+                rotation=list(self.rotation.value),
+                translation=list(self.translation.value),
+                scale3d=list(self.scale.value),
+            )
+        elif self.volumeMeshFileName.value.endswith(".gidmsh"):
+            self.loader = self.addObject(
+                "GIDMeshLoader",
+                name="loader",
+                filename=self.volumeMeshFileName.value,
+                rotation=list(self.rotation.value),
+                translation=list(self.translation.value),
+                scale3d=list(self.scale.value),
+            )
+        else:
+            self.loader = self.addObject(
+                "MeshVTKLoader",
+                name="loader",
+                filename=self.volumeMeshFileName.value,
+                rotation=list(self.rotation.value),
+                translation=list(self.translation.value),
+                scale3d=list(self.scale.value),
+            )
+
+        return self.addObject(
+            "TetrahedronSetTopologyContainer",
+            position=self.loader.position.getLinkPath(),
+            tetras=self.loader.tetras.getLinkPath(),
+            name="container",
+        )
+
     def addCollisionModel(
         self,
         collisionMesh,
@@ -188,22 +192,28 @@ class ElasticMaterialObject(Sofa.Prefab):
         scale=[1.0, 1.0, 1.0],
     ):
         self.collisionmodel = self.addChild("CollisionModel")
-        self.collisionmodel.addObject(
+        self.addSurfaceTopology(
+            self.collisionmodel, collisionMesh, rotation, translation, scale
+        )
+        self.collisionmodel.addObject("MechanicalObject", template="Vec3", name="dofs")
+        self.collisionmodel.addObject("TriangleCollisionModel")
+        self.collisionmodel.addObject("LineCollisionModel")
+        self.collisionmodel.addObject("PointCollisionModel")
+        self.collisionmodel.addObject("BarycentricMapping")
+
+    def addSurfaceTopology(self, node, filename, rotation, translation, scale):
+        """Load a surface mesh in node and add its triangle container."""
+        node.addObject(
             "MeshSTLLoader",
             name="loader",
-            filename=collisionMesh,
+            filename=filename,
             rotation=rotation,
             translation=translation,
             scale3d=scale,
         )
-        self.collisionmodel.addObject(
+        return node.addObject(
             "TriangleSetTopologyContainer", src="@loader", name="container"
         )
-        self.collisionmodel.addObject("MechanicalObject", template="Vec3", name="dofs")
-        self.collisionmodel.addObject("TriangleCollisionModel")
-        self.collisionmodel.addObject("LineCollisionModel")
-        self.collisionmodel.addObject("PointCollisionModel")
-        self.collisionmodel.addObject("BarycentricMapping")
 
     def addVisualModel(
         self, filename, color, rotation, translation, scale=[1.0, 1.0, 1.0]
@@ -0,0 +1,324 @@
+"""
+Live frames of a sensor in shared memory, for consumers in other processes.
+
+The publisher owns a multiprocessing.shared_memory block holding a ring buffer of
+the last frames: depth map, top surface positions, simulation step and time. Every
+frame is written straight into its slot, and readers map the same block, so a
+frame reaches a consumer without copies, files or pickling.
+
+Frames are numbered from 1. The slots are guarded by sequence numbers, like a
+seqlock: the publisher sets the sequence of a slot to minus the frame number while
+writing it, then to the frame number, and finally sets the latest frame number of
+the header. A reader checks the sequence of a slot before and after using it, so
+it never returns a torn frame. The layout is described by the header, so readers
+only need the name of the block:
+
+    reader = FrameReader("sofa-sim2real")
+    frame = reader.wait()
+    while True:
+        frame = reader.wait(after=frame.sequence)
+        depth_map = frame.depth_map
+
+This module does not depend on SOFA.
+"""
+
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x534F464147454C53
+VERSION = 1
+
+# Fields of the int64 header
+HEADER_FIELDS = [
+    "magic",
+    "version",
+    "capacity",
+    "rows",
+    "columns",
+    "num_vertices",
+    "latest",
+    "closed",
+]
+
+# Regions of the block are aligned on cache lines
+ALIGNMENT = 64
+
+# Time between two checks of a waiting reader
+POLL_INTERVAL = 1e-4  # s
+
+
+def _aligned(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def layout(capacity, image_size, num_vertices):
+    """
+    The regions of a block of shared memory.
+
+    Returns:
+        A list of (name, dtype, shape, offset) tuples and the size of the block in
+        bytes.
+    """
+    regions = [
+        ("header", np.int64, (len(HEADER_FIELDS),)),
+        ("sequences", np.int64, (capacity,)),
+        ("steps", np.int64, (capacity,)),
+        ("times", np.float64, (capacity,)),
+        ("depth_maps", np.float32, (capacity, *image_size)),
+        ("positions", np.float64, (capacity, num_vertices, 3)),
+    ]
+
+    offset = 0
+    placed = []
+    for name, dtype, shape in regions:
+        placed.append((name, dtype, shape, offset))
+        offset += _aligned(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return placed, offset
+
+
+def _views(buffer, regions):
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+        for name, dtype, shape, offset in regions
+    }
+
+
+def _attach(name):
+    """
+    Attach an existing block without registering it to the resource tracker, which
+    would otherwise unlink it when the reader exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    memory = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(memory._name, "shared_memory")
+    return memory
+
+
+class FramePublisher:
+    """
+    Ring buffer of the last frames of a sensor in a block of shared memory.
+
+    Attributes:
+        published: Number of frames published.
+    """
+
+    def __init__(self, name, capacity, image_size, num_vertices):
+        """
+        Args:
+            name: The name of the block of shared memory. A block left over by a run
+                that did not exit cleanly is replaced.
+            capacity: The number of frames kept, a frame being overwritten
+                capacity frames after it was published.
+            image_size: The (rows, columns) size of the depth maps.
+            num_vertices: The number of top surface vertices.
+        """
+        self.name = name
+        self.capacity = capacity
+        regions, size = layout(capacity, image_size, num_vertices)
+
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        views = _views(self.memory.buf, regions)
+        self.header = views["header"]
+        self.sequences = views["sequences"]
+        self.steps = views["steps"]
+        self.times = views["times"]
+        self.depth_maps = views["depth_maps"]
+        self.positions = views["positions"]
+
+        self.sequences[:] = 0
+        self.header[:] = [
+            MAGIC,
+            VERSION,
+            capacity,
+            *image_size,
+            num_vertices,
+            0,
+            0,
+        ]
+        self.published = 0
+        self.slot = None
+
+    def begin(self, step, time):
+        """
+        Claim the slot of the next frame, whose depth map and positions must then be
+        written before calling end.
+
+        Returns:
+            The index of the slot.
+        """
+        sequence = self.published + 1
+        self.slot = self.published % self.capacity
+        self.sequences[self.slot] = -sequence
+        self.steps[self.slot] = step
+        self.times[self.slot] = time
+        return self.slot
+
+    def end(self):
+        """
+        Publish the frame of the claimed slot.
+        """
+        self.published += 1
+        self.sequences[self.slot] = self.published
+        self.header[HEADER_FIELDS.index("latest")] = self.published
+        self.slot = None
+
+    def publish(self, step, time, depth_map, positions):
+        """
+        Copy a frame into the next slot and publish it.
+        """
+        slot = self.begin(step, time)
+        self.depth_maps[slot] = depth_map
+        self.positions[slot] = positions
+        self.end()
+
+    def close(self):
+        """
+        Tell the readers the run is over and release the block.
+        """
+        if self.memory is None:
+            return
+        self.header[HEADER_FIELDS.index("closed")] = 1
+        self.header = self.sequences = self.steps = self.times = None
+        self.depth_maps = self.positions = None
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+
+class Frame:
+    """
+    A frame read from shared memory.
+
+    With copy=False, depth_map and positions are views of the slot, valid until the
+    publisher overwrites it: check valid() after using them.
+    """
+
+    def __init__(self, reader, slot, sequence, step, time, depth_map, positions):
+        self.reader = reader
+        self.slot = slot
+        self.sequence = sequence
+        self.step = step
+        self.time = time
+        self.depth_map = depth_map
+        self.positions = positions
+
+    def valid(self):
+        """
+        Whether the slot still holds this frame.
+        """
+        return int(self.reader.sequences[self.slot]) == self.sequence
+
+
+class FrameReader:
+    """
+    Reader of the frames of a FramePublisher, from any process.
+    """
+
+    def __init__(self, name):
+        self.memory = _attach(name)
+
+        header = np.ndarray(
+            (len(HEADER_FIELDS),), dtype=np.int64, buffer=self.memory.buf
+        )
+        fields = dict(zip(HEADER_FIELDS, header.tolist()))
+        if fields["magic"] != MAGIC or fields["version"] != VERSION:
+            self.memory.close()
+            raise ValueError(f'"{name}" is not a block of live frames')
+        del header
+
+        self.capacity = fields["capacity"]
+        self.image_size = (fields["rows"], fields["columns"])
+        self.num_vertices = fields["num_vertices"]
+
+        regions, _ = layout(self.capacity, self.image_size, self.num_vertices)
+        views = _views(self.memory.buf, regions)
+        self.header = views["header"]
+        self.sequences = views["sequences"]
+        self.steps = views["steps"]
+        self.times = views["times"]
+        self.depth_maps = views["depth_maps"]
+        self.positions = views["positions"]
+
+    @property
+    def latest(self):
+        """
+        The number of the latest published frame, 0 before the first one.
+        """
+        return int(self.header[HEADER_FIELDS.index("latest")])
+
+    @property
+    def closed(self):
+        return bool(self.header[HEADER_FIELDS.index("closed")])
+
+    def read(self, sequence=None, copy=True):
+        """
+        Read a frame.
+
+        Args:
+            sequence: The number of the frame, the latest one by default.
+            copy: Whether to copy the depth map and positions out of the slot.
+                Otherwise they are views of the shared memory (see Frame).
+
+        Returns:
+            The Frame, or None if it is not published yet or already overwritten.
+        """
+        if sequence is None:
+            sequence = self.latest
+        if sequence <= 0 or sequence > self.latest:
+            return None
+
+        slot = (sequence - 1) % self.capacity
+        if int(self.sequences[slot]) != sequence:
+            return None
+
+        frame = Frame(
+            self,
+            slot,
+            sequence,
+            int(self.steps[slot]),
+            float(self.times[slot]),
+            self.depth_maps[slot].copy() if copy else self.depth_maps[slot],
+            self.positions[slot].copy() if copy else self.positions[slot],
+        )
+        if not frame.valid():
+            return None
+        return frame
+
+    def wait(self, after=0, timeout=None, copy=True):
+        """
+        Wait for a frame newer than a frame number and read the latest one.
+
+        Args:
+            after: The number of the last frame already read.
+            timeout: The longest wait in seconds, None to wait until the publisher
+                closes.
+            copy: See read.
+
+        Returns:
+            The Frame, or None if the wait timed out or the publisher closed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.latest > after:
+                frame = self.read(copy=copy)
+                if frame is not None:
+                    return frame
+            elif self.closed or (deadline is not None and time.monotonic() > deadline):
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def close(self):
+        self.header = self.sequences = self.steps = self.times = None
+        self.depth_maps = self.positions = None
+        self.memory.close()
@@ -0,0 +1,160 @@
+"""
+Markers printed on the membrane top surface, tracked to measure its shear.
+
+Every marker is attached to a triangle of the top surface by fixed vertex ids and
+barycentric weights, so the positions of all the markers are a single gather and
+weighted sum of the top surface positions. Like depth_map.py, this module does not
+depend on SOFA.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .depth_map import pixel_centers
+
+# Number of triangles around a marker searched for the one containing it
+NUM_CANDIDATE_TRIANGLES = 16
+
+
+def marker_grid(rest_positions, grid_shape):
+    """
+    Computes the (X, Z) coordinates of a regular grid of markers over the top surface.
+
+    The markers are placed at the centers of the cells of a (rows, columns) grid
+    covering the (X, Z) extent of the top surface, like the pixels of the depth map.
+
+    Returns:
+        A NumPy array of shape (rows * columns, 2), in row-major order.
+    """
+    xz = np.asarray(rest_positions, dtype=np.float64)[:, ::2]
+    min_xz = xz.min(axis=0)
+    return min_xz + pixel_centers(grid_shape) * (xz.max(axis=0) - min_xz)
+
+
+def attach_markers(rest_positions, triangles, marker_xz):
+    """
+    Attaches markers to the triangles of the top surface containing them in (X, Z).
+
+    Markers outside of every triangle are attached to their nearest vertex.
+
+    Args:
+        rest_positions: A NumPy array of shape (N, 3), the top surface rest positions.
+        triangles: A NumPy array of shape (M, 3) of indexes into the rest positions.
+        marker_xz: A NumPy array of shape (K, 2), the (X, Z) coordinates of the markers.
+
+    Returns:
+        A tuple (vertex_ids, weights) of NumPy arrays of shape (K, 3).
+    """
+    xz = np.asarray(rest_positions, dtype=np.float64)[:, ::2]
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    num_markers = len(marker_xz)
+
+    vertex_ids = np.zeros((num_markers, 3), dtype=np.int64)
+    weights = np.zeros((num_markers, 3))
+    attached = np.zeros(num_markers, dtype=bool)
+
+    if len(triangles):
+        # Barycentric coordinates of every marker in its nearest triangles
+        k = min(NUM_CANDIDATE_TRIANGLES, len(triangles))
+        _, candidates = cKDTree(xz[triangles].mean(axis=1)).query(marker_xz, k=k)
+        candidates = candidates.reshape(num_markers, k)
+        corners = xz[triangles[candidates]]  # (K, k, 3, 2)
+
+        e0 = corners[:, :, 1] - corners[:, :, 0]
+        e1 = corners[:, :, 2] - corners[:, :, 0]
+        p = marker_xz[:, None] - corners[:, :, 0]
+        area = e0[..., 0] * e1[..., 1] - e1[..., 0] * e0[..., 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w1 = (p[..., 0] * e1[..., 1] - e1[..., 0] * p[..., 1]) / area
+            w2 = (e0[..., 0] * p[..., 1] - p[..., 0] * e0[..., 1]) / area
+        w0 = 1.0 - w1 - w2
+
+        eps = -1e-9
+        inside = (area != 0) & (w0 >= eps) & (w1 >= eps) & (w2 >= eps)
+
+        # Keep the nearest containing triangle
+        attached = inside.any(axis=1)
+        best = np.argmax(inside, axis=1)[attached]
+        rows = np.flatnonzero(attached)
+        vertex_ids[attached] = triangles[candidates[rows, best]]
+        weights[attached] = np.column_stack(
+            (w0[rows, best], w1[rows, best], w2[rows, best])
+        )
+
+    outside = ~attached
+    if outside.any():
+        _, nearest_indexes = cKDTree(xz).query(marker_xz[outside])
+        vertex_ids[outside] = nearest_indexes[:, None]
+        weights[outside, 0] = 1.0
+
+    return vertex_ids, weights
+
+
+class MarkerSet:
+    """
+    Markers of the membrane top surface, as vertex ids and barycentric weights.
+    """
+
+    def __init__(self, vertex_ids, weights, rest_positions, grid_shape):
+        """
+        Args:
+            vertex_ids: A NumPy array of shape (K, 3) of indexes into the top surface.
+            weights: A NumPy array of shape (K, 3), the barycentric weights.
+            rest_positions: A NumPy array of shape (K, 3), the rest positions of
+                the markers.
+            grid_shape: The (rows, columns) shape of the marker grid.
+        """
+        self.vertex_ids = vertex_ids
+        self.weights = weights
+        self.rest_positions = rest_positions
+        self.grid_shape = tuple(grid_shape)
+        self._gathered = np.empty((len(vertex_ids), 3, 3))
+
+    @classmethod
+    def compute(cls, rest_positions, triangles, grid_shape):
+        """
+        Computes a grid of markers attached to the top surface at rest.
+        """
+        marker_xz = marker_grid(rest_positions, grid_shape)
+        vertex_ids, weights = attach_markers(rest_positions, triangles, marker_xz)
+        markers = cls(vertex_ids, weights, None, grid_shape)
+        markers.rest_positions = markers.positions(rest_positions).copy()
+        return markers
+
+    def __len__(self):
+        return len(self.vertex_ids)
+
+    def positions(self, surface_positions, out=None):
+        """
+        The positions of the markers, interpolated from the top surface positions.
+
+        Args:
+            surface_positions: A NumPy array of shape (N, 3), in the order of the top
+                surface vertices.
+            out: An optional (K, 3) array to write the positions into.
+
+        Returns:
+            A NumPy array of shape (K, 3).
+        """
+        np.take(surface_positions, self.vertex_ids, axis=0, out=self._gathered)
+        self._gathered *= self.weights[:, :, None]
+        return self._gathered.sum(axis=1, out=out)
+
+    def displacements(self, surface_positions, out=None):
+        """
+        The 3D displacements of the markers from their rest positions.
+
+        The (X, Z) columns are the shear of the membrane, the Y column its normal
+        displacement.
+
+        Args:
+            surface_positions: A NumPy array of shape (N, 3), in the order of the top
+                surface vertices.
+            out: An optional (K, 3) array to write the displacements into.
+
+        Returns:
+            A NumPy array of shape (K, 3).
+        """
+        out = self.positions(surface_positions, out=out)
+        np.subtract(out, self.rest_positions, out=out)
+        return out
@@ -0,0 +1,253 @@
+"""
+Reduced-order modal model of the top surface deformation.
+
+The displacements of the top surface vertices from their rest positions, recorded
+over simulation runs, are compressed with a truncated proper orthogonal
+decomposition (the SVD of the centered snapshots): every frame becomes k mode
+coefficients instead of the (N, 3) positions or a full depth map. Frames are
+rebuilt from their coefficients with one matrix product, then rendered at any
+resolution through a PixelCorrespondence of the rest positions. Like
+depth_map.py, this module does not depend on SOFA.
+"""
+
+import os
+from os import path
+
+import numpy as np
+
+from .depth_map import PixelCorrespondence
+
+# Share of the snapshot variance kept by the truncated basis by default
+DEFAULT_ENERGY = 0.9999
+
+SURFACE_FILE_NAME = "surface.npz"
+COEFFICIENTS_FILE_NAME = "coefficients.npy"
+
+
+class ModalBasis:
+    """
+    Truncated POD basis of the top surface displacements.
+    """
+
+    def __init__(self, rest_positions, triangles, mean, modes, singular_values):
+        """
+        Args:
+            rest_positions: A NumPy array of shape (N, 3), the top surface rest
+                positions.
+            triangles: A NumPy array of shape (M, 3), the top surface triangles.
+            mean: A NumPy array of shape (N, 3), the mean displacement of the
+                snapshots.
+            modes: A NumPy array of shape (k, N * 3) of orthonormal modes, stored
+                in float32 and used in float64.
+            singular_values: A NumPy array of shape (k,), the singular values of
+                the modes.
+        """
+        self.rest_positions = np.asarray(rest_positions, dtype=np.float64)
+        self.triangles = np.asarray(triangles, dtype=np.int64)
+        self.mean = np.asarray(mean, dtype=np.float64).reshape(-1)
+        self.modes = np.ascontiguousarray(modes, dtype=np.float64)
+        self.singular_values = np.asarray(singular_values, dtype=np.float64)
+        self.pixel_correspondences = {}
+
+        # Scratch displacement of project
+        self.displacement = np.empty(self.mean.shape)
+
+    def __len__(self):
+        return len(self.modes)
+
+    @classmethod
+    def fit(cls, rest_positions, triangles, snapshots, num_modes=None, energy=None):
+        """
+        Computes the basis of snapshots of the top surface positions.
+
+        Args:
+            rest_positions: A NumPy array of shape (N, 3).
+            triangles: A NumPy array of shape (M, 3).
+            snapshots: A NumPy array of shape (S, N, 3) of top surface positions.
+            num_modes: The maximum number of modes.
+            energy: The share of the variance of the snapshots to keep, the basis
+                having the fewest modes that reach it (DEFAULT_ENERGY if neither
+                num_modes nor energy is given).
+
+        Returns:
+            A ModalBasis.
+        """
+        if num_modes is None and energy is None:
+            energy = DEFAULT_ENERGY
+
+        rest_positions = np.asarray(rest_positions, dtype=np.float64)
+        displacements = np.asarray(snapshots, dtype=np.float64) - rest_positions
+        displacements = displacements.reshape(len(displacements), -1)
+
+        mean = displacements.mean(axis=0)
+        displacements -= mean
+        _, singular_values, modes = np.linalg.svd(displacements, full_matrices=False)
+
+        k = len(singular_values)
+        if energy is not None:
+            variance = np.cumsum(singular_values**2)
+            if variance[-1] > 0:
+                k = int(np.searchsorted(variance, energy * variance[-1])) + 1
+        if num_modes is not None:
+            k = min(k, num_modes)
+
+        return cls(rest_positions, triangles, mean, modes[:k], singular_values[:k])
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            return cls(
+                data["rest_positions"],
+                data["triangles"],
+                data["mean"],
+                data["modes"],
+                data["singular_values"],
+            )
+
+    def save(self, file_path):
+        # Write then rename, so concurrent runs never load a partial file
+        temporary_path = f"{file_path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temporary_path,
+            rest_positions=self.rest_positions,
+            triangles=self.triangles,
+            mean=self.mean,
+            modes=self.modes.astype(np.float32),
+            singular_values=self.singular_values,
+        )
+        os.replace(temporary_path, file_path)
+
+    def project(self, positions, out=None):
+        """
+        The mode coefficients of top surface positions.
+
+        Args:
+            positions: A NumPy array of shape (N, 3), or (S, N, 3) for several
+                frames.
+            out: An optional float32 array of shape (k,), or (S, k), to write the
+                coefficients into.
+
+        Returns:
+            The float32 coefficients.
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        if positions.ndim == 3:
+            displacements = (positions - self.rest_positions).reshape(
+                len(positions), -1
+            )
+            displacements -= self.mean
+            coefficients = displacements @ self.modes.T
+        else:
+            np.subtract(
+                positions, self.rest_positions, out=self.displacement.reshape(-1, 3)
+            )
+            self.displacement -= self.mean
+            coefficients = self.modes @ self.displacement
+
+        if out is None:
+            return coefficients.astype(np.float32)
+        out[...] = coefficients
+        return out
+
+    def reconstruct(self, coefficients, out=None):
+        """
+        The top surface positions of mode coefficients.
+
+        Args:
+            coefficients: A NumPy array of shape (k,), or (S, k) for several frames.
+            out: An optional float64 array of shape (N, 3), or (S, N, 3), to write
+                the positions into.
+
+        Returns:
+            The positions.
+        """
+        coefficients = np.asarray(coefficients, dtype=np.float64)
+        displacements = coefficients @ self.modes + self.mean
+        shape = (*coefficients.shape[:-1], *self.rest_positions.shape)
+
+        if out is None:
+            out = np.empty(shape)
+        np.add(displacements.reshape(shape), self.rest_positions, out=out)
+        return out
+
+    def relative_error(self, snapshots):
+        """
+        The relative L2 error of the reconstruction of snapshots of the top surface
+        positions, on their displacements.
+        """
+        snapshots = np.asarray(snapshots, dtype=np.float64)
+        reconstructed = self.reconstruct(self.project(snapshots))
+        norm = np.linalg.norm(snapshots - self.rest_positions)
+        if norm == 0:
+            return 0.0
+        return float(np.linalg.norm(reconstructed - snapshots) / norm)
+
+    def depth_map(self, coefficients, image_size, render_mode="interpolated", out=None):
+        """
+        Renders the depth map of mode coefficients, through the pixel to vertex
+        table of the rest positions.
+        """
+        key = (tuple(image_size), render_mode)
+        table = self.pixel_correspondences.get(key)
+        if table is None:
+            table = PixelCorrespondence.compute(
+                self.rest_positions, self.triangles, image_size, render_mode
+            )
+            self.pixel_correspondences[key] = table
+        return table.image(self.reconstruct(coefficients), out=out)
+
+
+def save_surface(directory, rest_positions, triangles, top_indexes):
+    """
+    Save the rest positions and triangles of the top surface of a recording.
+    """
+    np.savez(
+        path.join(directory, SURFACE_FILE_NAME),
+        rest_positions=rest_positions,
+        triangles=triangles,
+        top_indexes=top_indexes,
+    )
+
+
+def load_surface(directory):
+    """
+    Load the top surface of a recording.
+
+    Returns:
+        The (N, 3) rest positions and the (M, 3) triangles.
+    """
+    with np.load(path.join(directory, SURFACE_FILE_NAME)) as data:
+        return data["rest_positions"], data["triangles"]
+
+
+def recorded_slots(directory):
+    """
+    The slots of the frames of a recording, in the order of their steps.
+    """
+    steps = np.load(path.join(directory, "steps.npy"))
+    slots = np.flatnonzero(steps >= 0)
+    return slots[np.argsort(steps[slots], kind="stable")]
+
+
+def load_snapshots(directories):
+    """
+    Load the top surface positions of recordings (see recorder.py) with the same
+    top surface.
+
+    Returns:
+        The (N, 3) rest positions, the (M, 3) triangles and the (S, N, 3)
+        snapshots.
+    """
+    rest_positions, triangles = load_surface(directories[0])
+
+    snapshots = []
+    for directory in directories:
+        if load_surface(directory)[0].shape != rest_positions.shape:
+            raise ValueError(
+                f"The top surface of {directory} does not match the one of "
+                f"{directories[0]}"
+            )
+        positions = np.load(path.join(directory, "positions.npy"), mmap_mode="r")
+        snapshots.append(positions[recorded_slots(directory)])
+
+    return rest_positions, triangles, np.concatenate(snapshots)
@@ -0,0 +1,61 @@
+"""
+Writers of the depth map capture files.
+
+Like depth_map.py, these functions do not depend on SOFA, so they can be
+benchmarked on synthetic data (see benchmarks/sensor_output.py).
+"""
+
+import numpy as np
+from PIL import Image
+
+
+def save_points(file_path, surface_positions, indexes, mesh_id, dtype="float64"):
+    """
+    Save the top surface positions as a binary .npz file, along with the indexes of
+    the top nodes in the collision model, the units and the mesh they belong to.
+    """
+    np.savez(
+        file_path,
+        positions=surface_positions.astype(dtype, copy=False),
+        indexes=indexes,
+        units="m",
+        mesh_id=mesh_id,
+    )
+
+
+def save_markers(file_path, markers, displacements, indexes):
+    """
+    Save the marker displacements from their rest positions as a binary .npz file,
+    along with the rest positions, the grid shape and the attachment of the markers
+    to the vertices of the collision model.
+    """
+    np.savez(
+        file_path,
+        displacements=displacements,
+        rest_positions=markers.rest_positions,
+        grid_shape=np.array(markers.grid_shape),
+        indexes=indexes[markers.vertex_ids],
+        weights=markers.weights,
+        units="m",
+    )
+
+
+def save_points_text(file_path, surface_positions):
+    with open(file_path, "w") as f:
+        for item in surface_positions:
+            f.write(",".join([str(i) for i in item]) + "\n")
+
+
+def save_depth_image(file_path, depth_map_array, bits=8):
+    """
+    Save a depth map normalized between 0 and 1 as an 8 or 16 bit grayscale PNG.
+    """
+    if bits == 16:
+        pixels = np.rint(depth_map_array * 65535).astype(np.uint16)
+    else:
+        pixels = (depth_map_array * 255).astype(np.uint8)
+    Image.fromarray(pixels).save(file_path)
+
+
+def save_rgb_image(file_path, rgb_array):
+    Image.fromarray(rgb_array).save(file_path)
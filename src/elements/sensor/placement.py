@@ -0,0 +1,83 @@
+"""
+Placement of a sensor instance in the scene.
+
+The meshes, the selection boxes and the outputs of a sensor (depth maps, markers,
+positions) are defined in the frame of the sensor. A Placement maps that frame to
+the scene the way the SOFA loaders transform a mesh: scale, rotate (Euler angles
+in degrees, static X, Y then Z axes) then translate. This module does not depend
+on SOFA.
+"""
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+
+class Placement:
+    """
+    Rotation, translation and scale of the frame of a sensor in the scene.
+    """
+
+    def __init__(
+        self,
+        rotation=[0.0, 0.0, 0.0],
+        translation=[0.0, 0.0, 0.0],
+        scale=[1.0, 1.0, 1.0],
+    ):
+        self.rotation = np.array(rotation, dtype=np.float64)
+        self.translation = np.array(translation, dtype=np.float64)
+        self.scale = np.array(scale, dtype=np.float64)
+        self.matrix = Rotation.from_euler(
+            "xyz", self.rotation, degrees=True
+        ).as_matrix()
+
+    def is_identity(self):
+        return (
+            not self.rotation.any()
+            and not self.translation.any()
+            and bool((self.scale == 1.0).all())
+        )
+
+    def to_world(self, positions, out=None):
+        """
+        Maps positions of shape (..., 3) from the sensor frame to the scene.
+
+        Args:
+            positions: The positions in the sensor frame.
+            out: An optional float64 array of the same shape to write into, which
+                can be positions itself.
+        """
+        out = np.multiply(positions, self.scale, out=out)
+        out = np.matmul(out, self.matrix.T, out=out)
+        out += self.translation
+        return out
+
+    def to_local(self, positions, out=None):
+        """
+        Maps positions of shape (..., 3) from the scene to the sensor frame.
+
+        Args:
+            positions: The positions in the scene.
+            out: An optional float64 array of the same shape to write into, which
+                can be positions itself.
+        """
+        out = np.subtract(positions, self.translation, out=out)
+        out = np.matmul(out, self.matrix, out=out)
+        out /= self.scale
+        return out
+
+    def world_box(self, box):
+        """
+        An oriented box of the sensor frame (as given to oriented_box_indexes) in the
+        scene. The scale of the box is only exact for uniform scales or boxes aligned
+        with the sensor axes.
+        """
+        rotation = Rotation.from_euler(
+            "xyz", self.rotation, degrees=True
+        ) * Rotation.from_euler("xyz", box["eulerRotation"], degrees=True)
+        return {
+            "translation": self.to_world(
+                np.asarray(box["translation"], dtype=np.float64)
+            ).tolist(),
+            "eulerRotation": rotation.as_euler("xyz", degrees=True).tolist(),
+            "scale": (np.abs(self.scale) * box["scale"]).tolist(),
+        }
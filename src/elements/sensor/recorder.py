@@ -0,0 +1,121 @@
+"""
+Continuous recording of depth maps into memory-mapped ring buffers.
+
+Every buffer is a preallocated .npy file, so recording a frame only copies into
+the mapped memory and the files can be opened with np.load(..., mmap_mode="r").
+"""
+
+import pathlib
+from os import path
+
+import numpy as np
+
+
+class DepthMapRecorder:
+    """
+    Ring buffer of depth maps and top surface positions backed by .npy files.
+
+    The directory holds five arrays with the same number of slots:
+        frames.npy: (capacity, rows, columns) float32 depth maps.
+        positions.npy: (capacity, num_vertices, 3) float64 top surface positions.
+        markers.npy: (capacity, num_markers, 3) float64 marker displacements.
+        steps.npy: (capacity,) int64 simulation step of every frame, -1 if empty.
+        times.npy: (capacity,) float64 simulation time of every frame.
+
+    When recording RGB tactile images, another one holds them:
+        rgb.npy: (capacity, rows, columns, 3) uint8 tactile images.
+
+    When recording mode coefficients (see modal.py), the frames, positions and
+    markers are left out and a single array holds the coefficients:
+        coefficients.npy: (capacity, num_modes) float32 mode coefficients.
+
+    Once full, the oldest frames are overwritten. Sorting the slots by step gives
+    the frames back in order.
+    """
+
+    def __init__(
+        self,
+        directory,
+        capacity,
+        image_size,
+        num_vertices,
+        num_markers,
+        rgb=False,
+        num_modes=0,
+    ):
+        self.directory = directory
+        self.capacity = capacity
+        self.count = 0
+
+        pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+
+        self.frames = self.positions = self.markers = self.coefficients = None
+        if num_modes:
+            self.coefficients = self.open_buffer(
+                "coefficients", np.float32, (capacity, num_modes)
+            )
+        else:
+            self.frames = self.open_buffer(
+                "frames", np.float32, (capacity, *image_size)
+            )
+            self.positions = self.open_buffer(
+                "positions", np.float64, (capacity, num_vertices, 3)
+            )
+            self.markers = self.open_buffer(
+                "markers", np.float64, (capacity, num_markers, 3)
+            )
+        self.steps = self.open_buffer("steps", np.int64, (capacity,))
+        self.times = self.open_buffer("times", np.float64, (capacity,))
+        self.rgb = (
+            self.open_buffer("rgb", np.uint8, (capacity, *image_size, 3))
+            if rgb and not num_modes
+            else None
+        )
+        self.steps[:] = -1
+
+        # Scratch image, the depth map is rendered in float64 then copied to the slot
+        self.image = np.empty(image_size)
+        # Scratch positions, projected onto the modes instead of being recorded
+        self.surface_positions = np.empty((num_vertices, 3))
+
+    def open_buffer(self, name, dtype, shape):
+        return np.lib.format.open_memmap(
+            path.join(self.directory, f"{name}.npy"),
+            mode="w+",
+            dtype=dtype,
+            shape=shape,
+        )
+
+    def next_slot(self, step, time):
+        """
+        Claim the next slot of the ring buffer for a frame.
+
+        Returns:
+            The index of the slot, whose frame and positions must then be written.
+        """
+        slot = self.count % self.capacity
+        self.steps[slot] = step
+        self.times[slot] = time
+        self.count += 1
+        return slot
+
+    def flush(self):
+        buffers = (
+            self.frames,
+            self.positions,
+            self.markers,
+            self.steps,
+            self.times,
+            self.rgb,
+            self.coefficients,
+        )
+        for buffer in buffers:
+            if buffer is not None:
+                buffer.flush()
+
+    def close(self):
+        if self.steps is None:
+            return
+        self.flush()
+        self.frames = self.positions = self.markers = self.coefficients = None
+        self.steps = self.times = self.rgb = None
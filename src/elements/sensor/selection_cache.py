@@ -0,0 +1,33 @@
+"""
+On-disk cache of the vertex selections of the sensor (e.g. the nodes inside a box).
+
+Selections only depend on the mesh and on the selection parameters, so they are
+stored next to the mesh, at the paths of elements/mesh/cache.py.
+"""
+
+import os
+from os import path
+
+import numpy as np
+
+
+def load_selection(file_path):
+    """
+    Load a cached selection.
+
+    Returns:
+        The int64 array of indexes, or None if the selection is not cached.
+    """
+    if not path.exists(file_path):
+        return None
+    return np.load(file_path)
+
+
+def save_selection(file_path, indexes):
+    # Write then rename, so concurrent runs never load a partial file
+    temporary_path = f"{file_path}.{os.getpid()}.tmp.npy"
+    try:
+        np.save(temporary_path, np.asarray(indexes, dtype=np.int64))
+        os.replace(temporary_path, file_path)
+    except OSError as e:
+        print(f"Could not save the selection cache: {e}")
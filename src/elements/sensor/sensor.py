@@ -1,28 +1,105 @@
+import atexit
 import math
 import pathlib
 from os import path
 
 import numpy as np
 import Sofa
-from PIL import Image
 from stlib3.components import addOrientedBoxRoi
 from stlib3.physics.mixedmaterial import Rigidify
 
+from elements.mesh.cache import selection_path
 from params import (
+    DEPTH_MAP_CACHE_CORRESPONDENCE,
+    DEPTH_MAP_DRIFT_TOLERANCE,
+    DEPTH_MAP_IMAGE_BITS,
     DEPTH_MAP_KEY,
+    DEPTH_MAP_MEMORY_BUDGET,
+    DEPTH_MAP_POINTS_DTYPE,
+    DEPTH_MAP_POINTS_TEXT,
+    DEPTH_MAP_RECORD,
+    DEPTH_MAP_RECORD_CAPACITY,
+    DEPTH_MAP_RECORD_EVERY,
+    DEPTH_MAP_RENDER_MODE,
+    DEPTH_MAP_RGB,
+    DEPTH_MAP_WRITER_POLICY,
+    DEPTH_MAP_WRITER_QUEUE_SIZE,
+    DEPTH_MAP_WORKERS,
     IMAGE_FILE_NAME,
+    LIVE_FRAMES_CAPACITY,
+    LIVE_FRAMES_EVERY,
+    LIVE_FRAMES_NAME,
+    MARKER_GRID_SHAPE,
+    MARKERS_FILE_NAME,
     MEMBRANE_POISSON_RATIO,
     MEMBRANE_SURFACE_MESH_PATH,
+    MEMBRANE_TOP_COLLISION_ONLY,
     MEMBRANE_TOTAL_MASS,
     MEMBRANE_VOLUME_MESH_PATH,
     MEMBRANE_YOUNG_MODULUS,
+    MODAL_BASIS_PATH,
     OUTPUT_IMAGE_SIZE,
     OUTPUT_PATH,
     POINTS_FILE_NAME,
+    POINTS_TEXT_FILE_NAME,
+    RECORDING_DIRECTORY_NAME,
+    RGB_IMAGE_FILE_NAME,
+    RGB_LOOKUP_TABLE_PATH,
+    SELECTION_CACHE,
     SHELL_MESH_PATH,
 )
-
-from .elasticmaterialobject import ElasticMaterialObject
+from profiler import phase
+
+from .box_selection import oriented_box_indexes, selected_triangles
+from .depth_map import (
+    PixelCorrespondence,
+    interpolated_image,
+    nearest_neighbor_image,
+    nearest_vertex,
+)
+from .live import FramePublisher
+from .markers import MarkerSet
+from .modal import ModalBasis, save_surface
+from .output import (
+    save_depth_image,
+    save_markers,
+    save_points,
+    save_points_text,
+    save_rgb_image,
+)
+from .placement import Placement
+from .recorder import DepthMapRecorder
+from .selection_cache import load_selection, save_selection
+from .shared import SharedMeshElasticObject, placed, shared, shared_mesh
+from .submesh import top_surface_submesh
+from .tactile_image import TactileImageRenderer, load_lookup_table
+from .writer import DepthMapWriter
+
+# Scale of the meshes, in millimeters, to the frame of the sensor, in meters. The
+# boxes and the outputs of the sensor are in its frame, placed in the scene by the
+# rotation, translation and scale of the Sensor
+MESH_SCALE = [0.001, 0.001, 0.001]
+
+# Transform of the meshes to the frame of the sensor, in the keys of the caches
+SENSOR_FRAME = {
+    "rotation": [0.0, 0.0, 0.0],
+    "translation": [0.0, 0.0, 0.0],
+    "scale": MESH_SCALE,
+}
+
+# Box selecting the bottom nodes of the membrane volume mesh, fixed to the window
+BOTTOM_BOX = {
+    "translation": [0, 0.018, 0],
+    "eulerRotation": [0, 0, 0],
+    "scale": [0.04, 0.001, 0.04],
+}
+
+# Box selecting the top nodes of the membrane collision mesh
+TOP_BOX = {
+    "translation": [0, 0.023, 0],
+    "eulerRotation": [0, 0, 0],
+    "scale": [0.04, 0.0015, 0.04],
+}
 
 
 class Sensor(Sofa.Prefab):
@@ -45,21 +122,73 @@ class Sensor(Sofa.Prefab):
             "help": "Scale in base frame",
             "default": [1.0, 1.0, 1.0],
         },
+        {
+            "name": "visual",
+            "type": "bool",
+            "help": "Add the visual models (needs an OpenGL context)",
+            "default": True,
+        },
+        {
+            "name": "drawBoxes",
+            "type": "bool",
+            "help": "Add BoxROI components drawing the node selection boxes",
+            "default": True,
+        },
+        {
+            "name": "topCollisionOnly",
+            "type": "bool",
+            "help": "Only collide with the top surface of the membrane",
+            "default": MEMBRANE_TOP_COLLISION_ONLY,
+        },
+        {
+            "name": "volumeMeshPath",
+            "type": "string",
+            "help": "Path to the membrane volume mesh",
+            "default": MEMBRANE_VOLUME_MESH_PATH,
+        },
+        {
+            "name": "totalMass",
+            "type": "double",
+            "help": "Total mass of the membrane",
+            "default": MEMBRANE_TOTAL_MASS,
+        },
+        {
+            "name": "youngModulus",
+            "type": "double",
+            "help": "Young's modulus of the membrane",
+            "default": MEMBRANE_YOUNG_MODULUS,
+        },
+        {
+            "name": "poissonRatio",
+            "type": "double",
+            "help": "Poisson ratio of the membrane",
+            "default": MEMBRANE_POISSON_RATIO,
+        },
     ]
 
     def __init__(self, *args, **kwargs):
         Sofa.Prefab.__init__(self, *args, **kwargs)
 
-    # Build the sensor
     def init(self):
+        with phase("Sensor.init"):
+            self.build()
+
+    # Build the sensor
+    def build(self):
+
+        # Placement of the frame of the sensor in the scene
+        self.placement = Placement(
+            self.rotation.value, self.translation.value, self.scale.value
+        )
 
         # Membrane values
-        self.membraneVolumeMeshPath = MEMBRANE_VOLUME_MESH_PATH
+        self.membraneVolumeMeshPath = self.volumeMeshPath.value
         self.membraneSurfaceMeshPath = MEMBRANE_SURFACE_MESH_PATH
 
-        self.membraneRotation = [0.0, 0.0, 0.0]
-        self.membraneTranslation = [0.0, 0.0, 0.0]
-        self.membraneScale = [0.001, 0.001, 0.001]
+        # The meshes are scaled to the sensor frame, then placed in the scene
+        self.membraneRotation = list(self.rotation.value)
+        self.membraneTranslation = list(self.translation.value)
+        self.membraneScale = np.multiply(MESH_SCALE, self.scale.value).tolist()
         self.membraneSurfaceColor = [
             135.0 / 255.0,
             133.0 / 255.0,
@@ -67,107 +196,128 @@ class Sensor(Sofa.Prefab):
             1.0,
         ]  # RGBA
 
-        self.membraneTotalMass = MEMBRANE_TOTAL_MASS
-        self.membraneYoungModulus = MEMBRANE_YOUNG_MODULUS
-        self.membranePoissonRatio = MEMBRANE_POISSON_RATIO
+        # The collision mesh can be restricted to the nodes of the top box
+        if self.topCollisionOnly.value:
+            with phase("top collision submesh"):
+                self.membraneCollisionMeshPath = top_surface_submesh(
+                    self.membraneSurfaceMeshPath, TOP_BOX, **SENSOR_FRAME
+                )
+        else:
+            self.membraneCollisionMeshPath = self.membraneSurfaceMeshPath
+
+        self.membraneTotalMass = self.totalMass.value
+        self.membraneYoungModulus = self.youngModulus.value
+        self.membranePoissonRatio = self.poissonRatio.value
 
         # Shell values
         self.shellMeshPath = SHELL_MESH_PATH
-
-        self.shellRotation = [0.0, 0.0, 0.0]
-        self.shellTranslation = [0.0, 0.0, 0.0]
-        self.shellScale = [0.001, 0.001, 0.001]
         self.shellColor = [1.0, 1.0, 1.0, 1.0]  # RGBA
 
         # Create the elastic part of the sensor
-        self.membrane = self.add_membrane()
+        with phase("add_membrane"):
+            self.membrane = self.add_membrane()
 
         # Initialize the elastic body to eagerly compute positions
-        self.Membrane.init()
+        with phase("Membrane.init"):
+            self.Membrane.init()
 
         # Save the membrane's collision model
         self.collision_model = self.membrane.CollisionModel
 
         # Add the shell of the sensor (only visual model)
-        self.shell = self.add_shell()
-
-        self.top_box = self.add_top_bounding_box()
+        if self.visual.value:
+            with phase("add_shell"):
+                self.shell = self.add_shell()
 
         # Save indexes of the top nodes
-        self.top_indexes = [ind for ind in self.top_box.indices.value]
-
-        self.fix_membrane()
+        with phase("top selection"):
+            self.top_indexes = self.get_box_indexes(
+                "TopBoxROI",
+                self.membraneCollisionMeshPath,
+                TOP_BOX,
+                self.collision_model.dofs,
+            )
 
-    def add_bottom_bounding_box(self):
-        """
-        Add a box at the bottom of the membrane to fix it in place, simulating the contact with the acrylic window.
-        """
-        box_position = [list(i) for i in self.membrane.dofs.rest_position.value]
+        # Save the triangles of the top surface, shared by the sensors of the mesh
+        with phase("top triangles"):
+            self.top_triangles = shared(
+                ("top triangles", path.abspath(self.membraneCollisionMeshPath)),
+                self.get_membrane_surface_triangles,
+            )
 
-        box_translation = [0, 0.018, 0]
-        box_scale = [0.04, 0.001, 0.04]
+        rest_positions = self.get_membrane_surface_rest_positions()
 
-        box = addOrientedBoxRoi(
-            self,
-            position=box_position,
-            name="BottomBoxROI",
-            translation=box_translation,
-            eulerRotation=[0, 0, 0],
-            scale=box_scale,
-            drawBoxes=True,
-        )
+        # Precompute the pixel to vertex table of the default depth map from rest positions
+        with phase("pixel correspondence"):
+            self.pixel_correspondences = {}
+            self.get_pixel_correspondence(
+                rest_positions,
+                OUTPUT_IMAGE_SIZE,
+                DEPTH_MAP_RENDER_MODE,
+            )
 
-        box.init()
+        # Attach the grid of markers to the top surface triangles
+        with phase("markers"):
+            self.markers = shared(
+                (
+                    "markers",
+                    path.abspath(self.membraneCollisionMeshPath),
+                    MARKER_GRID_SHAPE,
+                ),
+                lambda: MarkerSet.compute(
+                    rest_positions, self.top_triangles, MARKER_GRID_SHAPE
+                ),
+            )
 
-        return box
+        with phase("fix_membrane (Rigidify)"):
+            self.fix_membrane()
 
-    def add_sides_bounding_boxes(self):
+    def get_sides_indexes(self):
         """
-        Add bounding boxes to the sides of the membrane to fix them in place, simulating the borders of the sensor.
+        Get the indexes of the nodes on the sides of the membrane, which could be fixed to simulate the borders of the sensor.
         """
         x_base = 0.0135
         y_base = 0.019
         z_base = 0.0115
-        box_position = [list(i) for i in self.membrane.dofs.rest_position.value]
 
         eulerRotation = [0, 0, 0]
 
-        boxes = []
+        sides_indexes = []
 
         for i in range(4):
-            box_translation = [
-                x_base * math.cos(math.radians(90 * i)),
-                y_base,
-                z_base * math.sin(math.radians(90 * i)),
-            ]
-
-            box_scale = [0.002, 0.002, 0.03]
-
-            box = addOrientedBoxRoi(
-                self,
-                position=box_position,
-                name=f"BoxROI{i}",
-                translation=box_translation,
-                eulerRotation=eulerRotation,
-                scale=box_scale,
-                drawBoxes=True,
+            box = {
+                "translation": [
+                    x_base * math.cos(math.radians(90 * i)),
+                    y_base,
+                    z_base * math.sin(math.radians(90 * i)),
+                ],
+                "eulerRotation": eulerRotation,
+                "scale": [0.002, 0.002, 0.03],
+            }
+
+            sides_indexes.append(
+                self.get_box_indexes(
+                    f"BoxROI{i}", self.membraneVolumeMeshPath, box, self.membrane.dofs
+                )
             )
 
             eulerRotation = [0, 90 * (i + 1), 0]
 
-            box.init()
-
-            boxes.append(box)
-
-        return boxes
+        return sides_indexes
 
     def fix_membrane(self):
         """
         Fix the membrane in place by adding a spring force field to the sides of the membrane.
         """
-        self.bottom_box = self.add_bottom_bounding_box()
+        # The bottom of the membrane is in contact with the acrylic window
+        self.bottom_indexes = self.get_box_indexes(
+            "BottomBoxROI",
+            self.membraneVolumeMeshPath,
+            BOTTOM_BOX,
+            self.membrane.dofs,
+        )
 
-        indices = [[ind for ind in self.bottom_box.indices.value]]
+        indices = [self.bottom_indexes.tolist()]
 
         rigidifiedStruct = Rigidify(
             targetObject=self,
@@ -176,48 +326,174 @@ class Sensor(Sofa.Prefab):
             name="RigidifiedStructure",
         )
 
-    def add_top_bounding_box(self):
+    def get_box_indexes(self, name, mesh_path, box, dofs):
         """
-        Add a box at the top of the membrane to read the indexes of the top nodes
+        Get the indexes of the rest positions of dofs inside an oriented box.
+
+        The box is in the sensor frame, so the selection does not depend on the
+        placement of the sensor and is shared by the sensors of the process. It is
+        loaded from the cache next to the mesh when its content and the box did not
+        change. Otherwise it is selected with NumPy and saved to the cache. A BoxROI
+        is only added to draw the box.
         """
-        collision_model_vertices = self.collision_model.dofs.rest_position.value
+        file_path = selection_path(mesh_path, name, {**SENSOR_FRAME, "box": box})
+
+        indexes = shared(
+            ("selection", file_path),
+            lambda: self.select_box_indexes(file_path, box, dofs),
+        )
 
-        box_position = [list(i) for i in collision_model_vertices]
+        if self.drawBoxes.value:
+            self.add_box_roi(name, dofs, self.placement.world_box(box))
 
-        box_translation = [0, 0.023, 0]
-        box_scale = [0.04, 0.0015, 0.04]
+        return indexes
 
-        box = addOrientedBoxRoi(
+    def select_box_indexes(self, file_path, box, dofs):
+        indexes = load_selection(file_path) if SELECTION_CACHE else None
+
+        if indexes is None:
+            rest_positions = self.placement.to_local(dofs.rest_position.value)
+            indexes = oriented_box_indexes(rest_positions, **box)
+            if SELECTION_CACHE:
+                save_selection(file_path, indexes)
+
+        return indexes
+
+    def add_box_roi(self, name, dofs, box):
+        """
+        Add a BoxROI drawing a box, linked to the rest positions of dofs.
+        """
+        return addOrientedBoxRoi(
             self,
-            position=box_position,
-            name="TopBoxROI",
-            translation=box_translation,
-            eulerRotation=[0, 0, 0],
-            scale=box_scale,
+            position=dofs.rest_position.getLinkPath(),
+            name=name,
+            translation=box["translation"],
+            eulerRotation=box["eulerRotation"],
+            scale=box["scale"],
             drawBoxes=True,
         )
 
-        box.init()
+    def get_membrane_surface_positions(self, out=None):
+        """
+        Get the positions of the top nodes in the sensor frame as a (N, 3) NumPy array,
+        with a single gather.
 
-        return box
+        Args:
+            out: An optional (N, 3) array to gather the positions into.
+        """
+        positions = np.take(
+            self.collision_model.dofs.position.value, self.top_indexes, axis=0, out=out
+        )
+        if not self.placement.is_identity():
+            positions = self.placement.to_local(positions, out=positions)
+        return positions
 
-    def get_membrane_surface_positions(self):
-        return [self.collision_model.dofs.position.value[i] for i in self.top_indexes]
+    def get_membrane_surface_rest_positions(self):
+        positions = np.take(
+            self.collision_model.dofs.rest_position.value, self.top_indexes, axis=0
+        )
+        if not self.placement.is_identity():
+            positions = self.placement.to_local(positions, out=positions)
+        return positions
+
+    def get_mesh_id(self):
+        return path.basename(self.membraneCollisionMeshPath)
+
+    def get_pixel_correspondence(self, surface_positions, image_size, render_mode):
+        """
+        Get the pixel to vertex table of the top surface for an image size and render mode.
+
+        The table is shared by the sensors of the process. It is loaded from next to
+        the membrane collision mesh when possible, else it is computed from the rest
+        positions. It is recomputed from the given positions once a top node drifts in
+        X/Z further than DEPTH_MAP_DRIFT_TOLERANCE.
+        """
+        key = (tuple(image_size), render_mode)
+        table = self.pixel_correspondences.get(key)
+
+        if table is None:
+            table = self.load_pixel_correspondence(image_size, render_mode)
+
+        if table.drift(surface_positions) > DEPTH_MAP_DRIFT_TOLERANCE:
+            table = PixelCorrespondence.compute(
+                surface_positions,
+                self.top_triangles,
+                image_size,
+                render_mode,
+                DEPTH_MAP_MEMORY_BUDGET,
+                DEPTH_MAP_WORKERS,
+            )
+
+        self.pixel_correspondences[key] = table
+        return table
+
+    def load_pixel_correspondence(self, image_size, render_mode):
+        file_path = self.get_pixel_correspondence_path(image_size, render_mode)
+        return shared(
+            ("pixel correspondence", path.abspath(file_path)),
+            lambda: self.read_pixel_correspondence(file_path, image_size, render_mode),
+        )
+
+    def read_pixel_correspondence(self, file_path, image_size, render_mode):
+        rest_positions = self.get_membrane_surface_rest_positions()
+
+        if DEPTH_MAP_CACHE_CORRESPONDENCE and path.exists(file_path):
+            table = PixelCorrespondence.load(file_path)
+            if (
+                table.matches(rest_positions, image_size, render_mode)
+                and table.drift(rest_positions) <= DEPTH_MAP_DRIFT_TOLERANCE
+            ):
+                return table
+
+        table = PixelCorrespondence.compute(
+            rest_positions,
+            self.top_triangles,
+            image_size,
+            render_mode,
+            DEPTH_MAP_MEMORY_BUDGET,
+            DEPTH_MAP_WORKERS,
+        )
+
+        if DEPTH_MAP_CACHE_CORRESPONDENCE:
+            try:
+                table.save(file_path)
+            except OSError as e:
+                print(f"Could not save the pixel to vertex table: {e}")
+
+        return table
+
+    def get_pixel_correspondence_path(self, image_size, render_mode):
+        rows, columns = image_size
+        mesh_name = path.splitext(self.membraneCollisionMeshPath)[0]
+        return f"{mesh_name}.{render_mode}-{rows}x{columns}.npz"
+
+    def get_membrane_surface_triangles(self):
+        """
+        Get the triangles of the collision model whose three vertices are top nodes.
+        The triangles index the top nodes in the order of top_indexes.
+        """
+        return selected_triangles(
+            self.collision_model.container.triangles.value,
+            len(self.collision_model.dofs.rest_position.value),
+            self.top_indexes,
+        )
 
     def add_membrane(self):
 
         # Create the membrane as a child of the parent
         membrane = self.addChild("Membrane")
 
-        # This creates an ElasticMaterialObject
-        elasticMaterial = ElasticMaterialObject(
+        # This creates an ElasticMaterialObject on the meshes shared by the sensors
+        elasticMaterial = SharedMeshElasticObject(
             name="Membrane",
             volumeMeshFileName=self.membraneVolumeMeshPath,
             rotation=self.membraneRotation,
             translation=self.membraneTranslation,
             scale=self.membraneScale,
-            surfaceMeshFileName=self.membraneSurfaceMeshPath,
-            collisionMesh=self.membraneSurfaceMeshPath,
+            surfaceMeshFileName=(
+                self.membraneSurfaceMeshPath if self.visual.value else ""
+            ),
+            collisionMesh=self.membraneCollisionMeshPath,
             withConstrain=True,
             surfaceColor=self.membraneSurfaceColor,
             poissonRatio=self.membranePoissonRatio,
@@ -235,20 +511,13 @@ class Sensor(Sofa.Prefab):
         # We only need the visual model for the shell
         visual = shell.addChild("Visual")
 
-        # Load the mesh
-        visual.addObject(
-            "MeshSTLLoader",
-            name="loader",
-            filename=self.shellMeshPath,
-            triangulate=True,
-            rotation=self.shellRotation,
-            translation=self.shellTranslation,
-            scale3d=self.shellScale,
-        )
-
-        # OpenGL model
+        # OpenGL model of the shared mesh, placed like the membrane
+        mesh = shared_mesh(self.shellMeshPath, MESH_SCALE)
         visual.addObject(
-            "OglModel", src=visual.loader.getLinkPath(), color=self.shellColor
+            "OglModel",
+            position=placed(mesh["position"], self.placement),
+            triangles=mesh["triangles"],
+            color=self.shellColor,
         )
 
         return shell
@@ -261,39 +530,262 @@ class SensorController(Sofa.Core.Controller):
 
         self.node = kwargs["node"]
         self.sensor = kwargs["sensor"]
+        self.render_mode = (
+            DEPTH_MAP_RENDER_MODE
+            if "render_mode" not in kwargs
+            else kwargs["render_mode"]
+        )
+        self.record = DEPTH_MAP_RECORD if "record" not in kwargs else kwargs["record"]
+        self.record_every = (
+            DEPTH_MAP_RECORD_EVERY
+            if "record_every" not in kwargs
+            else kwargs["record_every"]
+        )
+        self.output_path = (
+            OUTPUT_PATH if "output_path" not in kwargs else kwargs["output_path"]
+        )
+        self.rgb = DEPTH_MAP_RGB if "rgb" not in kwargs else kwargs["rgb"]
+        self.image_size = (
+            OUTPUT_IMAGE_SIZE if "image_size" not in kwargs else kwargs["image_size"]
+        )
+        self.modal_basis = (
+            MODAL_BASIS_PATH if "modal_basis" not in kwargs else kwargs["modal_basis"]
+        )
+        if isinstance(self.modal_basis, str):
+            self.modal_basis = ModalBasis.load(self.modal_basis)
+        self.live_name = (
+            LIVE_FRAMES_NAME if "live_name" not in kwargs else kwargs["live_name"]
+        )
+        self.live_every = (
+            LIVE_FRAMES_EVERY if "live_every" not in kwargs else kwargs["live_every"]
+        )
+        self.step = 0
+        self.recorder = None
+        self.publisher = None
+        self.tactile_renderer = None
+
+        if self.record:
+            self.start_recording()
+        if self.live_name is not None:
+            self.start_publishing()
+
+        self.writer = DepthMapWriter(
+            # One worker, concurrent ones would tear the files of fixed names
+            num_workers=1,
+            max_queue_size=DEPTH_MAP_WRITER_QUEUE_SIZE,
+            policy=DEPTH_MAP_WRITER_POLICY,
+        )
+        # Write the pending captures when SOFA exits
+        atexit.register(self.writer.close)
+
+    def start_recording(self):
+        num_vertices = len(self.sensor.top_indexes)
+        if (
+            self.modal_basis is not None
+            and self.modal_basis.mean.size != num_vertices * 3
+        ):
+            raise ValueError(
+                f"The modal basis has {self.modal_basis.mean.size // 3} vertices, the "
+                f"top surface has {num_vertices}"
+            )
+
+        self.recorder = DepthMapRecorder(
+            path.join(self.output_path, RECORDING_DIRECTORY_NAME),
+            DEPTH_MAP_RECORD_CAPACITY,
+            self.image_size,
+            num_vertices,
+            len(self.sensor.markers),
+            rgb=self.rgb,
+            num_modes=0 if self.modal_basis is None else len(self.modal_basis),
+        )
+        # The top surface rebuilds the frames from their positions or coefficients
+        save_surface(
+            self.recorder.directory,
+            self.sensor.get_membrane_surface_rest_positions(),
+            self.sensor.top_triangles,
+            self.sensor.top_indexes,
+        )
+        # Flush the buffers when SOFA exits
+        atexit.register(self.recorder.close)
+
+    def start_publishing(self):
+        self.publisher = FramePublisher(
+            self.live_name,
+            LIVE_FRAMES_CAPACITY,
+            self.image_size,
+            len(self.sensor.top_indexes),
+        )
+        # Release the shared memory when SOFA exits
+        atexit.register(self.publisher.close)
+
+    def onAnimateEndEvent(self, event):
+        self.step += 1
+        if self.recorder is not None and self.step % self.record_every == 0:
+            self.record_depth_map()
+        if self.publisher is not None and self.step % self.live_every == 0:
+            self.publish_frame()
+
+    def publish_frame(self):
+        """
+        Publish the current depth map and top surface positions to the readers of the
+        shared memory. Both are written straight into the slot of the frame.
+        """
+        slot = self.publisher.begin(self.step, self.node.time.value)
+
+        surface_positions = self.sensor.get_membrane_surface_positions(
+            out=self.publisher.positions[slot]
+        )
+        table = self.sensor.get_pixel_correspondence(
+            surface_positions, self.image_size, self.render_mode
+        )
+        table.image(surface_positions, out=self.publisher.depth_maps[slot])
+
+        self.publisher.end()
+
+    def record_depth_map(self):
+        """
+        Record the current depth map and top surface positions in the next ring buffer
+        slot, without allocating new arrays. With a modal basis, only the mode
+        coefficients of the positions are recorded.
+        """
+        slot = self.recorder.next_slot(self.step, self.node.time.value)
+
+        if self.recorder.coefficients is not None:
+            surface_positions = self.sensor.get_membrane_surface_positions(
+                out=self.recorder.surface_positions
+            )
+            self.modal_basis.project(
+                surface_positions, out=self.recorder.coefficients[slot]
+            )
+            return
+
+        surface_positions = self.sensor.get_membrane_surface_positions(
+            out=self.recorder.positions[slot]
+        )
+        self.sensor.markers.displacements(
+            surface_positions, out=self.recorder.markers[slot]
+        )
+
+        table = self.sensor.get_pixel_correspondence(
+            surface_positions, self.image_size, self.render_mode
+        )
+        if self.rgb:
+            heights = table.image(
+                surface_positions, out=self.recorder.image, normalize=False
+            )
+            self.get_tactile_renderer(table).render(
+                heights, out=self.recorder.rgb[slot]
+            )
+        self.recorder.frames[slot] = table.image(
+            surface_positions, out=self.recorder.image
+        )
 
     def onKeypressedEvent(self, event):
         key = event["key"]
         if key == DEPTH_MAP_KEY:
             print("Capturing depth map...")
-            self.capture_depth_map()
-            print("Depth map captured")
+            if self.capture_depth_map():
+                print("Depth map captured")
+            else:
+                print("Depth map dropped, the writer queue is full")
 
     def capture_depth_map(self):
+        """
+        Capture the depth map and queue its files to be written in the background.
+
+        Returns:
+            Whether the capture was queued.
+        """
         surface_positions = self.sensor.get_membrane_surface_positions()
 
+        # Gather the depth of every pixel through the cached pixel to vertex table
+        table = self.sensor.get_pixel_correspondence(
+            surface_positions, self.image_size, self.render_mode
+        )
+        depth_map_array = table.image(surface_positions)
+        marker_displacements = self.sensor.markers.displacements(surface_positions)
+
+        rgb_array = None
+        if self.rgb:
+            heights = table.image(surface_positions, normalize=False)
+            rgb_array = self.get_tactile_renderer(table).render(heights)
+
+        return self.writer.submit(
+            self.save_depth_map,
+            surface_positions,
+            depth_map_array,
+            marker_displacements,
+            rgb_array,
+        )
+
+    def get_tactile_renderer(self, table):
+        """
+        Get the renderer shading the depth field into RGB tactile images.
+
+        It is created on first use, with the pixel size of the pixel to vertex table.
+        """
+        if (
+            self.tactile_renderer is None
+            or self.tactile_renderer.image_size != table.image_size
+        ):
+            lookup_table = (
+                load_lookup_table(RGB_LOOKUP_TABLE_PATH)
+                if RGB_LOOKUP_TABLE_PATH is not None
+                else None
+            )
+            self.tactile_renderer = TactileImageRenderer(
+                table.image_size, table.pixel_size(), lookup_table
+            )
+        return self.tactile_renderer
+
+    def save_depth_map(
+        self, surface_positions, depth_map_array, marker_displacements, rgb_array=None
+    ):
         self.create_output_directory()
 
         self.save_depth_map_points(surface_positions)
+        if DEPTH_MAP_POINTS_TEXT:
+            self.save_depth_map_points_text(surface_positions)
 
-        depth_map_array = self.map_to_image(
-            np.array(surface_positions), OUTPUT_IMAGE_SIZE
-        )
         self.save_depth_map_image(depth_map_array)
+        self.save_markers(marker_displacements)
+        if rgb_array is not None:
+            self.save_rgb_image(rgb_array)
 
     def create_output_directory(self):
-        pathlib.Path(OUTPUT_PATH).mkdir(parents=True, exist_ok=True)
+        pathlib.Path(self.output_path).mkdir(parents=True, exist_ok=True)
 
     def save_depth_map_points(self, surface_positions):
-        file_path = path.join(OUTPUT_PATH, POINTS_FILE_NAME)
-        with open(file_path, "w") as f:
-            for item in surface_positions:
-                f.write(",".join([str(i) for i in item]) + "\n")
+        save_points(
+            path.join(self.output_path, POINTS_FILE_NAME),
+            surface_positions,
+            self.sensor.top_indexes,
+            self.sensor.get_mesh_id(),
+            DEPTH_MAP_POINTS_DTYPE,
+        )
+
+    def save_depth_map_points_text(self, surface_positions):
+        save_points_text(
+            path.join(self.output_path, POINTS_TEXT_FILE_NAME), surface_positions
+        )
 
     def save_depth_map_image(self, depth_map_array):
-        file_path = path.join(OUTPUT_PATH, IMAGE_FILE_NAME)
-        depth_map_image = Image.fromarray((depth_map_array * 255).astype(np.uint8))
-        depth_map_image.save(file_path)
+        save_depth_image(
+            path.join(self.output_path, IMAGE_FILE_NAME),
+            depth_map_array,
+            DEPTH_MAP_IMAGE_BITS,
+        )
+
+    def save_markers(self, marker_displacements):
+        save_markers(
+            path.join(self.output_path, MARKERS_FILE_NAME),
+            self.sensor.markers,
+            marker_displacements,
+            self.sensor.top_indexes,
+        )
+
+    def save_rgb_image(self, rgb_array):
+        save_rgb_image(path.join(self.output_path, RGB_IMAGE_FILE_NAME), rgb_array)
 
     def nearest_neighbor(self, data, i, j):
         """
@@ -307,12 +799,7 @@ class SensorController(Sofa.Core.Controller):
         Returns:
             A tuple containing the (X, Y, Z) values of the nearest neighbor.
         """
-        # Calculate Euclidean distances between the point and all triplets
-        distances = np.sqrt(np.sum((data[:, [0, 2]] - [i, j]) ** 2, axis=1))
-        # Find the index of the minimum distance (nearest neighbor)
-        nearest_neighbor_index = np.argmin(distances)
-
-        return data[nearest_neighbor_index]
+        return nearest_vertex(data, i, j)
 
     def map_to_image(self, triplets, image_size):
         """
@@ -325,38 +812,19 @@ class SensorController(Sofa.Core.Controller):
         Returns:
             A 2D NumPy array representing the grayscale image.
         """
+        return nearest_neighbor_image(triplets, image_size)
 
-        # Create an empty image
-        image = np.zeros(image_size)
-
-        # Get min and max values
-        min_x = np.min(triplets[:, 0])
-        max_x = np.max(triplets[:, 0])
-        min_y = np.min(triplets[:, 1])
-        max_y = np.max(triplets[:, 1])
-        min_z = np.min(triplets[:, 2])
-        max_z = np.max(triplets[:, 2])
-
-        # normalize all triplets coordinates between 0 and 1
-        triplets[:, 0] = (triplets[:, 0] - min_x) / (max_x - min_x)
-        triplets[:, 1] = (triplets[:, 1] - min_y) / (max_y - min_y)
-        triplets[:, 2] = (triplets[:, 2] - min_z) / (max_z - min_z)
-
-        # Loop through each pixel in the image
-        for i in range(image_size[0]):
-            for j in range(image_size[1]):
-                # Convert pixel coordinates to normalized coordinates (between 0 and 1)
-                x = (j + 0.5) / image_size[1]
-                y = (i + 0.5) / image_size[0]
-
-                nearest_neighbor_data = self.nearest_neighbor(triplets, x, y)
-
-                # Get the Y value of the nearest neighbor
-                value = nearest_neighbor_data[1]
-
-                # Normalize the value between 0 and 1
-                normalized = value
+    def map_to_image_interpolated(self, triplets, triangles, image_size):
+        """
+        Maps triplets of values (X, Y, Z) to an image by rasterizing the surface
+        triangles with barycentric interpolation of the Y values.
 
-                image[i, j] = normalized
+        Args:
+            triplets: A NumPy array of shape (N, 3) where each row is (X, Y, Z).
+            triangles: A NumPy array of shape (M, 3) of indexes into the triplets.
+            image_size: The size of the image (e.g., (83, 101)).
 
-        return image
+        Returns:
+            A 2D NumPy array representing the grayscale image.
+        """
+        return interpolated_image(triplets, triangles, image_size)
@@ -0,0 +1,142 @@
+"""
+Data shared by the sensor instances of a process.
+
+A scene with several sensors (e.g. the two fingers of a parallel-jaw gripper) would
+load the same meshes and select the same nodes once per sensor. Everything that
+only depends on the meshes and on the frame of the sensor is instead computed once
+per process and shared between the instances: the parsed meshes, the box
+selections, the top surface triangles, the pixel to vertex tables and the markers.
+Shared arrays are read-only, so an instance cannot modify the data of the others.
+"""
+
+from os import path
+
+import numpy as np
+import Sofa.Core
+
+from .elasticmaterialobject import ElasticMaterialObject
+from .placement import Placement
+
+# SOFA loaders of the mesh file extensions
+LOADERS = {
+    ".msh": "MeshGmshLoader",
+    ".gidmsh": "GIDMeshLoader",
+    ".stl": "MeshSTLLoader",
+    ".obj": "MeshOBJLoader",
+}
+DEFAULT_LOADER = "MeshVTKLoader"
+
+# Data of the loaders kept in the shared meshes
+MESH_FIELDS = ["position", "triangles", "tetrahedra"]
+
+_values = {}
+
+
+def shared(key, compute):
+    """
+    The value of a key, computed once per process.
+
+    Args:
+        key: A hashable key of everything the value depends on.
+        compute: A function without arguments computing the value the first time.
+    """
+    if key not in _values:
+        _values[key] = _freeze(compute())
+    return _values[key]
+
+
+def clear_shared():
+    _values.clear()
+
+
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _freeze(item)
+    return value
+
+
+def load_mesh(file_path, scale):
+    """
+    Parse a mesh with the SOFA loader of its extension, in a node detached from the
+    scene.
+
+    Returns:
+        A dictionary of the MESH_FIELDS of the loader, as NumPy arrays.
+    """
+    extension = path.splitext(file_path)[1].lower()
+    node = Sofa.Core.Node("MeshLoader")
+    loader = node.addObject(
+        LOADERS.get(extension, DEFAULT_LOADER),
+        name="loader",
+        filename=file_path,
+        scale3d=list(scale),
+    )
+    node.init()
+    return {name: np.array(loader.getData(name).value) for name in MESH_FIELDS}
+
+
+def shared_mesh(file_path, scale):
+    """
+    A mesh scaled like a loader with scale3d would, parsed once per process.
+    """
+    key = ("mesh", path.abspath(file_path), tuple(float(s) for s in scale))
+    return shared(key, lambda: load_mesh(file_path, scale))
+
+
+def placed(positions, placement):
+    """
+    Shared positions placed in the scene, the shared array itself for an identity
+    placement.
+    """
+    if placement.is_identity():
+        return positions
+    return placement.to_world(positions)
+
+
+class SharedMeshElasticObject(ElasticMaterialObject):
+    """
+    ElasticMaterialObject whose topologies are filled from the shared meshes instead
+    of loaders of their own. The rotation and translation are applied to the shared
+    positions. The arrays are handed to the containers as they are, without
+    conversion to lists.
+    """
+
+    def __init__(self, *args, **kwargs):
+        ElasticMaterialObject.__init__(self, *args, **kwargs)
+
+    def addVolumeTopology(self):
+        mesh = shared_mesh(self.volumeMeshFileName.value, self.scale.value)
+        placement = Placement(self.rotation.value, self.translation.value)
+        return self.addObject(
+            "TetrahedronSetTopologyContainer",
+            position=placed(mesh["position"], placement),
+            tetras=mesh["tetrahedra"],
+            name="container",
+        )
+
+    def addSurfaceTopology(self, node, filename, rotation, translation, scale):
+        mesh = shared_mesh(filename, scale)
+        return node.addObject(
+            "TriangleSetTopologyContainer",
+            position=placed(mesh["position"], Placement(rotation, translation)),
+            triangles=mesh["triangles"],
+            name="container",
+        )
+
+    def addVisualModel(
+        self, filename, color, rotation, translation, scale=[1.0, 1.0, 1.0]
+    ):
+        mesh = shared_mesh(filename, scale)
+        visualmodel = self.addChild("VisualModel")
+        visualmodel.addObject(
+            "OglModel",
+            name="OglModel",
+            position=placed(mesh["position"], Placement(rotation, translation)),
+            triangles=mesh["triangles"],
+            color=color,
+            updateNormals=False,
+        )
+        visualmodel.addObject("BarycentricMapping", name="mapping")
@@ -0,0 +1,64 @@
+"""
+Extraction of the top surface of the membrane mesh as a collision submesh.
+
+Only the top of the membrane can be touched by an indenter, so colliding with the
+side walls and the underside is wasted work. The submesh is written as a binary STL
+next to the original mesh, in the same units, so it goes through the same loader.
+"""
+
+import os
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from elements.mesh.cache import selection_path
+from elements.mesh.stl import read_stl, write_stl
+
+from .box_selection import oriented_box_indexes
+
+
+def top_surface_submesh(mesh_path, box, rotation, translation, scale):
+    """
+    Get the path of an STL holding only the facets of a mesh inside a box.
+
+    The submesh is written next to the mesh the first time, under a name keyed by the
+    mesh content, its transform and the box.
+
+    Args:
+        mesh_path: The binary STL surface mesh.
+        box: The box of the facets to keep, as given to oriented_box_indexes, in the
+            frame of the scene.
+        rotation: The rotation the mesh is loaded with, in degrees.
+        translation: The translation the mesh is loaded with.
+        scale: The scale the mesh is loaded with.
+    """
+    file_path = selection_path(
+        mesh_path,
+        "TopCollision",
+        {
+            "rotation": rotation,
+            "translation": translation,
+            "scale": scale,
+            "box": box,
+        },
+        extension=".stl",
+    )
+    if os.path.exists(file_path):
+        return file_path
+
+    facets = read_stl(mesh_path)
+
+    # Place the vertices like the loader does: scale, rotate then translate
+    vertices = facets["vertices"].reshape(-1, 3).astype(np.float64) * scale
+    vertices = Rotation.from_euler("xyz", rotation, degrees=True).apply(vertices)
+    vertices += translation
+
+    inside = np.zeros(len(vertices), dtype=bool)
+    inside[oriented_box_indexes(vertices, **box)] = True
+
+    write_stl(
+        file_path,
+        facets[inside.reshape(-1, 3).all(axis=1)],
+        header=b"Top surface submesh",
+    )
+    return file_path
@@ -0,0 +1,269 @@
+"""
+Quasi-static surrogate of the membrane built on a condensed compliance matrix.
+
+For small indentations the membrane is nearly linear, so the normal displacements
+of its top surface are d = C f, C being the compliance matrix of the top vertices
+(computed offline by compliance.py) and f the normal contact forces. Given the
+height of the indenter above every top vertex, the contact forces are found with
+an active set iteration on the non-penetration conditions:
+
+    f >= 0,    d >= p,    f * (d - p) = 0
+
+p being the penetration of the indenter into the undeformed membrane. Every
+iteration is one dense solve restricted to the vertices in contact, so a depth map
+takes milliseconds instead of stepping the scene. Like depth_map.py, this module
+does not depend on SOFA.
+"""
+
+import os
+import warnings
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.spatial import cKDTree
+from scipy.spatial.transform import Rotation
+
+from ..mesh.stl import indexed_triangles, read_stl
+from .depth_map import PixelCorrespondence
+
+# Penetration tolerance of the contact iteration, in m
+CONTACT_TOLERANCE = 1e-9
+
+# Maximum number of active set iterations of the contact solve
+MAX_ITERATIONS = 50
+
+
+class ComplianceSurrogate:
+    """
+    Normal compliance matrix of the membrane top surface.
+    """
+
+    def __init__(
+        self, rest_positions, triangles, compliance, youngModulus, poissonRatio
+    ):
+        """
+        Args:
+            rest_positions: A NumPy array of shape (N, 3), the top surface rest
+                positions.
+            triangles: A NumPy array of shape (M, 3), the top surface triangles.
+            compliance: A symmetric NumPy array of shape (N, N), the downward
+                displacement of every top vertex for a unit downward force on every
+                top vertex, in m/N.
+            youngModulus: The Young's modulus the compliance was computed with.
+            poissonRatio: The Poisson ratio the compliance was computed with.
+        """
+        self.rest_positions = np.asarray(rest_positions, dtype=np.float64)
+        self.triangles = np.asarray(triangles, dtype=np.int64)
+        self.compliance = np.asarray(compliance, dtype=np.float64)
+        self.youngModulus = float(youngModulus)
+        self.poissonRatio = float(poissonRatio)
+        self.pixel_correspondences = {}
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            return cls(
+                data["rest_positions"],
+                data["triangles"],
+                data["compliance"],
+                data["youngModulus"],
+                data["poissonRatio"],
+            )
+
+    def save(self, file_path):
+        # Write then rename, so concurrent runs never load a partial file
+        temporary_path = f"{file_path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temporary_path,
+            rest_positions=self.rest_positions,
+            triangles=self.triangles,
+            compliance=self.compliance,
+            youngModulus=self.youngModulus,
+            poissonRatio=self.poissonRatio,
+        )
+        os.replace(temporary_path, file_path)
+
+    def scaled(self, youngModulus):
+        """
+        The surrogate of a membrane with another Young's modulus and the same Poisson
+        ratio, whose compliance scales with 1 / youngModulus.
+        """
+        return ComplianceSurrogate(
+            self.rest_positions,
+            self.triangles,
+            self.compliance * (self.youngModulus / youngModulus),
+            youngModulus,
+            self.poissonRatio,
+        )
+
+    def solve(self, indenter_heights, max_iterations=MAX_ITERATIONS):
+        """
+        Finds the contact forces and the displacements of the top vertices.
+
+        Args:
+            indenter_heights: A NumPy array of shape (N,), the height of the lowest
+                point of the indenter above every top vertex (inf where there is none).
+            max_iterations: The maximum number of active set iterations.
+
+        Returns:
+            A tuple (forces, displacements) of NumPy arrays of shape (N,), the
+            downward contact forces and displacements. A RuntimeWarning is issued
+            when the contact set does not converge in max_iterations.
+        """
+        penetration = self.rest_positions[:, 1] - indenter_heights
+        forces = np.zeros(len(penetration))
+        displacements = np.zeros(len(penetration))
+
+        active = penetration > 0
+        for _ in range(max_iterations):
+            indexes = np.flatnonzero(active)
+            active_forces = self.contact(indexes, penetration, forces, displacements)
+
+            # Vertices pulled by the indenter leave the contact set
+            pulling = active_forces < 0
+            if pulling.any():
+                active[indexes[pulling]] = False
+                continue
+
+            # Vertices still penetrated by the indenter join the contact set
+            penetrating = ~active & (displacements < penetration - CONTACT_TOLERANCE)
+            if not penetrating.any():
+                return forces, displacements
+            active |= penetrating
+
+        # The last iterations may have changed the contact set after the solve
+        self.contact(np.flatnonzero(active), penetration, forces, displacements)
+        warnings.warn(
+            f"The contact did not converge in {max_iterations} iterations, the "
+            "forces and displacements are the ones of the last contact set",
+            RuntimeWarning,
+        )
+        return forces, displacements
+
+    def contact(self, indexes, penetration, forces, displacements):
+        """
+        Solves the contact of a set of vertices, writing the forces and displacements
+        of all the vertices.
+
+        Returns:
+            The forces of the vertices of the set.
+        """
+        forces[:] = 0.0
+        if len(indexes) == 0:
+            displacements[:] = 0.0
+            return forces[indexes]
+
+        factor = cho_factor(self.compliance[np.ix_(indexes, indexes)])
+        active_forces = cho_solve(factor, penetration[indexes])
+        forces[indexes] = active_forces
+        # The compliance is symmetric: gather contiguous rows rather than columns
+        np.dot(active_forces, self.compliance[indexes], out=displacements)
+        return active_forces
+
+    def surface_positions(self, indenter_heights):
+        """
+        The top surface positions under an indenter.
+        """
+        _, displacements = self.solve(indenter_heights)
+        positions = self.rest_positions.copy()
+        positions[:, 1] -= displacements
+        return positions
+
+    def depth_map(self, indenter_heights, image_size, render_mode="interpolated"):
+        """
+        The depth map of the top surface under an indenter, through the pixel to
+        vertex table of the rest positions.
+        """
+        key = (tuple(image_size), render_mode)
+        table = self.pixel_correspondences.get(key)
+        if table is None:
+            table = PixelCorrespondence.compute(
+                self.rest_positions, self.triangles, image_size, render_mode
+            )
+            self.pixel_correspondences[key] = table
+        return table.image(self.surface_positions(indenter_heights))
+
+
+def sphere_heights(xz, center, radius):
+    """
+    The height of the lower half of a sphere above (X, Z) points (inf outside).
+    """
+    offsets = np.asarray(xz, dtype=np.float64) - np.asarray(center)[::2]
+    squared = radius**2 - (offsets**2).sum(axis=1)
+    heights = np.full(len(offsets), np.inf)
+    inside = squared >= 0
+    heights[inside] = center[1] - np.sqrt(squared[inside])
+    return heights
+
+
+def place_vertices(vertices, translation, rotation, scale):
+    """
+    Places mesh vertices like the loaders do: scale, rotate (XYZ Euler angles in
+    degrees) then translate.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64) * scale
+    vertices = Rotation.from_euler("xyz", rotation, degrees=True).apply(vertices)
+    return vertices + translation
+
+
+def mesh_heights(xz, vertices, triangles):
+    """
+    The height of the lowest triangle of a mesh above (X, Z) points (inf outside).
+
+    Args:
+        xz: A NumPy array of shape (N, 2) of points.
+        vertices: A NumPy array of shape (V, 3), the placed mesh vertices.
+        triangles: A NumPy array of shape (M, 3) of indexes into the vertices.
+
+    Returns:
+        A NumPy array of shape (N,).
+    """
+    xz = np.asarray(xz, dtype=np.float64)
+    corners = vertices[np.asarray(triangles, dtype=np.int64)]  # (M, 3, 3)
+    corners_xz = corners[:, :, ::2]
+
+    # Candidate points of every triangle: the ones around its projection
+    centers = corners_xz.mean(axis=1)
+    radii = np.linalg.norm(corners_xz - centers[:, None], axis=2).max(axis=1)
+    candidates = cKDTree(xz).query_ball_point(centers, radii * (1 + 1e-9))
+    counts = np.fromiter((len(c) for c in candidates), dtype=np.int64)
+
+    heights = np.full(len(xz), np.inf)
+    if counts.sum() == 0:
+        return heights
+
+    triangle_indexes = np.repeat(np.arange(len(corners)), counts)
+    point_indexes = np.concatenate([c for c in candidates if c]).astype(np.int64)
+
+    # Barycentric coordinates of the candidates in their triangle
+    a, b, c = (corners_xz[triangle_indexes, k] for k in range(3))
+    e0 = b - a
+    e1 = c - a
+    p = xz[point_indexes] - a
+    area = e0[:, 0] * e1[:, 1] - e1[:, 0] * e0[:, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w1 = (p[:, 0] * e1[:, 1] - e1[:, 0] * p[:, 1]) / area
+        w2 = (e0[:, 0] * p[:, 1] - p[:, 0] * e0[:, 1]) / area
+    w0 = 1.0 - w1 - w2
+
+    eps = -1e-9
+    inside = (area != 0) & (w0 >= eps) & (w1 >= eps) & (w2 >= eps)
+
+    y = corners[triangle_indexes, :, 1]
+    values = w0 * y[:, 0] + w1 * y[:, 1] + w2 * y[:, 2]
+    np.minimum.at(heights, point_indexes[inside], values[inside])
+    return heights
+
+
+def indenter_heights(xz, meshPath, translation, rotation, scale):
+    """
+    The height of an indenter above (X, Z) points (inf outside), the indenter being
+    a mesh placed like the Object prefab places it, or a sphere of radius scale
+    when meshPath is None.
+    """
+    if meshPath is None:
+        return sphere_heights(xz, translation, scale)
+
+    vertices, triangles = indexed_triangles(read_stl(meshPath))
+    vertices = place_vertices(vertices, translation, rotation, scale)
+    return mesh_heights(xz, vertices, triangles)
@@ -0,0 +1,177 @@
+"""
+Synthesis of GelSight-style RGB tactile images from the depth field.
+
+The surface normals of the depth map are computed with finite differences and
+shaded through a lookup table indexed by the binned (X, Y) components of the
+normal, so a frame costs a few in-place array operations and a single gather.
+Like depth_map.py, this module does not depend on SOFA.
+"""
+
+import numpy as np
+
+# Colored lights of the synthetic lookup table, as (azimuth, elevation) in degrees
+# and RGB color, roughly placed like the LEDs of the GelSight Mini
+LIGHTS = [
+    ((90.0, 30.0), (1.0, 0.0, 0.0)),
+    ((210.0, 30.0), (0.0, 1.0, 0.0)),
+    ((330.0, 30.0), (0.0, 0.0, 1.0)),
+]
+BACKGROUND_COLOR = (120.0, 120.0, 120.0)
+LIGHT_GAIN = 255.0
+
+
+def lookup_table(bins=256, lights=LIGHTS, background=BACKGROUND_COLOR, gain=LIGHT_GAIN):
+    """
+    Computes a synthetic normal to RGB lookup table with Lambertian colored lights.
+
+    The color of a normal is the background color plus the change of the light
+    reflected by the surface with respect to a flat surface.
+
+    Args:
+        bins: The number of bins of each normal component, over [-1, 1].
+        lights: A list of ((azimuth, elevation), (r, g, b)) lights, in degrees.
+        background: The RGB color of a flat surface.
+        gain: The RGB value of a fully lit surface.
+
+    Returns:
+        A uint8 NumPy array of shape (bins, bins, 3), indexed by the bins of the
+        X (column) and Y (row) components of the unit normals.
+    """
+    components = np.linspace(-1.0, 1.0, bins)
+    nx, ny = np.meshgrid(components, components, indexing="ij")
+
+    # Bins outside of the unit disk are clamped to the closest unit normal
+    length = np.maximum(np.hypot(nx, ny), 1.0)
+    nx = nx / length
+    ny = ny / length
+    nz = np.sqrt(np.clip(1.0 - nx**2 - ny**2, 0.0, None))
+
+    table = np.zeros((bins, bins, 3))
+    for (azimuth, elevation), color in lights:
+        azimuth, elevation = np.radians(azimuth), np.radians(elevation)
+        direction = np.array(
+            [
+                np.cos(elevation) * np.cos(azimuth),
+                np.cos(elevation) * np.sin(azimuth),
+                np.sin(elevation),
+            ]
+        )
+        shading = np.clip(
+            nx * direction[0] + ny * direction[1] + nz * direction[2], 0.0, None
+        )
+        # Flat surfaces take the background color
+        table += (shading - direction[2])[..., None] * np.asarray(color) * gain
+
+    table += np.asarray(background)
+    return np.clip(np.rint(table), 0, 255).astype(np.uint8)
+
+
+def load_lookup_table(file_path):
+    """
+    Loads a calibration lookup table saved with np.save.
+
+    The table must be an array of shape (bins, bins, 3), indexed like the ones of
+    lookup_table.
+    """
+    table = np.load(file_path)
+    if table.ndim != 3 or table.shape[0] != table.shape[1] or table.shape[2] != 3:
+        raise ValueError(
+            f"Expected a (bins, bins, 3) lookup table, got {table.shape} "
+            f"from {file_path}"
+        )
+    return np.clip(table, 0, 255).astype(np.uint8, copy=False)
+
+
+class TactileImageRenderer:
+    """
+    Shades height maps of a fixed size into RGB tactile images.
+
+    Every buffer is allocated once, so rendering a frame allocates nothing.
+    """
+
+    def __init__(self, image_size, pixel_size, table=None):
+        """
+        Args:
+            image_size: The size of the height maps as (rows, columns).
+            pixel_size: The (row, column) size of a pixel, in the units of the
+                heights.
+            table: The normal to RGB lookup table, see lookup_table. Defaults to
+                the synthetic one.
+        """
+        self.image_size = tuple(int(size) for size in image_size)
+        self.pixel_size = pixel_size
+        self.table = lookup_table() if table is None else table
+
+        self.bins = len(self.table)
+        self.flat_table = self.table.reshape(-1, 3)
+
+        self._gradient_x = np.empty(self.image_size)
+        self._gradient_y = np.empty(self.image_size)
+        self._norm = np.empty(self.image_size)
+        self._squared = np.empty(self.image_size)
+        self._indexes = np.empty(self.image_size, dtype=np.intp)
+
+    def gradients(self, heights):
+        """
+        Computes the gradients of a height map along the columns and the rows, with
+        central differences inside the image and one-sided ones on its borders.
+
+        Returns:
+            The (X, Y) gradients, in buffers of the renderer.
+        """
+        dy, dx = self.pixel_size
+        gx, gy = self._gradient_x, self._gradient_y
+
+        np.subtract(heights[:, 2:], heights[:, :-2], out=gx[:, 1:-1])
+        gx[:, 1:-1] /= 2 * dx
+        np.subtract(heights[:, 1], heights[:, 0], out=gx[:, 0])
+        np.subtract(heights[:, -1], heights[:, -2], out=gx[:, -1])
+        gx[:, [0, -1]] /= dx
+
+        np.subtract(heights[2:], heights[:-2], out=gy[1:-1])
+        gy[1:-1] /= 2 * dy
+        np.subtract(heights[1], heights[0], out=gy[0])
+        np.subtract(heights[-1], heights[-2], out=gy[-1])
+        gy[[0, -1]] /= dy
+
+        return gx, gy
+
+    def render(self, heights, out=None):
+        """
+        Shades a height map into an RGB image.
+
+        Args:
+            heights: A NumPy array of the image size, the height of every pixel.
+            out: An optional uint8 array of shape (rows, columns, 3) to write the
+                image into.
+
+        Returns:
+            A uint8 NumPy array of shape (rows, columns, 3).
+        """
+        if out is None:
+            out = np.empty((*self.image_size, 3), dtype=np.uint8)
+
+        gx, gy = self.gradients(heights)
+
+        # The unit normal is (-gx, -gy, 1) / sqrt(gx^2 + gy^2 + 1)
+        norm, squared = self._norm, self._squared
+        np.multiply(gx, gx, out=norm)
+        np.multiply(gy, gy, out=squared)
+        norm += squared
+        norm += 1.0
+        np.sqrt(norm, out=norm)
+
+        # Bin of the X and Y components of the normal over [-1, 1]
+        half = (self.bins - 1) / 2
+        for gradient in (gx, gy):
+            gradient /= norm
+            gradient *= -half
+            gradient += half
+            np.rint(gradient, out=gradient)
+
+        # A single gather of the table rows at the flat (X, Y) bins
+        gx *= self.bins
+        gx += gy
+        np.copyto(self._indexes, gx, casting="unsafe")
+        np.take(self.flat_table, self._indexes, axis=0, out=out, mode="clip")
+        return out
@@ -0,0 +1,123 @@
+"""
+Background output stage for depth map captures.
+
+Encoding images and writing files is slow, so the simulation thread only queues
+the captured arrays and worker threads do the writing.
+"""
+
+import queue
+import threading
+
+
+class DepthMapWriter:
+    """
+    Bounded queue of write jobs consumed by a pool of worker threads.
+
+    When the queue is full, the "block" policy waits for a free slot (slowing the
+    simulation down) while the "drop" policy discards the new job. Jobs submitted
+    once the writer is closed are discarded and counted as dropped.
+
+    Workers run jobs concurrently, so with several workers the jobs must not write
+    the same files.
+
+    Attributes:
+        queued: Number of jobs accepted in the queue.
+        dropped: Number of jobs discarded because the queue was full.
+        written: Number of jobs completed.
+        failed: Number of jobs that raised an exception.
+    """
+
+    def __init__(self, num_workers=1, max_queue_size=8, policy="block"):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+
+        self.policy = policy
+        self.jobs = queue.Queue(maxsize=max_queue_size)
+        self.lock = threading.Lock()
+        # Held while queueing, so no job is queued after the stop sentinels
+        self.submit_lock = threading.Lock()
+        self.closed = False
+
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+        self.workers = [
+            threading.Thread(target=self.work, name=f"DepthMapWriter{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, function, *args):
+        """
+        Queue a call to function(*args) on a worker thread.
+
+        Returns:
+            Whether the job was queued (False if dropped).
+        """
+        with self.submit_lock:
+            if self.closed:
+                queued = False
+            else:
+                try:
+                    self.jobs.put((function, args), block=self.policy == "block")
+                    queued = True
+                except queue.Full:
+                    queued = False
+
+        if not queued:
+            with self.lock:
+                self.dropped += 1
+            return False
+
+        with self.lock:
+            self.queued += 1
+        return True
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+
+            function, args = job
+            try:
+                function(*args)
+            except Exception as e:
+                print(f"Depth map write failed: {e}")
+                with self.lock:
+                    self.failed += 1
+            else:
+                with self.lock:
+                    self.written += 1
+            finally:
+                self.jobs.task_done()
+
+    def flush(self):
+        """
+        Wait until every queued job is done.
+        """
+        self.jobs.join()
+
+    def close(self):
+        """
+        Write the remaining jobs and stop the workers.
+        """
+        with self.submit_lock:
+            if self.closed:
+                return
+            self.closed = True
+            for _ in self.workers:
+                self.jobs.put(None)
+
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+        print(
+            f"Depth map writer: {self.queued} queued, {self.dropped} dropped, "
+            f"{self.written} written, {self.failed} failed"
+        )
@@ -0,0 +1,203 @@
+"""
+Per-step timings of the simulation, streamed to a trace file.
+
+StepTimerController records the wall time of the steps, the times of the steps of
+SOFA's "Animate" timer and the number of constraints, as JSON lines or Chrome
+trace events. It is added to the scene when STEP_TRACE_PATH of params.py is set,
+or for a headless run with run.py --trace (from the src directory):
+
+    python run.py --steps 200 --trace ../output/steps.jsonl
+"""
+
+import json
+import os
+import time
+
+import Sofa
+
+
+def flatten_records(records, prefix=""):
+    """
+    Flattens the nested step records of a SOFA AdvancedTimer.
+
+    Args:
+        records: The dictionary returned by Sofa.Timer.getRecords.
+        prefix: The path of the parent step.
+
+    Returns:
+        A dictionary mapping the path of every step (e.g. "Animate/Solve") to its
+        total time in ms.
+    """
+    times = {}
+    for name, record in records.items():
+        if not isinstance(record, dict):
+            continue
+        step_path = f"{prefix}/{name}" if prefix else name
+        if "total_time" in record:
+            times[step_path] = record["total_time"]
+        times.update(flatten_records(record, step_path))
+    return times
+
+
+class StepTimerController(Sofa.Core.Controller):
+    """
+    Stream the timings of every simulation step to a trace file.
+
+    Every `every` steps, a record with the wall time of the step, the times of the
+    steps of SOFA's "Animate" timer (FEM assembly, linear solver, collision
+    detection, constraint solving, event propagation to the Python controllers, ...)
+    and the number of constraints is written to the file, either as one JSON object
+    per line ("jsonl") or as Chrome trace events ("chrome", open it in
+    chrome://tracing or Perfetto). Records are buffered and the file is flushed
+    every `flush_every` records.
+
+    SOFA only closes the "Animate" timer of a step after its AnimateEndEvent, so
+    the record of a step is completed with its timers at the next AnimateBeginEvent,
+    or when the controller is closed for the last step.
+    """
+
+    def __init__(self, *args, **kwargs):
+        Sofa.Core.Controller.__init__(self, *args, **kwargs)
+
+        self.node = kwargs["node"]
+        self.file_path = kwargs["file_path"]
+        self.format = "jsonl" if "format" not in kwargs else kwargs["format"]
+        self.every = 1 if "every" not in kwargs else kwargs["every"]
+        self.flush_every = 100 if "flush_every" not in kwargs else kwargs["flush_every"]
+
+        self.step = 0
+        self.num_records = 0
+        self.step_start = None
+        self.pending = None
+        self.num_events = 0
+        self.constraint_solver = self.find_constraint_solver(self.node)
+
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.file_path, "w", buffering=1 << 16)
+        if self.format == "chrome":
+            # Chrome accepts an unterminated array, so the trace can be streamed
+            self.file.write("[\n")
+
+        Sofa.Timer.clear()
+        Sofa.Timer.setEnabled("Animate", True)
+        Sofa.Timer.setInterval("Animate", self.every)
+        Sofa.Timer.setOutputType("Animate", "json")
+
+    def find_constraint_solver(self, node):
+        """
+        Find the component reporting the number of constraints of the last step, in
+        the tree of a node.
+        """
+        for obj in node.objects:
+            if obj.getData("currentNumConstraints") is not None:
+                return obj
+        for child in node.children:
+            solver = self.find_constraint_solver(child)
+            if solver is not None:
+                return solver
+        return None
+
+    def onAnimateBeginEvent(self, event):
+        # The timers of the previous step are closed by now
+        self.write_pending()
+        self.step += 1
+        self.step_start = time.perf_counter()
+
+    def onAnimateEndEvent(self, event):
+        if self.step % self.every != 0:
+            return
+
+        self.pending = {
+            "step": self.step,
+            "time": self.node.time.value,
+            "start": self.step_start,
+            "wall_time": time.perf_counter() - self.step_start,
+            "constraints": (
+                self.constraint_solver.currentNumConstraints.value
+                if self.constraint_solver is not None
+                else None
+            ),
+        }
+
+    def write_pending(self):
+        """
+        Write the record of the last traced step with the timers of its step.
+        """
+        if self.pending is None:
+            return
+        pending, self.pending = self.pending, None
+        timers = flatten_records(Sofa.Timer.getRecords("Animate") or {})
+
+        if self.format == "chrome":
+            self.write_chrome_events(pending, timers)
+        else:
+            record = {
+                "step": pending["step"],
+                "time": pending["time"],
+                "wall_time": pending["wall_time"] * 1e3,
+                "timers": timers,
+                "constraints": pending["constraints"],
+            }
+            self.file.write(json.dumps(record) + "\n")
+
+        self.num_records += 1
+        if self.num_records % self.flush_every == 0:
+            self.file.flush()
+
+    def write_chrome_events(self, pending, timers):
+        # Chrome traces are in microseconds, SOFA timers in milliseconds
+        start = pending["start"] * 1e6
+        num_constraints = pending["constraints"]
+        events = [
+            {
+                "name": f"step {pending['step']}",
+                "ph": "X",
+                "ts": start,
+                "dur": pending["wall_time"] * 1e6,
+                "pid": 0,
+                "tid": 0,
+            }
+        ]
+        # SOFA steps are laid out one after the other under their parent, by depth
+        offsets = {}
+        for step_path, total_time in timers.items():
+            depth = step_path.count("/")
+            parent = step_path.rsplit("/", 1)[0] if depth else ""
+            ts = offsets.get(parent, start)
+            events.append(
+                {
+                    "name": step_path.rsplit("/", 1)[-1],
+                    "ph": "X",
+                    "ts": ts,
+                    "dur": total_time * 1e3,
+                    "pid": 0,
+                    "tid": depth + 1,
+                }
+            )
+            offsets[parent] = ts + total_time * 1e3
+            offsets[step_path] = ts
+        if num_constraints is not None:
+            events.append(
+                {
+                    "name": "constraints",
+                    "ph": "C",
+                    "ts": start,
+                    "pid": 0,
+                    "args": {"count": num_constraints},
+                }
+            )
+        for event in events:
+            separator = ",\n" if self.num_events else ""
+            self.file.write(separator + json.dumps(event))
+            self.num_events += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.write_pending()
+        if self.format == "chrome":
+            self.file.write("\n]\n")
+        Sofa.Timer.setEnabled("Animate", False)
+        self.file.close()
@@ -0,0 +1,108 @@
+"""
+Reader of the live frames a run publishes to shared memory.
+
+Start a run publishing its frames, then read them from another process:
+
+    python run.py --steps 1000 --live-frames sofa-sim2real
+    python live.py sofa-sim2real --save ../output/live.npy
+
+With several sensors, every sensor publishes to the name followed by "-" and its
+name (e.g. sofa-sim2real-SensorTop). Other consumers (e.g. an agent) use
+FrameReader of elements/sensor/live.py the same way. This module does not depend
+on SOFA.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from elements.sensor.live import FrameReader
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Read the live frames of a run from shared memory."
+    )
+    parser.add_argument("name", help="Name of the shared memory of the frames")
+    parser.add_argument(
+        "--frames", type=int, default=None, help="Stop after this many frames"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=10.0,
+        help="Stop when no frame comes for this long, in s",
+    )
+    parser.add_argument(
+        "--save", default=None, help="File to save the depth maps read to (.npy)"
+    )
+    return parser.parse_args()
+
+
+def read_frames(reader, num_frames=None, timeout=None):
+    """
+    Read the frames as they are published, until the publisher closes, num_frames
+    frames are read or none comes for timeout seconds.
+
+    Yields:
+        The frames, whose depth maps and positions are views of the shared memory.
+        A consumer slower than the publisher skips the overwritten frames.
+    """
+    sequence = 0
+    count = 0
+    while num_frames is None or count < num_frames:
+        frame = reader.wait(after=sequence, timeout=timeout, copy=False)
+        if frame is None:
+            return
+        sequence = frame.sequence
+        count += 1
+        yield frame
+
+
+def main():
+    args = parse_args()
+
+    reader = FrameReader(args.name)
+    print(
+        f"Reading {args.name}: {reader.image_size[0]}x{reader.image_size[1]} depth "
+        f"maps, {reader.num_vertices} vertices, {reader.capacity} slots"
+    )
+
+    depth_maps = []
+    sequences = []
+    steps = []
+    start = time.perf_counter()
+    for frame in read_frames(reader, args.frames, args.timeout):
+        if not sequences:
+            start = time.perf_counter()
+        if args.save is not None:
+            depth_map = frame.depth_map.copy()
+            if frame.valid():
+                depth_maps.append(depth_map)
+        sequences.append(frame.sequence)
+        steps.append(frame.step)
+    elapsed = time.perf_counter() - start
+
+    # The frames are views of the shared memory, release them before closing it
+    frame = None
+    reader.close()
+
+    if not sequences:
+        print("No frame")
+        return
+
+    skipped = sequences[-1] - sequences[0] + 1 - len(sequences)
+    rate = (len(sequences) - 1) / elapsed if elapsed > 0 else 0.0
+    print(
+        f"{len(sequences)} frames up to step {steps[-1]} ({rate:.1f} frames/s, "
+        f"{skipped} skipped)"
+    )
+
+    if args.save is not None and depth_maps:
+        np.save(args.save, np.stack(depth_maps))
+        print(f"{len(depth_maps)} depth maps saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
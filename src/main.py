@@ -1,3 +1,4 @@
+import atexit
 from os import path
 
 from stlib3.physics.rigid import Floor, Sphere
@@ -5,67 +6,100 @@ from stlib3.scene import Scene
 
 from elements.object.object import Object
 from elements.object.object_controller import ObjectController
+from elements.object.trajectory import trajectory_from_spec
 from elements.sensor.sensor import Sensor, SensorController
-from params import ALARM_DISTANCE, ANGLE_CONE, CONTACT_DISTANCE, FRICTION_COEF
+from elements.timing.step_timer import StepTimerController
+from params import (
+    ALARM_DISTANCE,
+    ANGLE_CONE,
+    CONTACT_DISTANCE,
+    FRICTION_COEF,
+    LIVE_FRAMES_NAME,
+    OBJECT_COLLISION_TRIANGLES,
+    OUTPUT_PATH,
+    STEP_TRACE_EVERY,
+    STEP_TRACE_FORMAT,
+    STEP_TRACE_PATH,
+)
+from profiler import phase
+from scenarios import DEFAULT_SCENARIO, DEFAULT_SENSORS, INDENTERS, get_scenario
 
 
-def add_star(scene):
-    star = Object(
-        name="Star",
-        meshPath="../data/mesh/star/star.stl",
-        rotation=[0.0, 45.0, 0.0],
-        translation=[0.0, 0.03, 0.0],
-        scale3d=[0.0075, 0.0075, 0.0075],
-        color=[1.0, 1.0, 0.0, 1.0],
+def headless_sphere(scenario):
+    """
+    The sphere indenter without visual model: the stlib3 sphere always has an
+    OglModel, which needs an OpenGL context. The rigid body is the same, colliding
+    through a sphere of the radius of the stlib3 one instead of its mesh.
+    """
+    scale = scenario["scale"]
+    obj = Object(
+        name="Indenter",
+        rotation=scenario["rotation"],
+        translation=scenario["translation"],
+        totalMass=scenario.get("mass", 0.064),
         isStatic=False,
+        visual=False,
     )
-    star.addObject("UncoupledConstraintCorrection")
-    scene.Modelling.addChild(star)
-    return star
-
-
-def add_coin(scene):
-    coin = Object(
-        name="Coin",
-        meshPath="../data/mesh/coin/One-Euro.stl",
-        rotation=[-90.0, 0.0, 0.0],
-        translation=[0.0, 20.0, 0.0],
-        color=[219.0 / 255.0, 172.0 / 255.0, 52.0 / 255.0, 1.0],
-        isStatic=False,
-    )
-    coin.addObject("UncoupledConstraintCorrection")
-    scene.Modelling.addChild(coin)
-    return coin
-
-
-def add_sphere(scene):
-    sphere = Sphere(
-        None,
-        name="Sphere",
-        translation=[0.0, 0.03, 0.0],
-        uniformScale=0.005,
-        isAStaticObject=False,
-        totalMass=0.064,
-    )
-    sphere.addObject("UncoupledConstraintCorrection")
-    scene.Modelling.addChild(sphere)
-    return sphere
-
-
-def add_monkey(scene):
-    monkey = Object(
-        name="monkey",
-        meshPath="../data/mesh/monkey/monkey.stl",
-        rotation=[0.0, 90.0, 0.0],
-        translation=[0.0, 0.035, 0.0],
-        scale3d=[0.0075, 0.0075, 0.0075],
-        color=[1.0, 1.0, 0.0, 1.0],
-        totalMass=0.25,
-        isStatic=False,
-    )
-    monkey.addObject("UncoupledConstraintCorrection")
-    scene.Modelling.addChild(monkey)
-    return monkey
+    collision = obj.addChild("Collision")
+    collision.addObject("MechanicalObject", template="Vec3d", position=[0.0, 0.0, 0.0])
+    collision.addObject("SphereCollisionModel", radius=scale)
+    collision.addObject("RigidMapping")
+    return obj
+
+
+def add_indenter(rootNode, scene, scenario, visual=True):
+    """
+    Add the indenter of a scenario (see scenarios.py) to the scene, with the
+    controller of its trajectory if it has one. Without visual, the sphere is built
+    by headless_sphere.
+
+    Returns:
+        The node of the indenter.
+    """
+    indenter = INDENTERS[scenario["indenter"]]
+    scale = scenario["scale"]
+
+    if indenter["meshPath"] is None and not visual:
+        obj = headless_sphere(scenario)
+    elif indenter["meshPath"] is None:
+        obj = Sphere(
+            None,
+            name="Indenter",
+            translation=scenario["translation"],
+            rotation=scenario["rotation"],
+            uniformScale=scale,
+            isAStaticObject=False,
+            totalMass=scenario.get("mass", 0.064),
+        )
+    else:
+        obj = Object(
+            name="Indenter",
+            meshPath=indenter["meshPath"],
+            rotation=scenario["rotation"],
+            translation=scenario["translation"],
+            scale3d=[scale, scale, scale],
+            color=indenter["color"],
+            totalMass=scenario.get("mass", 1.0),
+            isStatic=False,
+            collisionTriangles=scenario.get(
+                "collisionTriangles", OBJECT_COLLISION_TRIANGLES
+            ),
+            visual=visual,
+        )
+    obj.addObject("UncoupledConstraintCorrection")
+    scene.Modelling.addChild(obj)
+
+    if scenario.get("trajectory") is not None:
+        scene.addObject(
+            ObjectController(
+                name="IndenterController",
+                node=rootNode,
+                object=obj.mstate,
+                trajectory=trajectory_from_spec(scenario["trajectory"]),
+            )
+        )
+
+    return obj
 
 
 def set_internal_camera(scene):
@@ -80,7 +114,77 @@ def set_internal_camera(scene):
     )
 
 
-def createScene(rootNode):
+# Plugins that need an OpenGL context or the GUI, left out of headless scenes
+GL_PLUGINS = ["Sofa.GL.Component.Rendering3D", "Sofa.GUI.Component"]
+
+
+def add_sensor(rootNode, scene, placement, sensor_params, controller_params):
+    """
+    Add a sensor placed in the scene, with its own controller. The sensors of a
+    scene share their meshes and selections (see elements/sensor/shared.py).
+
+    Args:
+        placement: The name of the sensor and optionally its rotation, translation
+            and scale.
+        sensor_params: The Sensor parameters common to the sensors.
+        controller_params: The SensorController parameters, with the output path
+            of the sensor.
+
+    Returns:
+        The sensor.
+    """
+    name = placement["name"]
+    with phase(name):
+        sensor = Sensor(**sensor_params, **placement)
+        scene.Modelling.addChild(sensor)
+
+    # Add dynamic parts to the scene
+    scene.Simulation.addChild(sensor.RigidifiedStructure.DeformableParts)
+
+    scene.addObject(
+        SensorController(
+            name=f"{name}Controller",
+            sensor=sensor,
+            node=rootNode,
+            **controller_params,
+        )
+    )
+    return sensor
+
+
+def createScene(
+    rootNode,
+    headless=False,
+    output_path=OUTPUT_PATH,
+    sensor_params=None,
+    trace_path=STEP_TRACE_PATH,
+    scenario=DEFAULT_SCENARIO,
+    record_every=None,
+    image_size=None,
+    live_name=None,
+):
+    """
+    Build the scene. A headless scene has no visual models nor OpenGL or GUI
+    plugins, so it runs without a display (see run.py).
+
+    Args:
+        rootNode: The root node of the scene.
+        headless: Whether to leave out the visual models.
+        output_path: The directory the depth maps are written to.
+        sensor_params: Optional Sensor parameters (e.g. youngModulus, volumeMeshPath)
+            overriding the values of params.py (see sweep.py).
+        trace_path: Optional file to stream the timings of every step to.
+        scenario: The name of the indentation scenario (see scenarios.py), or the
+            scenario itself. With several sensors, each one writes its depth maps
+            into the subdirectory of its name of output_path.
+        record_every: Optionally record a depth map every N steps, overriding
+            DEPTH_MAP_RECORD.
+        image_size: Optionally the (rows, columns) size of the depth maps,
+            overriding OUTPUT_IMAGE_SIZE.
+        live_name: Optionally the name of the shared memory the frames are
+            published to, overriding LIVE_FRAMES_NAME (see live.py). With several
+            sensors, the name of each sensor is appended to it.
+    """
 
     # The list of plugins this simulation requires
     plugins = [
@@ -109,6 +213,9 @@ def createScene(rootNode):
         "Sofa.Component.Engine.Select",
         "Sofa.Component.LinearSolver.Direct",
     ]
+    scenario = get_scenario(scenario or DEFAULT_SCENARIO)
+    if headless:
+        plugins = [plugin for plugin in plugins if plugin not in GL_PLUGINS]
 
     # Y axis is the vertical axis
     gravity = [0.0, -9.81, 0.0]
@@ -117,60 +224,93 @@ def createScene(rootNode):
 
     # We define the Scene object with the root node, gravity, plugins
     # iterative=False means using SparseLDLSolver as the linear solver
-    scene = Scene(
-        rootNode,
-        dt=dt,
-        gravity=gravity,
-        plugins=plugins,
-        iterative=False,
-    )
+    with phase("Scene (plugins)"):
+        scene = Scene(
+            rootNode,
+            dt=dt,
+            gravity=gravity,
+            plugins=plugins,
+            iterative=False,
+        )
 
     # This initializes the architecture of the scene, with Modelling, Setting and Simulation nodes
-    scene.addMainHeader()
+    with phase("addMainHeader"):
+        scene.addMainHeader()
 
     # This configures the contact parameters (collision detection and response)
-    scene.addContact(
-        alarmDistance=ALARM_DISTANCE,
-        contactDistance=CONTACT_DISTANCE,
-        frictionCoef=FRICTION_COEF,
-    )
+    with phase("addContact"):
+        scene.addContact(
+            alarmDistance=ALARM_DISTANCE,
+            contactDistance=CONTACT_DISTANCE,
+            frictionCoef=FRICTION_COEF,
+        )
 
     scene.LocalMinDistance.angleCone = ANGLE_CONE
 
-    # The default view of the scene on SOFA
-    scene.addObject("DefaultVisualManagerLoop")
+    if not headless:
+        # The default view of the scene on SOFA
+        scene.addObject("DefaultVisualManagerLoop")
 
-    # We configure the initial flags for the visual representation of the scene
-    scene.VisualStyle.displayFlags = [
-        "hideVisual",
-        "showInteractionForceFields",
-        "showCollisionModels",
-    ]
+        # We configure the initial flags for the visual representation of the scene
+        scene.VisualStyle.displayFlags = [
+            "hideVisual",
+            "showInteractionForceFields",
+            "showCollisionModels",
+        ]
 
     # Set up the pipeline for the collision computation
     scene.Simulation.addObject("GenericConstraintCorrection")
 
-    # Adjust mouse interaction
-    scene.Settings.mouseButton.stiffness = 10
+    if not headless:
+        # Adjust mouse interaction
+        scene.Settings.mouseButton.stiffness = 10
 
-    # Add the sensor to the scene
-    sensor = Sensor()
-    scene.Modelling.addChild(sensor)
+    # Add the sensors to the scene, each with its controller
+    sensor_params = {
+        "visual": not headless,
+        "drawBoxes": not headless,
+        **(sensor_params or {}),
+    }
+    controller_params = {}
+    if record_every is not None:
+        controller_params.update(record=True, record_every=record_every)
+    if image_size is not None:
+        controller_params["image_size"] = image_size
 
-    # Add dynamic parts to the scene
-    scene.Simulation.addChild(sensor.RigidifiedStructure.DeformableParts)
+    live_name = LIVE_FRAMES_NAME if live_name is None else live_name
 
-    # Add controller
-    scene.addObject(
-        SensorController(name="SensorController", sensor=sensor, node=rootNode)
-    )
+    sensors = scenario.get("sensors") or DEFAULT_SENSORS
+    for placement in sensors:
+        sensor_controller_params = {
+            **controller_params,
+            "output_path": output_path,
+            "live_name": live_name,
+        }
+        if len(sensors) > 1:
+            sensor_controller_params["output_path"] = path.join(
+                output_path, placement["name"]
+            )
+            if live_name is not None:
+                sensor_controller_params["live_name"] = (
+                    f"{live_name}-{placement['name']}"
+                )
+        add_sensor(rootNode, scene, placement, sensor_params, sensor_controller_params)
+
+    with phase(f"Indenter ({scenario['name']})"):
+        add_indenter(rootNode, scene, scenario, visual=not headless)
 
-    add_monkey(scene)
+    if trace_path is not None:
+        step_timer = scene.addObject(
+            StepTimerController(
+                name="StepTimerController",
+                node=rootNode,
+                file_path=trace_path,
+                format=STEP_TRACE_FORMAT,
+                every=STEP_TRACE_EVERY,
+            )
+        )
+        atexit.register(step_timer.close)
 
-    # controller = ObjectController(
-    #     name="SphereController", node=rootNode, object=sphere.mstate
-    # )
-    # scene.addObject(controller)
     # scene.Simulation.TimeIntegrationSchema.rayleighStiffness = 0.005
 
     return rootNode
@@ -25,10 +25,79 @@ MEMBRANE_VOLUME_MESH_PATH = path.join(
 #     "..", "data", "mesh", "sensor", "Low-Even-Mesh.msh"
 # )
 
+# Only collide with the top surface of the membrane surface mesh
+MEMBRANE_TOP_COLLISION_ONLY = False
+
+# Number of triangles of the collision proxies of the indenters (0 for the full mesh),
+# unless their scenario sets "collisionTriangles"
+OBJECT_COLLISION_TRIANGLES = 0
+
 SHELL_MESH_PATH = path.join("..", "data", "mesh", "sensor", "Shell-Low.stl")
 
 OUTPUT_PATH = path.join("..", "output")
-POINTS_FILE_NAME = "depth_map_points.txt"
+POINTS_FILE_NAME = "depth_map_points.npz"
+POINTS_TEXT_FILE_NAME = "depth_map_points.txt"
 IMAGE_FILE_NAME = "depth_map_image.png"
+RGB_IMAGE_FILE_NAME = "tactile_image.png"
+MARKERS_FILE_NAME = "markers.npz"
+RECORDING_DIRECTORY_NAME = "recording"
+TIMINGS_FILE_NAME = "timings.json"
+STARTUP_PROFILE_FILE_NAME = "startup_profile.json"
 
 OUTPUT_IMAGE_SIZE = (83 * 3, 101 * 3)
+# "nearest" (nearest vertex) or "interpolated" (barycentric triangle rasterization)
+DEPTH_MAP_RENDER_MODE = "nearest"
+# Pixel to vertex tables are recomputed when a top vertex drifts further than this in X/Z
+DEPTH_MAP_DRIFT_TOLERANCE = 5e-5  # m
+# Persist the rest pixel to vertex tables next to the membrane collision mesh
+DEPTH_MAP_CACHE_CORRESPONDENCE = True
+# Working memory of the rasterization of the pixel to vertex tables, which goes by
+# bands of rows so large image sizes fit, and number of threads sharing it
+DEPTH_MAP_MEMORY_BUDGET = 16 * 2**20  # bytes
+DEPTH_MAP_WORKERS = 1
+# Bits per pixel of the depth map PNG images (8 or 16)
+DEPTH_MAP_IMAGE_BITS = 8
+
+# Record a depth map every DEPTH_MAP_RECORD_EVERY steps into a ring buffer
+DEPTH_MAP_RECORD = False
+DEPTH_MAP_RECORD_EVERY = 10
+DEPTH_MAP_RECORD_CAPACITY = 1000  # frames
+# Record the coefficients of the top surface in a modal basis (see reduce.py)
+# instead of the depth maps and positions
+MODAL_BASIS_PATH = None  # e.g. path.join(OUTPUT_PATH, "modes.npz")
+
+# Publish the depth map and top surface positions every LIVE_FRAMES_EVERY steps into
+# a ring buffer of shared memory, read by other processes (see live.py)
+LIVE_FRAMES_NAME = None  # e.g. "sofa-sim2real"
+LIVE_FRAMES_EVERY = 1  # steps
+LIVE_FRAMES_CAPACITY = 8  # frames
+
+# Also shade the depth field into GelSight-style RGB images, through a normal to RGB
+# lookup table of shape (bins, bins, 3) saved with np.save (None for a synthetic one)
+DEPTH_MAP_RGB = False
+RGB_LOOKUP_TABLE_PATH = None
+
+# Grid of markers on the top surface (rows, columns), tracked in every capture
+MARKER_GRID_SHAPE = (7, 9)
+
+# Binary export of the top surface positions ("float64" or "float32")
+DEPTH_MAP_POINTS_DTYPE = "float64"
+# Also write the positions to a text file (slow)
+DEPTH_MAP_POINTS_TEXT = False
+
+# Depth map files are written by a background thread through a bounded queue. There
+# is a single thread, as every capture overwrites the same files
+DEPTH_MAP_WRITER_QUEUE_SIZE = 8
+# "block" waits for the writers when the queue is full, "drop" discards the capture
+DEPTH_MAP_WRITER_POLICY = "block"
+
+# Cache the box selections of the sensor nodes next to the meshes
+SELECTION_CACHE = True
+
+# Per-step timings written by StepTimerController ("jsonl" or "chrome")
+STEP_TRACE_PATH = None  # e.g. path.join(OUTPUT_PATH, "steps.jsonl")
+STEP_TRACE_FORMAT = "jsonl"
+STEP_TRACE_EVERY = 1  # steps
+
+# Compliance surrogate of the membrane (see compliance.py)
+COMPLIANCE_PROBE_FORCE = 1e-3  # N, small enough for the membrane to stay linear
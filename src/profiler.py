@@ -0,0 +1,109 @@
+"""
+Phase-level profiler of the scene construction.
+
+Construction steps are wrapped in `with phase("name"):` blocks, which can be
+nested. Every phase records its wall time and the peak resident set size of the
+process, so the report shows where the startup time and memory go:
+
+    from profiler import startup_profiler
+    startup_profiler.print_table()
+    startup_profiler.save("startup.json")
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss():
+    """
+    The peak resident set size of the process in MB, or None if unknown.
+    """
+    if resource is None:
+        return None
+    # Linux reports the peak in KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.phases = []
+        self.stack = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Record the wall time and peak RSS of the enclosed block.
+        """
+        self.stack.append(name)
+        entry = {
+            "name": "/".join(self.stack),
+            "depth": len(self.stack) - 1,
+            "peak_rss_start": peak_rss(),
+        }
+        # Keep the phases in the order they start
+        self.phases.append(entry)
+
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry["wall_time"] = time.perf_counter() - start
+            entry["peak_rss"] = peak_rss()
+            self.stack.pop()
+
+    def reset(self):
+        self.phases = []
+        self.stack = []
+
+    def report(self):
+        """
+        The recorded phases as a list of dictionaries (times in s, memory in MB).
+        """
+        return [
+            {
+                "name": entry["name"],
+                "depth": entry["depth"],
+                "wall_time": entry.get("wall_time"),
+                "peak_rss": entry.get("peak_rss"),
+                "peak_rss_increase": (
+                    entry["peak_rss"] - entry["peak_rss_start"]
+                    if entry.get("peak_rss") is not None
+                    and entry["peak_rss_start"] is not None
+                    else None
+                ),
+            }
+            for entry in self.phases
+        ]
+
+    def save(self, file_path):
+        with open(file_path, "w") as f:
+            json.dump(self.report(), f, indent=4)
+
+    def format_table(self):
+        lines = [f"{'Phase':<50} {'Time (s)':>10} {'Peak RSS (MB)':>14} {'+MB':>8}"]
+        for entry in self.report():
+            name = "  " * entry["depth"] + entry["name"].split("/")[-1]
+            wall_time = entry["wall_time"]
+            rss = entry["peak_rss"]
+            increase = entry["peak_rss_increase"]
+            lines.append(
+                f"{name:<50} "
+                f"{'-' if wall_time is None else f'{wall_time:.3f}':>10} "
+                f"{'-' if rss is None else f'{rss:.1f}':>14} "
+                f"{'-' if increase is None else f'{increase:.1f}':>8}"
+            )
+        return "\n".join(lines)
+
+    def print_table(self):
+        print(self.format_table())
+
+
+# Profiler shared by main.py and the prefabs
+startup_profiler = StartupProfiler()
+phase = startup_profiler.phase
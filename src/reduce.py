@@ -0,0 +1,161 @@
+"""
+Reduced-order modal model of the membrane from recorded runs.
+
+Fits a truncated POD basis on the top surface positions of recordings (see
+elements/sensor/recorder.py), encodes recordings as mode coefficients and renders
+the depth maps of coefficients back at any resolution. A run records the
+coefficients directly when MODAL_BASIS_PATH of params.py is set. Usage (from the
+src directory):
+
+    python reduce.py fit ../output/scenarios/*/recording --output ../output/modes.npz
+    python reduce.py encode ../output/modes.npz ../output/scenarios/*/recording
+    python reduce.py decode ../output/modes.npz ../output/recording --image-size 498 606
+
+This module does not depend on SOFA.
+"""
+
+import argparse
+import os
+from os import path
+
+import numpy as np
+
+from elements.sensor.modal import (
+    COEFFICIENTS_FILE_NAME,
+    DEFAULT_ENERGY,
+    ModalBasis,
+    load_snapshots,
+    recorded_slots,
+)
+
+# Buffers of a recording left out by encode --remove-frames
+FRAME_BUFFERS = ["frames.npy", "positions.npy", "markers.npy", "rgb.npy"]
+
+DECODED_FILE_NAME = "decoded_frames.npy"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Fit, encode and decode a modal basis of the top surface."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fit = commands.add_parser("fit", help="Fit a basis on recordings")
+    fit.add_argument("recordings", nargs="+", help="Recording directories")
+    fit.add_argument("--output", required=True, help="File of the basis")
+    fit.add_argument("--modes", type=int, default=None, help="Maximum number of modes")
+    fit.add_argument(
+        "--energy",
+        type=float,
+        default=None,
+        help=f"Share of the variance to keep ({DEFAULT_ENERGY} by default)",
+    )
+
+    encode = commands.add_parser("encode", help="Encode recordings as coefficients")
+    encode.add_argument("basis", help="File of the basis")
+    encode.add_argument("recordings", nargs="+", help="Recording directories")
+    encode.add_argument(
+        "--remove-frames",
+        action="store_true",
+        help="Remove the depth maps, positions and markers once encoded",
+    )
+
+    decode = commands.add_parser("decode", help="Render the depth maps of a recording")
+    decode.add_argument("basis", help="File of the basis")
+    decode.add_argument("recording", help="Recording directory")
+    decode.add_argument(
+        "--image-size",
+        type=int,
+        nargs=2,
+        default=[83 * 3, 101 * 3],
+        metavar=("ROWS", "COLUMNS"),
+    )
+    decode.add_argument(
+        "--render-mode", choices=["nearest", "interpolated"], default="interpolated"
+    )
+    decode.add_argument(
+        "--output",
+        default=None,
+        help=f"File of the depth maps ({DECODED_FILE_NAME} in the recording by default)",
+    )
+    return parser.parse_args()
+
+
+def fit(recordings, output, num_modes=None, energy=None):
+    rest_positions, triangles, snapshots = load_snapshots(recordings)
+    basis = ModalBasis.fit(rest_positions, triangles, snapshots, num_modes, energy)
+    basis.save(output)
+
+    ratio = snapshots[0].size * 2 / len(basis)  # float64 positions to float32
+    print(
+        f"{len(basis)} modes from {len(snapshots)} snapshots saved to {output}: "
+        f"relative error {basis.relative_error(snapshots):.2e}, "
+        f"{ratio:.0f}x smaller than the positions"
+    )
+    return basis
+
+
+def encode(basis, directory, remove_frames=False):
+    """
+    Write the coefficients of the recorded positions, in the slots of the recording.
+    """
+    positions = np.load(path.join(directory, "positions.npy"), mmap_mode="r")
+    slots = recorded_slots(directory)
+
+    coefficients = np.zeros((len(positions), len(basis)), dtype=np.float32)
+    coefficients[slots] = basis.project(positions[slots])
+    np.save(path.join(directory, COEFFICIENTS_FILE_NAME), coefficients)
+    del positions
+
+    if remove_frames:
+        for file_name in FRAME_BUFFERS:
+            file_path = path.join(directory, file_name)
+            if path.exists(file_path):
+                os.remove(file_path)
+
+    print(f"{len(slots)} frames of {directory} encoded")
+
+
+def decode(basis, directory, image_size, render_mode, output=None):
+    """
+    Render the depth maps of the coefficients of a recording, in the order of their
+    steps, into a .npy file.
+    """
+    coefficients = np.load(path.join(directory, COEFFICIENTS_FILE_NAME), mmap_mode="r")
+    slots = recorded_slots(directory)
+    output = output or path.join(directory, DECODED_FILE_NAME)
+
+    frames = np.lib.format.open_memmap(
+        output, mode="w+", dtype=np.float32, shape=(len(slots), *image_size)
+    )
+    image = np.empty(image_size)
+    for i, slot in enumerate(slots):
+        frames[i] = basis.depth_map(coefficients[slot], image_size, render_mode, image)
+    frames.flush()
+
+    print(f"{len(slots)} depth maps of {directory} saved to {output}")
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "fit":
+        fit(args.recordings, args.output, args.modes, args.energy)
+        return
+
+    basis = ModalBasis.load(args.basis)
+    if args.command == "encode":
+        for directory in args.recordings:
+            encode(basis, directory, args.remove_frames)
+    else:
+        decode(
+            basis,
+            args.recording,
+            tuple(args.image_size),
+            args.render_mode,
+            args.output,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Run the scene of main.py without the SOFA GUI.
+
+Usage (from the src directory):
+    python run.py --steps 500 --capture-every 50
+    python run.py --time 2.0
+    python run.py --steps 100 --output-path ../output/a --params '{"poissonRatio": 0.3}'
+    python run.py --steps 200 --scenario star-press --record-every 5
+    python run.py --steps 100 --image-size 480 640
+    python run.py --steps 300 --save-checkpoint ../output/settled.npz
+    python run.py --steps 100 --warm-start ../output/settled.npz
+    python run.py --steps 1000 --live-frames sofa-sim2real
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import sys
+import time
+from os import path
+
+import numpy as np
+import Sofa
+import Sofa.Simulation
+
+from checkpoint import load_checkpoint, save_checkpoint
+from elements.sensor.sensor import SensorController
+from main import createScene
+from params import (
+    OUTPUT_PATH,
+    STARTUP_PROFILE_FILE_NAME,
+    STEP_TRACE_PATH,
+    TIMINGS_FILE_NAME,
+)
+from profiler import phase, startup_profiler
+from scenarios import get_scenario
+
+# Exit code of a run whose membrane positions are no longer finite
+EXIT_DIVERGED = 3
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the sensor scene headless.")
+    duration = parser.add_mutually_exclusive_group(required=True)
+    duration.add_argument("--steps", type=int, help="Number of steps to simulate")
+    duration.add_argument("--time", type=float, help="Simulated time in seconds")
+    parser.add_argument(
+        "--capture-every",
+        type=int,
+        default=0,
+        help="Capture a depth map every N steps (0 to only capture after the last step)",
+    )
+    parser.add_argument(
+        "--output-path",
+        default=OUTPUT_PATH,
+        help="Directory of the depth maps and timings",
+    )
+    parser.add_argument(
+        "--params",
+        type=json.loads,
+        default=None,
+        help="JSON object of Sensor parameters overriding params.py",
+    )
+    parser.add_argument(
+        "--scenario",
+        type=parse_scenario,
+        default=None,
+        help="Name of a scenario of scenarios.py, or a JSON object of a scenario",
+    )
+    parser.add_argument(
+        "--record-every",
+        type=int,
+        default=None,
+        help="Record a depth map every N steps into the recording directory",
+    )
+    parser.add_argument(
+        "--image-size",
+        type=int,
+        nargs=2,
+        default=None,
+        metavar=("ROWS", "COLUMNS"),
+        help="Size of the depth maps (OUTPUT_IMAGE_SIZE of params.py by default)",
+    )
+    parser.add_argument(
+        "--live-frames",
+        default=None,
+        metavar="NAME",
+        help="Publish the frames to this shared memory, read with live.py",
+    )
+    parser.add_argument(
+        "--warm-start",
+        default=None,
+        help="Checkpoint to restore the scene from before running (see checkpoint.py)",
+    )
+    parser.add_argument(
+        "--warm-start-only",
+        action="append",
+        default=None,
+        help="Only restore the components under this link path, e.g. "
+        "@/Modelling/Sensor (can be repeated, the time is then not restored)",
+    )
+    parser.add_argument(
+        "--save-checkpoint",
+        default=None,
+        help="Checkpoint to save the scene to after running",
+    )
+    parser.add_argument(
+        "--trace",
+        default=STEP_TRACE_PATH,
+        help="File to stream the timings of every step to (see params.py)",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print the time and peak memory of every scene construction phase",
+    )
+    return parser.parse_args()
+
+
+def parse_scenario(value):
+    return get_scenario(json.loads(value) if value.startswith("{") else value)
+
+
+def build(
+    headless=True,
+    output_path=OUTPUT_PATH,
+    sensor_params=None,
+    trace_path=STEP_TRACE_PATH,
+    scenario=None,
+    record_every=None,
+    image_size=None,
+    live_name=None,
+):
+    """
+    Build and initialize the scene.
+
+    Returns:
+        The root node of the scene.
+    """
+    root = Sofa.Core.Node("root")
+    with phase("createScene"):
+        createScene(
+            root,
+            headless=headless,
+            output_path=output_path,
+            sensor_params=sensor_params,
+            trace_path=trace_path,
+            scenario=scenario,
+            record_every=record_every,
+            image_size=image_size,
+            live_name=live_name,
+        )
+    with phase("Sofa.Simulation.init"):
+        Sofa.Simulation.init(root)
+    return root
+
+
+def run(root, num_steps, capture_every=0):
+    """
+    Advance the scene and capture depth maps through its SensorControllers, one
+    per sensor.
+
+    Returns:
+        A dictionary of timings, in seconds.
+    """
+    controllers = [obj for obj in root.objects if isinstance(obj, SensorController)]
+    dt = root.dt.value
+
+    step_time = 0.0
+    capture_time = 0.0
+    num_captures = 0
+
+    for step in range(1, num_steps + 1):
+        start = time.perf_counter()
+        Sofa.Simulation.animate(root, dt)
+        step_time += time.perf_counter() - start
+
+        if (capture_every and step % capture_every == 0) or step == num_steps:
+            start = time.perf_counter()
+            for controller in controllers:
+                controller.capture_depth_map()
+            capture_time += time.perf_counter() - start
+            num_captures += 1
+
+    # Wait for the background writers to finish the files
+    start = time.perf_counter()
+    for controller in controllers:
+        controller.writer.flush()
+    write_time = time.perf_counter() - start
+
+    diverged = not all(
+        np.isfinite(controller.sensor.get_membrane_surface_positions()).all()
+        for controller in controllers
+    )
+
+    return {
+        "steps": num_steps,
+        "step_time": step_time,
+        "captures": num_captures,
+        "capture_time": capture_time,
+        "write_time": write_time,
+        "diverged": diverged,
+    }
+
+
+def print_summary(build_time, timings):
+    steps_per_second = (
+        timings["steps"] / timings["step_time"] if timings["steps"] else 0
+    )
+    print(f"Build time:   {build_time:.3f} s")
+    print(
+        f"Simulation:   {timings['steps']} steps in {timings['step_time']:.3f} s "
+        f"({steps_per_second:.1f} steps/s)"
+    )
+    print(
+        f"Captures:     {timings['captures']} in {timings['capture_time']:.3f} s "
+        f"(+{timings['write_time']:.3f} s waiting for the writer)"
+    )
+
+
+def main():
+    args = parse_args()
+
+    # Mesh and output paths are relative to the src directory
+    os.chdir(path.dirname(path.abspath(__file__)))
+
+    start = time.perf_counter()
+    root = build(
+        output_path=args.output_path,
+        sensor_params=args.params,
+        trace_path=args.trace,
+        scenario=args.scenario,
+        record_every=args.record_every,
+        image_size=None if args.image_size is None else tuple(args.image_size),
+        live_name=args.live_frames,
+    )
+    build_time = time.perf_counter() - start
+
+    warm_start_time = 0.0
+    if args.warm_start is not None:
+        start = time.perf_counter()
+        load_checkpoint(
+            root,
+            args.warm_start,
+            prefixes=args.warm_start_only,
+            restore_time=args.warm_start_only is None,
+        )
+        warm_start_time = time.perf_counter() - start
+        print(f"Warm start:   {warm_start_time:.3f} s from {args.warm_start}")
+
+    num_steps = args.steps
+    if num_steps is None:
+        num_steps = round(args.time / root.dt.value)
+
+    timings = run(root, num_steps, args.capture_every)
+    print_summary(build_time, timings)
+
+    if args.save_checkpoint is not None and not timings["diverged"]:
+        save_checkpoint(root, args.save_checkpoint)
+        print(f"Checkpoint saved to {args.save_checkpoint}")
+
+    timings["build_time"] = build_time
+    timings["warm_start_time"] = warm_start_time
+    if args.scenario is not None:
+        timings["scenario"] = args.scenario["name"]
+    pathlib.Path(args.output_path).mkdir(parents=True, exist_ok=True)
+    with open(path.join(args.output_path, TIMINGS_FILE_NAME), "w") as f:
+        json.dump(timings, f, indent=4)
+
+    # The phases are always recorded, the report is written next to the timings
+    startup_profiler.save(path.join(args.output_path, STARTUP_PROFILE_FILE_NAME))
+    if args.profile_startup:
+        startup_profiler.print_table()
+
+    if timings["diverged"]:
+        print("The simulation diverged")
+        sys.exit(EXIT_DIVERGED)
+
+
+if __name__ == "__main__":
+    main()
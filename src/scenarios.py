@@ -0,0 +1,378 @@
+"""
+Registry of indentation scenarios and parallel runner.
+
+A scenario is an indenter with its pose, scale, mass and trajectory:
+
+    {
+        "indenter": "monkey",
+        "translation": [0.0, 0.035, 0.0],
+        "rotation": [0.0, 90.0, 0.0],
+        "scale": 0.0075,
+        "mass": 0.25,
+        "trajectory": {"type": "oscillate", "period": 0.5, "delta_y": 0.004}
+    }
+
+The indenter is one of INDENTERS. The mass and the trajectory are optional, an
+indenter without trajectory falls on the sensor. Trajectories are analytic
+("oscillate", "press", "slide" or "rotate", with the arguments of the generators
+of elements/object/trajectory.py) or read from a file of waypoints,
+{"type": "file", "path": "trajectory.csv"}. A scenario can collide with a
+decimated proxy of its indenter mesh instead of the full mesh by setting
+"collisionTriangles" (e.g. 2000, see elements/mesh/decimation.py). More scenarios
+can be registered from a JSON file mapping names to scenarios.
+
+A scenario can also place several sensors, e.g. the two fingers of a parallel-jaw
+gripper, each with its own controller recording into its own subdirectory:
+
+    "sensors": [
+        {"name": "Sensor"},
+        {
+            "name": "SensorTop",
+            "rotation": [0.0, 0.0, 180.0],
+            "translation": [0.0, 0.056, 0.0]
+        }
+    ]
+
+Every scenario runs in its own headless run.py process, recording its depth maps
+into its own directory, and an index.json of the runs and their timings is written
+at the end. Usage (from the src directory):
+
+    python scenarios.py --list
+    python scenarios.py monkey-press star-press --steps 200 --record-every 5
+    python scenarios.py --all --file more_scenarios.json --workers 8
+"""
+
+import argparse
+import copy
+import json
+import os
+import pathlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+
+from params import OUTPUT_PATH
+from sweep import run_one
+
+INDEX_FILE_NAME = "index.json"
+
+# The sensor of a scenario without "sensors"
+DEFAULT_SENSORS = [{"name": "Sensor"}]
+
+# The nodes of every sensor restored from a warm start checkpoint: the membrane and
+# the RigidifiedStructure, whose DeformableParts are also under the Simulation node
+WARM_START_NODES = ["Membrane", "RigidifiedStructure"]
+
+# Indenters, with their mesh (None for the stlib3 sphere) and color
+INDENTERS = {
+    "star": {
+        "meshPath": "../data/mesh/star/star.stl",
+        "color": [1.0, 1.0, 0.0, 1.0],
+    },
+    "coin": {
+        "meshPath": "../data/mesh/coin/One-Euro.stl",
+        "color": [219.0 / 255.0, 172.0 / 255.0, 52.0 / 255.0, 1.0],
+    },
+    "monkey": {
+        "meshPath": "../data/mesh/monkey/monkey.stl",
+        "color": [1.0, 1.0, 0.0, 1.0],
+    },
+    "sphere": {
+        "meshPath": None,
+        "color": [1.0, 1.0, 1.0, 1.0],
+    },
+}
+
+PRESS = {"type": "oscillate", "period": 0.5, "delta_y": 0.004}
+
+# Two fingers facing each other, 10 mm apart
+PINCH_SENSORS = [
+    {"name": "Sensor"},
+    {
+        "name": "SensorTop",
+        "rotation": [0.0, 0.0, 180.0],
+        "translation": [0.0, 0.056, 0.0],
+    },
+]
+
+SCENARIOS = {
+    "star-drop": {
+        "indenter": "star",
+        "translation": [0.0, 0.03, 0.0],
+        "rotation": [0.0, 45.0, 0.0],
+        "scale": 0.0075,
+    },
+    "coin-drop": {
+        "indenter": "coin",
+        "translation": [0.0, 20.0, 0.0],
+        "rotation": [-90.0, 0.0, 0.0],
+        "scale": 1.0,
+    },
+    "sphere-drop": {
+        "indenter": "sphere",
+        "translation": [0.0, 0.03, 0.0],
+        "rotation": [0.0, 0.0, 0.0],
+        "scale": 0.005,
+        "mass": 0.064,
+    },
+    "monkey-drop": {
+        "indenter": "monkey",
+        "translation": [0.0, 0.035, 0.0],
+        "rotation": [0.0, 90.0, 0.0],
+        "scale": 0.0075,
+        "mass": 0.25,
+    },
+    "star-press": {
+        "indenter": "star",
+        "translation": [0.0, 0.03, 0.0],
+        "rotation": [0.0, 45.0, 0.0],
+        "scale": 0.0075,
+        "trajectory": PRESS,
+    },
+    "sphere-press": {
+        "indenter": "sphere",
+        "translation": [0.0, 0.029, 0.0],
+        "rotation": [0.0, 0.0, 0.0],
+        "scale": 0.005,
+        "mass": 0.064,
+        "trajectory": PRESS,
+    },
+    "monkey-press": {
+        "indenter": "monkey",
+        "translation": [0.0, 0.035, 0.0],
+        "rotation": [0.0, 90.0, 0.0],
+        "scale": 0.0075,
+        "mass": 0.25,
+        "trajectory": PRESS,
+    },
+    "sphere-slide": {
+        "indenter": "sphere",
+        "translation": [0.0, 0.028, 0.0],
+        "rotation": [0.0, 0.0, 0.0],
+        "scale": 0.005,
+        "mass": 0.064,
+        "trajectory": {"type": "slide", "depth": 0.001, "distance": 0.006},
+    },
+    "sphere-pinch": {
+        "indenter": "sphere",
+        "translation": [0.0, 0.028, 0.0],
+        "rotation": [0.0, 0.0, 0.0],
+        "scale": 0.005,
+        "mass": 0.064,
+        "sensors": PINCH_SENSORS,
+    },
+    "star-rotate": {
+        "indenter": "star",
+        "translation": [0.0, 0.03, 0.0],
+        "rotation": [0.0, 45.0, 0.0],
+        "scale": 0.0075,
+        "trajectory": {"type": "rotate", "depth": 0.001, "angle": 30.0},
+    },
+}
+
+# The scenario of the GUI scene
+DEFAULT_SCENARIO = "monkey-drop"
+
+
+def validate_scenario(name, scenario):
+    for key in ("indenter", "translation", "rotation", "scale"):
+        if key not in scenario:
+            raise ValueError(f'Scenario "{name}" has no "{key}"')
+    if scenario["indenter"] not in INDENTERS:
+        raise ValueError(
+            f'Scenario "{name}" has an unknown indenter "{scenario["indenter"]}", '
+            f"expected one of {', '.join(INDENTERS)}"
+        )
+    names = [sensor.get("name") for sensor in scenario.get("sensors", [])]
+    if None in names or len(set(names)) != len(names):
+        raise ValueError(f'The sensors of scenario "{name}" need distinct names')
+
+
+def register_scenario(name, scenario):
+    validate_scenario(name, scenario)
+    SCENARIOS[name] = scenario
+
+
+def load_scenarios(file_path):
+    """
+    Register the scenarios of a JSON file mapping names to scenarios.
+
+    Returns:
+        The names of the loaded scenarios.
+    """
+    with open(file_path) as f:
+        scenarios = json.load(f)
+    for name, scenario in scenarios.items():
+        register_scenario(name, scenario)
+    return list(scenarios)
+
+
+def warm_start_prefixes(scenario):
+    """
+    The link paths of the membrane mechanical objects of the sensors of a scenario,
+    the only ones restored from a warm start checkpoint.
+    """
+    return [
+        f"@/Modelling/{sensor['name']}/{node}"
+        for sensor in scenario.get("sensors") or DEFAULT_SENSORS
+        for node in WARM_START_NODES
+    ]
+
+
+def get_scenario(scenario):
+    """
+    Get a scenario from its name, or validate it if it is already a dictionary.
+
+    Returns:
+        A copy of the scenario, with its name.
+    """
+    if isinstance(scenario, str):
+        if scenario not in SCENARIOS:
+            raise ValueError(
+                f'Unknown scenario "{scenario}", expected one of {", ".join(SCENARIOS)}'
+            )
+        name, scenario = scenario, SCENARIOS[scenario]
+    else:
+        name = scenario.get("name", "custom")
+        validate_scenario(name, scenario)
+
+    scenario = copy.deepcopy(scenario)
+    scenario["name"] = name
+    return scenario
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run indentation scenarios.")
+    parser.add_argument("scenarios", nargs="*", help="Names of the scenarios to run")
+    parser.add_argument("--all", action="store_true", help="Run every scenario")
+    parser.add_argument("--list", action="store_true", help="List the scenarios")
+    parser.add_argument(
+        "--file",
+        action="append",
+        default=[],
+        help="JSON file of scenarios to register (can be repeated)",
+    )
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument(
+        "--record-every",
+        type=int,
+        default=1,
+        help="Record a depth map every N steps",
+    )
+    parser.add_argument(
+        "--warm-start",
+        default=None,
+        help="Checkpoint of a settled scene to restore the sensor of every run from",
+    )
+    parser.add_argument(
+        "--output-path",
+        default=path.join(OUTPUT_PATH, "scenarios"),
+        help="Directory of the runs and of the index",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of scenarios in parallel",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=None, help="Timeout of every run, in seconds"
+    )
+    return parser.parse_args()
+
+
+def run_scenarios(
+    names,
+    output_path,
+    steps,
+    record_every,
+    workers=None,
+    timeout=None,
+    warm_start=None,
+):
+    """
+    Run every scenario in its own process and write the index of the runs.
+
+    With a warm start checkpoint, only the membranes of the sensors are restored
+    (see warm_start_prefixes), every scenario keeps its own indenter pose.
+
+    Returns:
+        The list of index entries, in the order of the names.
+    """
+    pathlib.Path(output_path).mkdir(parents=True, exist_ok=True)
+    spec = {"steps": steps, "record_every": record_every}
+    if warm_start is not None:
+        spec["warm_start"] = path.abspath(warm_start)
+
+    scenarios = [get_scenario(name) for name in names]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for i, scenario in enumerate(scenarios):
+            run_spec = spec
+            if warm_start is not None:
+                run_spec = {**spec, "warm_start_only": warm_start_prefixes(scenario)}
+            futures.append(
+                executor.submit(
+                    run_one,
+                    path.join(output_path, f"{i:04d}-{scenario['name']}"),
+                    {},
+                    run_spec,
+                    timeout,
+                    scenario,
+                )
+            )
+        runs = []
+        for future in futures:
+            entry = future.result()
+            print(f"{entry['path']}: {entry['status']} ({entry['wall_time']:.1f} s)")
+            runs.append(entry)
+
+    with open(path.join(output_path, INDEX_FILE_NAME), "w") as f:
+        json.dump({"spec": spec, "runs": runs}, f, indent=4)
+
+    return runs
+
+
+def main():
+    args = parse_args()
+
+    for file_path in args.file:
+        load_scenarios(file_path)
+
+    if args.list:
+        for name, scenario in SCENARIOS.items():
+            print(f"{name}: {json.dumps(scenario)}")
+        return
+
+    names = list(SCENARIOS) if args.all else args.scenarios
+    if not names:
+        print("No scenario to run, give their names or --all")
+        return
+    for name in names:
+        get_scenario(name)
+
+    # Mesh and output paths are relative to the src directory
+    output_path = path.abspath(args.output_path)
+    warm_start = None if args.warm_start is None else path.abspath(args.warm_start)
+    os.chdir(path.dirname(path.abspath(__file__)))
+
+    start = time.perf_counter()
+    runs = run_scenarios(
+        names,
+        output_path,
+        args.steps,
+        args.record_every,
+        args.workers,
+        args.timeout,
+        warm_start,
+    )
+
+    num_ok = sum(entry["status"] == "ok" for entry in runs)
+    print(
+        f"{num_ok}/{len(runs)} scenarios succeeded in "
+        f"{time.perf_counter() - start:.1f} s, index in {output_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
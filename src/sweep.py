@@ -0,0 +1,227 @@
+"""
+Parameter sweep over the membrane material and mesh.
+
+Every run is an isolated run.py process writing its depth maps and timings to its
+own directory, so a failed or diverged run does not stop the sweep. The sweep is
+described by a JSON file, either a grid:
+
+    {
+        "grid": {"youngModulus": [30000, 35000, 40000], "poissonRatio": [0.25, 0.3]},
+        "steps": 200
+    }
+
+or uniform random samples between bounds:
+
+    {
+        "random": {"youngModulus": [30000, 40000], "totalMass": [0.01, 0.02]},
+        "samples": 16,
+        "seed": 0,
+        "steps": 200
+    }
+
+Parameters are Sensor parameters: totalMass, youngModulus, poissonRatio and
+volumeMeshPath. The spec can also set "capture_every", "record_every",
+"image_size", "warm_start" and "warm_start_only" (see run.py). A warm start checkpoint only fits
+the runs with the same meshes. Usage (from the src directory):
+
+    python sweep.py sweep.json --output-path ../output/sweep
+"""
+
+import argparse
+import itertools
+import json
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+
+from params import OUTPUT_PATH, TIMINGS_FILE_NAME
+
+INDEX_FILE_NAME = "index.json"
+LOG_FILE_NAME = "log.txt"
+RUN_SCRIPT = path.join(path.dirname(path.abspath(__file__)), "run.py")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sweep the sensor parameters.")
+    parser.add_argument("spec", help="JSON file describing the sweep")
+    parser.add_argument(
+        "--output-path",
+        default=path.join(OUTPUT_PATH, "sweep"),
+        help="Directory of the runs and of the index",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of runs in parallel",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=None, help="Timeout of every run, in seconds"
+    )
+    return parser.parse_args()
+
+
+def expand_spec(spec):
+    """
+    List the parameter sets of a sweep specification.
+
+    Returns:
+        A list of dictionaries of Sensor parameters.
+    """
+    if "grid" in spec:
+        names = list(spec["grid"])
+        values = [spec["grid"][name] for name in names]
+        return [
+            dict(zip(names, combination)) for combination in itertools.product(*values)
+        ]
+
+    if "random" in spec:
+        rng = random.Random(spec.get("seed"))
+        return [
+            {
+                name: rng.uniform(low, high)
+                for name, (low, high) in spec["random"].items()
+            }
+            for _ in range(spec["samples"])
+        ]
+
+    raise ValueError('The sweep specification needs a "grid" or "random" entry')
+
+
+def run_one(run_path, sensor_params, spec, timeout=None, scenario=None):
+    """
+    Run the scene in a new process with the given parameters.
+
+    Args:
+        run_path: The directory of the depth maps, timings and log of the run.
+        sensor_params: A dictionary of Sensor parameters.
+        spec: The sweep specification, for the number of steps and captures.
+        timeout: An optional timeout of the run, in seconds.
+        scenario: An optional indentation scenario (see scenarios.py).
+
+    Returns:
+        The entry of the run in the index.
+    """
+    pathlib.Path(run_path).mkdir(parents=True, exist_ok=True)
+
+    # Do not mistake the timings of a previous sweep for the ones of this run
+    timings_path = path.join(run_path, TIMINGS_FILE_NAME)
+    if path.exists(timings_path):
+        os.remove(timings_path)
+
+    command = [
+        sys.executable,
+        RUN_SCRIPT,
+        "--steps",
+        str(spec["steps"]),
+        "--capture-every",
+        str(spec.get("capture_every", 0)),
+        "--output-path",
+        path.abspath(run_path),
+        "--params",
+        json.dumps(sensor_params),
+    ]
+    if spec.get("record_every"):
+        command += ["--record-every", str(spec["record_every"])]
+    if spec.get("image_size"):
+        command += ["--image-size", *(str(size) for size in spec["image_size"])]
+    if spec.get("warm_start"):
+        command += ["--warm-start", path.abspath(spec["warm_start"])]
+        for prefix in spec.get("warm_start_only", []):
+            command += ["--warm-start-only", prefix]
+    if scenario is not None:
+        command += ["--scenario", json.dumps(scenario)]
+
+    start = time.perf_counter()
+    with open(path.join(run_path, LOG_FILE_NAME), "w") as log:
+        try:
+            result = subprocess.run(
+                command, stdout=log, stderr=subprocess.STDOUT, timeout=timeout
+            )
+            return_code = result.returncode
+        except subprocess.TimeoutExpired:
+            return_code = None
+    wall_time = time.perf_counter() - start
+
+    timings = None
+    if path.exists(timings_path):
+        with open(timings_path) as f:
+            timings = json.load(f)
+
+    if return_code is None:
+        status = "timeout"
+    elif timings is not None and timings["diverged"]:
+        status = "diverged"
+    elif return_code != 0:
+        status = "failed"
+    else:
+        status = "ok"
+
+    return {
+        "path": run_path,
+        "params": sensor_params,
+        "scenario": scenario,
+        "status": status,
+        "return_code": return_code,
+        "wall_time": wall_time,
+        "timings": timings,
+    }
+
+
+def sweep(spec, output_path, workers=None, timeout=None):
+    """
+    Run every parameter set of the specification and write the index of the runs.
+
+    Returns:
+        The list of index entries, in the order of the parameter sets.
+    """
+    parameter_sets = expand_spec(spec)
+    pathlib.Path(output_path).mkdir(parents=True, exist_ok=True)
+
+    # Every worker thread waits on its own run.py process
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                run_one,
+                path.join(output_path, f"run-{i:04d}"),
+                sensor_params,
+                spec,
+                timeout,
+            )
+            for i, sensor_params in enumerate(parameter_sets)
+        ]
+        runs = []
+        for future in futures:
+            entry = future.result()
+            print(f"{entry['path']}: {entry['status']} ({entry['wall_time']:.1f} s)")
+            runs.append(entry)
+
+    with open(path.join(output_path, INDEX_FILE_NAME), "w") as f:
+        json.dump({"spec": spec, "runs": runs}, f, indent=4)
+
+    return runs
+
+
+def main():
+    args = parse_args()
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+
+    # Mesh and output paths are relative to the src directory
+    output_path = path.abspath(args.output_path)
+    os.chdir(path.dirname(path.abspath(__file__)))
+
+    runs = sweep(spec, output_path, args.workers, args.timeout)
+
+    num_ok = sum(entry["status"] == "ok" for entry in runs)
+    print(f"{num_ok}/{len(runs)} runs succeeded, index in {output_path}")
+
+
+if __name__ == "__main__":
+    main()